@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for rerun latency, map build time and payload size at scale.
+
+Synthetic catalogs and fault systems shaped like `historical_earthquakes` and
+`fault_data` are generated for each size. The stages of an app rerun are then
+timed separately: catalog indexing, filtering, the Folium layer build, heatmap
+generation, HTML serialisation and Plotly figure creation. Map HTML and figure
+JSON bytes and the peak traced memory are recorded too.
+
+Example:
+    python benchmarks.py --output bench.json
+    python benchmarks.py --events 100 10000 --faults 5 50 --compare bench.json
+
+Filters select the whole synthetic catalog, so every event reaches the map and
+the timeline (worst case). Results are written as JSON with the git commit, so
+runs from different commits can be compared with --compare.
+
+--startup instead measures cold start in fresh interpreters: the time to import
+the app script (its imports and module-level work, i.e. everything before the
+page starts drawing), which heavy libraries that pulls in, and the time of a
+complete first run.
+
+--memory measures resident memory per catalog size instead: the catalog as
+loaded from CSV (shared by all sessions) and the filtered events a session keeps
+for the full catalog window.
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from folium.raster_layers import ImageOverlay
+
+from earthquake_catalog import EarthquakeCatalog, load_catalog
+from explorer_views import (
+    MAP_TILE_OPTIONS, RISK_COLORS, build_fault_type_figure, build_map, build_slip_figure,
+    build_timeline_figure, render_map_html,
+)
+from hazard_raster import hazard_raster
+from map_layers import PointHeatMap
+from risk_heatmap import RISK_LEVELS, generate_risk_points, risk_values
+from seismic_data import fault_data, fault_frame, historical_earthquakes
+from spatial_index import SOUTHERN_ITALY_BOUNDS, GridIndex, select_positions
+
+DEFAULT_EVENT_SIZES = (100, 10_000, 1_000_000)
+DEFAULT_FAULT_SIZES = (5, 50, 500, 5_000)
+BENCHMARK_SEED = 2024
+STAGES = ("index", "filter", "map_layers", "heatmap_raster", "heatmap_points", "serialise", "figures")
+# Stages that make up one rerun of main() (the index is built once per catalog load)
+RERUN_STAGES = ("filter", "map_layers", "heatmap_raster", "serialise", "figures")
+REGRESSION_RATIO = 1.2
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "south_Italy_faults.py")
+HEAVY_MODULES = ("folium", "branca", "jinja2", "plotly.express", "plotly.graph_objects", "plotly.io")
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import south_Italy_faults
+print(json.dumps({"seconds": time.perf_counter() - started, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+_FIRST_RUN_PROBE = """
+import json, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+app = AppTest.from_file(%r, default_timeout=600).run()
+print(json.dumps({"seconds": time.perf_counter() - started, "exceptions": len(app.exception)}))
+"""
+
+
+# ===== Synthetic Data =====
+def synthetic_faults(count, rng):
+    """`count` fault records with the `fault_data` schema, scattered over the map extent."""
+    templates = [item for item in fault_data if isinstance(item, dict)]
+    south, west, north, east = SOUTHERN_ITALY_BOUNDS
+    risks = list(RISK_LEVELS)
+    records = []
+    for i in range(count):
+        record = dict(templates[i % len(templates)])
+        risk = risks[rng.integers(len(risks))]
+        record.update(
+            name=f"{record['name']} #{i}",
+            location=[round(float(rng.uniform(south, north)), 4), round(float(rng.uniform(west, east)), 4)],
+            seismic_risk=risk,
+            annual_slip_rate=round(float(rng.uniform(0.1, 3.0)), 2),
+            color=RISK_COLORS[risk],
+        )
+        records.append(record)
+    return fault_frame(records)
+
+
+def synthetic_quakes(count, rng):
+    """`count` earthquakes with the `historical_earthquakes` schema."""
+    south, west, north, east = SOUTHERN_ITALY_BOUNDS
+    templates = pd.DataFrame(historical_earthquakes)
+    picks = rng.integers(len(templates), size=count)
+    return pd.DataFrame({
+        "year": rng.integers(1000, 2025, size=count),
+        "location": templates["location"].to_numpy()[picks],
+        # Gutenberg-Richter magnitudes (b = 1) above M4
+        "magnitude": np.round(np.minimum(4.0 + rng.exponential(1 / np.log(10), size=count), 8.0), 1),
+        "lat": rng.uniform(south, north, size=count),
+        "lon": rng.uniform(west, east, size=count),
+        "deaths": rng.integers(0, 1000, size=count) * (rng.random(count) < 0.05),
+        "description": templates["description"].to_numpy()[picks],
+    })
+
+
+# ===== Stages =====
+def _timed(timings, stage, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage] = time.perf_counter() - started
+    return result
+
+
+def run_stages(quakes, faults, cache_dir):
+    """Run one rerun's worth of work; returns (stage seconds, payload bytes, events shown)."""
+    timings, payload = {}, {}
+    def index_catalog():
+        catalog = EarthquakeCatalog(quakes)
+        return catalog, GridIndex(catalog.lat, catalog.lon)
+
+    catalog, index = _timed(timings, "index", index_catalog)
+    year_range, magnitude_range = catalog.year_bounds(), catalog.magnitude_bounds()
+
+    def filter_data():
+        filtered_faults = faults[faults["seismic_risk"].isin(list(RISK_LEVELS))]
+        positions = select_positions(catalog, index, year_range, magnitude_range, bbox=SOUTHERN_ITALY_BOUNDS)
+        return filtered_faults, catalog.take(positions)
+
+    filtered_faults, filtered_quakes = _timed(timings, "filter", filter_data)
+    m = _timed(
+        timings, "map_layers", build_map, filtered_faults, filtered_quakes,
+        ["Fault Systems", "Historical Earthquakes"], MAP_TILE_OPTIONS[0]
+    )
+
+    # Heatmaps are built cold: fresh raster cache directory, no point memoization
+    def raster_layer():
+        _, png_bytes = hazard_raster(filtered_faults, cache_dir=cache_dir)
+        south, west, north, east = SOUTHERN_ITALY_BOUNDS
+        return ImageOverlay(
+            image="data:image/png;base64," + base64.b64encode(png_bytes).decode("ascii"),
+            bounds=[[south, west], [north, east]], opacity=0.75, name="Seismic Risk Heatmap",
+        )
+
+    def point_layer():
+        points = generate_risk_points(
+            filtered_faults["latitude"], filtered_faults["longitude"],
+            risk_values(filtered_faults["seismic_risk"]), filtered_faults["annual_slip_rate"]
+        )
+        return PointHeatMap(points, radius=18, blur=15, min_opacity=0.2, max_val=5.0)
+
+    # The serialised map carries the raster overlay, as in the app's default heatmap mode
+    _timed(timings, "heatmap_raster", raster_layer).add_to(m)
+    _timed(timings, "heatmap_points", point_layer)
+
+    html = _timed(timings, "serialise", render_map_html, m)
+    payload["map_html"] = len(html.encode("utf-8"))
+
+    def figures():
+        built = [
+            build_slip_figure(filtered_faults),
+            build_fault_type_figure(filtered_faults),
+            build_timeline_figure(filtered_quakes, year_range, magnitude_range),
+        ]
+        return [fig.to_json() for fig in built if fig is not None]
+
+    figure_json = _timed(timings, "figures", figures)
+    payload["figure_json"] = sum(len(text.encode("utf-8")) for text in figure_json)
+    return timings, payload, len(filtered_quakes)
+
+
+def measure_case(event_count, fault_count, repeat, seed=BENCHMARK_SEED):
+    """Median stage timings over `repeat` runs, payload bytes and peak traced memory."""
+    rng = np.random.default_rng(seed)
+    faults = synthetic_faults(fault_count, rng)
+    quakes = synthetic_quakes(event_count, rng)
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="faults-bench-") as tmp:
+        for run in range(repeat):
+            gc.collect()
+            timings, payload, shown = run_stages(quakes, faults, os.path.join(tmp, f"run{run}"))
+            runs.append(timings)
+
+        # Separate traced pass, so tracemalloc overhead does not skew the timings
+        gc.collect()
+        tracemalloc.start()
+        run_stages(quakes, faults, os.path.join(tmp, "traced"))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stages = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+    return {
+        "events": event_count,
+        "faults": fault_count,
+        "events_shown": shown,
+        "repeat": repeat,
+        "stages": stages,
+        "rerun_seconds": sum(stages[stage] for stage in RERUN_STAGES),
+        "payload_bytes": payload,
+        "peak_memory_bytes": peak,
+    }
+
+
+# ===== Memory =====
+def measure_memory(event_count, seed=BENCHMARK_SEED):
+    """
+    Bytes held by a CSV-loaded catalog and by a full-window query of it. Sizes are
+    counted from the arrays and frames (deep), since Arrow-backed strings are not
+    visible to tracemalloc.
+    """
+    quakes = synthetic_quakes(event_count, np.random.default_rng(seed))
+    with tempfile.TemporaryDirectory(prefix="faults-bench-") as tmp:
+        path = os.path.join(tmp, "catalog.csv")
+        quakes.to_csv(path, index=False)
+        catalog = load_catalog(path)
+    session_quakes = catalog.query(catalog.year_bounds(), catalog.magnitude_bounds())
+    return {
+        "events": event_count,
+        "catalog_bytes": sum(catalog.memory_usage().values()),
+        "catalog_breakdown": catalog.memory_usage(),
+        "session_bytes": int(session_quakes.memory_usage(index=True, deep=True).sum()),
+        "dtypes": {name: str(dtype) for name, dtype in session_quakes.dtypes.items()},
+    }
+
+
+def print_memory(memory):
+    events = memory["events"]
+    print(
+        f"{events:>9}ev: catalog {memory['catalog_bytes'] / 1e6:8.1f} MB "
+        f"({memory['catalog_bytes'] / max(events, 1):6.1f} B/event) | "
+        f"session query {memory['session_bytes'] / 1e6:8.1f} MB "
+        f"({memory['session_bytes'] / max(events, 1):6.1f} B/event)"
+    )
+
+
+# ===== Cold Start =====
+def _probe(code):
+    # Run `code` in a fresh interpreter next to the app and parse its JSON result line
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(APP_SCRIPT), env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(repeat):
+    """Median cold import and first-run times of the app over `repeat` fresh interpreters."""
+    imports = [_probe(_IMPORT_PROBE % (HEAVY_MODULES,)) for _ in range(repeat)]
+    first_runs = [_probe(_FIRST_RUN_PROBE % (APP_SCRIPT,)) for _ in range(repeat)]
+    return {
+        "repeat": repeat,
+        "import_seconds": statistics.median(probe["seconds"] for probe in imports),
+        "modules_loaded_at_import": imports[0]["loaded"],
+        "first_run_seconds": statistics.median(probe["seconds"] for probe in first_runs),
+        "first_run_exceptions": first_runs[0]["exceptions"],
+    }
+
+
+def print_startup(startup):
+    print(
+        f"Cold start: import {startup['import_seconds'] * 1000:.0f} ms "
+        f"(loads {', '.join(startup['modules_loaded_at_import']) or 'no heavy modules'}), "
+        f"first run {startup['first_run_seconds']:.2f}s"
+    )
+
+
+# ===== Reporting =====
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_name(case):
+    return f"{case['events']}ev/{case['faults']}flt"
+
+
+def print_case(case):
+    stages = "  ".join(f"{stage} {case['stages'][stage] * 1000:.1f}ms" for stage in STAGES)
+    print(
+        f"{case_name(case):>18}: rerun {case['rerun_seconds']:.3f}s | {stages} | "
+        f"html {case['payload_bytes']['map_html'] / 1024:.0f} KB, "
+        f"figures {case['payload_bytes']['figure_json'] / 1024:.0f} KB, "
+        f"peak {case['peak_memory_bytes'] / 1024 ** 2:.1f} MB"
+    )
+
+
+def compare_results(baseline, results, startup=None, memory=None):
+    """Print current/baseline ratios for every case present in both result sets."""
+    previous = {case_name(case): case for case in baseline["results"]}
+    print(f"\nComparison with {baseline.get('commit') or 'baseline'} (ratio > {REGRESSION_RATIO} flagged):")
+    if startup is not None and baseline.get("startup"):
+        ratios = []
+        for metric in ("import_seconds", "first_run_seconds"):
+            ratio = startup[metric] / baseline["startup"][metric]
+            ratios.append(f"{metric} {ratio:.2f}x{' !' if ratio > REGRESSION_RATIO else ''}")
+        print(f"{'cold start':>18}: {'  '.join(ratios)}")
+    previous_memory = {entry["events"]: entry for entry in baseline.get("memory") or []}
+    for entry in memory or []:
+        before = previous_memory.get(entry["events"])
+        if before:
+            ratios = []
+            for metric in ("catalog_bytes", "session_bytes"):
+                ratio = entry[metric] / max(before[metric], 1)
+                ratios.append(f"{metric} {ratio:.2f}x{' !' if ratio > REGRESSION_RATIO else ''}")
+            print(f"{str(entry['events']) + 'ev memory':>18}: {'  '.join(ratios)}")
+    for case in results:
+        old = previous.get(case_name(case))
+        if old is None:
+            continue
+        metrics = {stage: (case["stages"][stage], old["stages"].get(stage)) for stage in STAGES}
+        metrics["rerun"] = (case["rerun_seconds"], old["rerun_seconds"])
+        metrics["map_html"] = (case["payload_bytes"]["map_html"], old["payload_bytes"]["map_html"])
+        metrics["peak_memory"] = (case["peak_memory_bytes"], old["peak_memory_bytes"])
+        ratios = []
+        for metric, (new_value, old_value) in metrics.items():
+            if not old_value:
+                continue
+            ratio = new_value / old_value
+            ratios.append(f"{metric} {ratio:.2f}x{' !' if ratio > REGRESSION_RATIO else ''}")
+        print(f"{case_name(case):>18}: {'  '.join(ratios)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rerun stages on synthetic catalogs.")
+    parser.add_argument("--events", type=int, nargs="+", default=list(DEFAULT_EVENT_SIZES),
+                        help="Synthetic catalog sizes")
+    parser.add_argument("--faults", type=int, nargs="+", default=list(DEFAULT_FAULT_SIZES),
+                        help="Synthetic fault system counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (median is reported)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--startup", action="store_true",
+                        help="Measure cold-start import and first-run time instead of the size cases")
+    parser.add_argument("--memory", action="store_true",
+                        help="Measure catalog and per-session memory for each --events size instead")
+    args = parser.parse_args(argv)
+
+    results, startup, memory = [], None, None
+    if args.startup:
+        startup = measure_startup(max(1, args.repeat))
+        print_startup(startup)
+    elif args.memory:
+        memory = [measure_memory(event_count) for event_count in args.events]
+        for entry in memory:
+            print_memory(entry)
+    else:
+        for event_count in args.events:
+            for fault_count in args.faults:
+                case = measure_case(event_count, fault_count, max(1, args.repeat))
+                print_case(case)
+                results.append(case)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": BENCHMARK_SEED,
+        "results": results,
+    }
+    if startup is not None:
+        report["startup"] = startup
+    if memory is not None:
+        report["memory"] = memory
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(report, out, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            compare_results(json.load(baseline_file), results, startup, memory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Background warming of the render caches.
+
+Without it, the first session to ask for a filter combination pays for the
+filtering, map (including the heatmap raster) and chart builds. `CacheWarmer`
+runs a few daemon threads that build those artefacts ahead of time into the
+same caches, under the same keys, as the app: first for the default sidebar
+state, then for the states requested most often recently, whenever they are
+missing (after a restart, an eviction or a new catalog version).
+
+Warming is held to a budget. Each worker idles between builds so that it is
+busy for at most `cpu_share` of the time, and nothing is built while a target
+cache is fuller than `memory_share` of its entry or byte limit, so warming never
+evicts what sessions are using. `stats()` reports the queue depth and the
+warm-hit ratio: the share of first requests for a state that found it warmed.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+import pandas as pd
+
+from explorer_views import (
+    MAP_MODES, build_fault_type_figure, build_map, build_slip_figure, build_timeline_figure, focus_view,
+    render_map_html,
+)
+from render_cache import state_keys
+from spatial_index import SOUTHERN_ITALY_BOUNDS, select_positions
+
+WARM_WORKERS = int(os.environ.get("FAULTS_WARM_WORKERS", "1")) # 0 disables warming
+WARM_CPU_SHARE = float(os.environ.get("FAULTS_WARM_CPU_SHARE", "0.25"))
+WARM_MEMORY_SHARE = float(os.environ.get("FAULTS_WARM_MEMORY_SHARE", "0.75"))
+WARM_INTERVAL_SECONDS = float(os.environ.get("FAULTS_WARM_INTERVAL_SECONDS", "30"))
+WARM_TOP_STATES = 8 # Most frequent recent states kept warm
+WARM_HISTORY = 500 # Recent requests the frequencies are counted over
+SESSION_BUILD_SECONDS = 60 # A state a session missed is left to that session for this long
+
+
+# ===== Artefacts =====
+def primary_key(state, resources):
+    """(cache name, key) of the artefact that tells whether `state` is warm."""
+    state_key, _, quake_key = state_keys(state, resources["catalog"].version)
+    if state["map_mode"] == MAP_MODES[0]:
+        return "maps", state_key
+    # Client-side maps are not warmed, their filtered events are
+    return "frames", ("quakes",) + quake_key
+
+
+def warm_state(state, resources, caches):
+    """
+    Build whatever the app would build for `state` that is not cached yet: the
+    filtered frames, the fault charts and, for server-side maps, the map HTML and
+    (without a live feed) the timeline. Keys and arguments match main() in the app.
+    Returns the (cache name, key) of every artefact built.
+    """
+    catalog, faults = resources["catalog"], resources["faults"]
+    state_key, risk_key, quake_key = state_keys(state, catalog.version)
+    focus_circle, map_center, map_zoom, _ = focus_view(faults, state["focus_area"], state["focus_radius_km"])
+    built = []
+
+    def cached(cache_name, key, compute):
+        # peek() and put() leave the hit/miss counters to real sessions
+        cache = caches[cache_name]
+        value = cache.peek(key, cache)
+        if value is cache:
+            value = cache.put(key, compute())
+            built.append((cache_name, key))
+        return value
+
+    filtered_faults = cached("frames", ("faults", risk_key), lambda: (
+        faults[faults["seismic_risk"].isin(state["filter_risk"])] if not faults.empty else pd.DataFrame()
+    ))
+    filtered_quakes = cached("frames", ("quakes",) + quake_key, lambda: catalog.take(select_positions(
+        catalog, resources["index"], state["year_range"], state["magnitude_range"],
+        bbox=SOUTHERN_ITALY_BOUNDS, circle=focus_circle,
+        mask=resources["declustering"]().mainshock if state["declustered"] else None
+    )))
+    if filtered_faults is not None and not filtered_faults.empty:
+        cached("figures", ("slip",) + risk_key, lambda: build_slip_figure(filtered_faults).to_json())
+
+        def fault_type_json():
+            type_fig = build_fault_type_figure(filtered_faults)
+            return type_fig.to_json() if type_fig is not None else None
+
+        cached("figures", ("types",) + risk_key, fault_type_json)
+    if primary_key(state, resources)[0] == "maps" and filtered_quakes is not None:
+        cached("maps", state_key, lambda: render_map_html(build_map(
+            filtered_faults, filtered_quakes, state["display_options"], state["selected_tile"],
+            heatmap_mode=state["heatmap_mode"], map_center=map_center, map_zoom=map_zoom,
+            focus_circle=focus_circle, focus_label=state["focus_area"], fault_traces=resources["traces"]
+        )))
+        if not filtered_quakes.empty and resources.get("feed") is None:
+            cached("figures", ("timeline", None) + quake_key, lambda: build_timeline_figure(
+                filtered_quakes, state["year_range"], state["magnitude_range"]
+            ).to_json())
+    return built
+
+
+# ===== Scheduler =====
+class CacheWarmer:
+    """Daemon threads that keep the default and the most requested sidebar states cached."""
+
+    def __init__(self, caches, workers=WARM_WORKERS, cpu_share=WARM_CPU_SHARE, memory_share=WARM_MEMORY_SHARE,
+                 interval=WARM_INTERVAL_SECONDS, top_states=WARM_TOP_STATES, history=WARM_HISTORY):
+        self.caches = caches
+        self.workers = workers
+        self.cpu_share = min(max(cpu_share, 0.01), 1.0)
+        self.memory_share = memory_share
+        self.interval = interval
+        self.top_states = top_states
+        self._resources = None
+        self._default_states = []
+        self._recent = deque(maxlen=history) # Hashable keys of recently requested states
+        self._states = {} # key -> state dict, for the keys in `_recent`
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._warmed = set() # (cache name, key) built by the warmer and not requested yet
+        self._missed = OrderedDict() # (cache name, key) whose cold miss was counted, oldest first
+        self._session_builds = {} # state id -> time a session missed it and started building it
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+        self.warmed = 0
+        self.built = 0
+        self.skipped = 0
+        self.failures = 0
+        self.warm_hits = 0
+        self.cold_misses = 0
+
+    @staticmethod
+    def _state_id(state):
+        return tuple(sorted(
+            (name, tuple(sorted(value)) if isinstance(value, list) else value) for name, value in state.items()
+        ))
+
+    def start(self):
+        """Start the scheduler and worker threads (no-op without workers or when running)."""
+        if self._threads or self.workers <= 0:
+            return self
+        self._threads.append(threading.Thread(target=self._schedule, name="cache-warmer-scheduler", daemon=True))
+        for number in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f"cache-warmer-{number}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def configure(self, resources, default_states):
+        """
+        Data the artefacts are built from ({"catalog", "index", "faults", "traces", "feed",
+        "declustering"}, the last a function returning the catalog's `Declustering`) and the
+        states to keep warm regardless of requests. Called on every rerun; a new catalog
+        version or default state schedules a warming round straight away.
+        """
+        with self._lock:
+            changed = (
+                self._resources is None or self._resources["catalog"].version != resources["catalog"].version
+                or [self._state_id(state) for state in default_states]
+                != [self._state_id(state) for state in self._default_states]
+            )
+            self._resources = resources
+            self._default_states = list(default_states)
+        if changed:
+            self._wake.set()
+
+    def record(self, state):
+        """Count a session's request for `state`; call before its artefacts are looked up."""
+        state_id = self._state_id(state)
+        with self._lock:
+            if self._resources is None:
+                return
+            cache_name, key = primary_key(state, self._resources)
+            now = time.monotonic()
+            self._session_builds = {
+                other: since for other, since in self._session_builds.items() if now - since < SESSION_BUILD_SECONDS
+            }
+            if key not in self.caches[cache_name]:
+                # Reruns while the session builds it are not new first requests
+                if (cache_name, key) not in self._missed:
+                    self.cold_misses += 1
+                    self._missed[(cache_name, key)] = now
+                    while len(self._missed) > self._recent.maxlen:
+                        self._missed.popitem(last=False)
+                self._session_builds[state_id] = now
+            else:
+                self._missed.pop((cache_name, key), None) # A later eviction makes it cold again
+                if (cache_name, key) in self._warmed:
+                    self._warmed.discard((cache_name, key))
+                    self.warm_hits += 1
+            oldest = self._recent[0] if len(self._recent) == self._recent.maxlen else None
+            self._recent.append(state_id)
+            self._states[state_id] = dict(state)
+            if oldest is not None and oldest not in self._recent:
+                del self._states[oldest]
+
+    def candidates(self):
+        """Default states, then the most frequent recent states, that are not cached."""
+        with self._lock:
+            resources = self._resources
+            if resources is None:
+                return []
+            frequent = [self._states[state_id] for state_id, _ in Counter(self._recent).most_common(self.top_states)]
+            states = []
+            for state in self._default_states + frequent:
+                cache_name, key = primary_key(state, resources)
+                if key not in self.caches[cache_name] and state not in states:
+                    states.append(state)
+            return states
+
+    def _over_budget(self):
+        return any(
+            len(cache) >= self.memory_share * cache.max_entries
+            or cache.total_bytes >= self.memory_share * cache.max_bytes
+            for cache in self.caches.values()
+        )
+
+    def _schedule(self):
+        while True:
+            for state in self.candidates():
+                state_id = self._state_id(state)
+                with self._lock:
+                    if state_id in self._pending:
+                        continue
+                    self._pending.add(state_id)
+                self._queue.put(state)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _done(self, state):
+        # Queued or being built states are not scheduled again
+        with self._lock:
+            self._pending.discard(self._state_id(state))
+
+    def _work(self):
+        while True:
+            state = self._queue.get()
+            with self._lock:
+                resources = self._resources
+                since = self._session_builds.get(self._state_id(state))
+                session_building = since is not None and time.monotonic() - since < SESSION_BUILD_SECONDS
+            if session_building: # Building it twice would only slow that session down
+                self._done(state)
+                continue
+            if self._over_budget():
+                self.skipped += 1
+                self._done(state)
+                continue
+            started = time.perf_counter()
+            try:
+                built = warm_state(state, resources, self.caches)
+            except Exception: # A state that cannot be built is left to the session that asks for it
+                self.failures += 1
+                self._done(state)
+                continue
+            busy = time.perf_counter() - started
+            self._done(state)
+            with self._lock:
+                self.built += len(built)
+                primary = primary_key(state, resources)
+                if primary in built: # Otherwise a session got there first
+                    self.warmed += 1
+                    self._warmed.add(primary)
+            # Idle long enough to stay within the CPU share
+            time.sleep(busy * (1.0 / self.cpu_share - 1.0))
+
+    def stats(self):
+        first_requests = self.warm_hits + self.cold_misses
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "states_warmed": self.warmed,
+            "artefacts_built": self.built,
+            "skipped_over_budget": self.skipped,
+            "failures": self.failures,
+            "warm_hits": self.warm_hits,
+            "cold_misses": self.cold_misses,
+            "warm_hit_ratio": self.warm_hits / first_requests if first_requests else 0.0,
+        }
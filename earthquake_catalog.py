@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Earthquake catalog loading for the Southern Italy explorer.
+
+A catalog keeps its events sorted by (year, magnitude) so the sidebar filters
+are answered with binary searches over the sorted keys instead of boolean masks
+over every event. Only the rows that survive the filters are materialised, so a
+slider move costs O(years * log N + matches) rather than a scan of the catalog.
+
+Supported sources:
+    - the built-in ``historical_earthquakes`` records
+    - CSV files (loaded once, sorted in memory)
+    - Arrow IPC / Feather files (memory-mapped, rows taken on demand)
+    - Parquet files (only the row groups holding matching rows are read)
+
+Rows are returned in a compact schema (see ROW_DTYPES): small integer years and
+deaths, float32 coordinates and categorical text. In-memory catalogs keep only
+the sorted key arrays plus flat arrays for the remaining columns; text lives in
+out-of-line `StringTable`s and is decoded only for the rows a query returns.
+`to_arrays`/`from_arrays` turn a catalog into named arrays and back, e.g. to
+share one memory-mapped copy between processes (see shared_catalog).
+
+Arrow and Parquet support needs the optional ``pyarrow`` package.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# ===== Catalog Schema =====
+CATALOG_COLUMNS = ["year", "location", "magnitude", "lat", "lon", "deaths", "description"]
+# Numeric columns kept in memory for every event; everything else is fetched per query
+KEY_COLUMNS = ["year", "magnitude", "lat", "lon"]
+# Instrumental catalogs often lack the descriptive columns, fill them with neutral values
+OPTIONAL_DEFAULTS = {"location": "", "deaths": 0, "description": ""}
+# Dtypes of materialised rows; magnitudes stay float64 so slider bounds compare exactly
+ROW_DTYPES = {"year": np.int16, "lat": np.float32, "lon": np.float32, "deaths": np.int32}
+CATEGORICAL_COLUMNS = ["location", "description"]
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+CSV_EXTENSIONS = (".csv", ".txt")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise ImportError(
+            "Reading Arrow/Parquet earthquake catalogs requires the 'pyarrow' package "
+            "(pip install pyarrow)."
+        ) from exc
+
+
+def _check_key_columns(columns):
+    missing = [col for col in KEY_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"Earthquake catalog is missing required columns: {', '.join(missing)}")
+
+
+def _fill_optional_columns(frame):
+    for col, default in OPTIONAL_DEFAULTS.items():
+        if col not in frame.columns:
+            frame[col] = default
+    return frame
+
+
+def _compact_rows(frame):
+    """Cast catalog rows to the compact schema (ROW_DTYPES and categorical text)."""
+    for col, dtype in ROW_DTYPES.items():
+        if col in frame.columns:
+            values = frame[col].fillna(0) if col == "deaths" else frame[col]
+            frame[col] = values.astype(dtype)
+    for col in CATEGORICAL_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].astype("category")
+    return frame[_ordered_columns(frame.columns)]
+
+
+def _ordered_columns(columns):
+    # Catalog columns in schema order, then any extra columns of the source
+    return [col for col in CATALOG_COLUMNS if col in columns] + [col for col in columns if col not in CATALOG_COLUMNS]
+
+
+def _concat_ranges(starts, stops):
+    # Expand [start, stop) pairs into one flat index array without a Python loop
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+# ===== String Table =====
+class StringTable:
+    """
+    Out-of-line text column: the distinct strings UTF-8 encoded back to back in one
+    byte buffer, plus a compact integer code per event. The catalog holds no
+    per-event string objects and decodes strings only for the rows a query
+    returns. Every part is a flat array, so tables can be memory-mapped.
+    """
+
+    def __init__(self, data, offsets, codes):
+        self.data = data # uint8 buffer of the distinct strings
+        self.offsets = offsets # int64 start of every distinct string, plus the end of the buffer
+        self.codes = codes # int8/16/32, whichever fits the distinct count
+
+    @classmethod
+    def from_values(cls, values):
+        categorical = pd.Categorical(pd.Series(values).fillna("").astype(str))
+        encoded = [text.encode("utf-8") for text in categorical.categories]
+        offsets = np.concatenate([[0], np.cumsum([len(text) for text in encoded])]).astype(np.int64)
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, categorical.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes + self.codes.nbytes
+
+    def strings(self, codes):
+        """Decoded strings for the given distinct-string codes."""
+        codes = np.asarray(codes, dtype=np.int64)
+        bounds = zip(self.offsets[codes].tolist(), self.offsets[codes + 1].tolist())
+        return [bytes(self.data[start:stop]).decode("utf-8") for start, stop in bounds]
+
+    def take(self, positions):
+        """Categorical of the strings at `positions`; only their distinct values are decoded."""
+        used, codes = np.unique(self.codes[positions], return_inverse=True)
+        return pd.Categorical.from_codes(codes.reshape(-1), categories=self.strings(used))
+
+    def values(self):
+        return np.asarray(self.strings(np.arange(len(self.offsets) - 1)), dtype=object)[self.codes]
+
+    def to_arrays(self):
+        return {"data": self.data, "offsets": self.offsets, "codes": self.codes}
+
+
+# ===== In-Memory Catalog =====
+class EarthquakeCatalog:
+    """Earthquake events sorted by (year, magnitude) with binary-search filtering."""
+
+    def __init__(self, frame, source="built-in"):
+        _check_key_columns(frame.columns)
+        frame = _fill_optional_columns(frame.dropna(subset=KEY_COLUMNS))
+        # Sort once at load time so every later query is a binary search
+        frame = frame.sort_values(["year", "magnitude"], kind="mergesort").reset_index(drop=True)
+        self.source = source
+        self._index_keys(
+            frame["year"].to_numpy(),
+            frame["magnitude"].to_numpy(),
+            frame["lat"].to_numpy(),
+            frame["lon"].to_numpy(),
+        )
+        # Key columns live only in the sorted key arrays; every other column becomes a flat
+        # array (numbers) or a StringTable (text), and `take` reassembles full rows
+        frame = _compact_rows(frame.drop(columns=KEY_COLUMNS))
+        self._columns = {
+            col: frame[col].to_numpy() if pd.api.types.is_numeric_dtype(frame[col])
+            else StringTable.from_values(frame[col])
+            for col in frame.columns
+        }
+
+    def _index_keys(self, years, magnitudes, lat, lon, order=None):
+        # `order` maps sorted positions to storage rows; None means storage is already sorted
+        if order is not None:
+            years, magnitudes, lat, lon = years[order], magnitudes[order], lat[order], lon[order]
+        self._order = order
+        self.years = np.asarray(years, dtype=np.int32)
+        self.magnitudes = np.asarray(magnitudes, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+
+        # Start position of every distinct year inside the sorted keys
+        self._year_values, self._year_starts = np.unique(self.years, return_index=True)
+        if len(self.magnitudes):
+            self._mag_floor = float(self.magnitudes.min())
+            self._mag_span = float(self.magnitudes.max()) - self._mag_floor
+        else:
+            self._mag_floor, self._mag_span = 0.0, 0.0
+
+        # Composite key: year rank * stride + magnitude offset. It is monotonic in
+        # (year, magnitude) so one vectorized searchsorted finds the magnitude window
+        # inside every selected year at once.
+        self._key_stride = self._mag_span + 1.0
+        year_lengths = np.diff(np.append(self._year_starts, len(self.years)))
+        year_rank = np.repeat(np.arange(len(self._year_values)), year_lengths)
+        self._keys = year_rank * self._key_stride + (self.magnitudes - self._mag_floor)
+
+    def __len__(self):
+        return len(self.years)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def year_bounds(self):
+        if self.empty:
+            return 0, 0
+        return int(self._year_values[0]), int(self._year_values[-1])
+
+    def magnitude_bounds(self):
+        return self._mag_floor, self._mag_floor + self._mag_span
+
+    def _position_ranges(self, year_range, magnitude_range):
+        # One [start, stop) window of sorted positions per selected year
+        first = np.searchsorted(self._year_values, year_range[0], side="left")
+        last = np.searchsorted(self._year_values, year_range[1], side="right")
+        mag_low = max(float(magnitude_range[0]), self._mag_floor) - self._mag_floor
+        mag_high = min(float(magnitude_range[1]), self._mag_floor + self._mag_span) - self._mag_floor
+        if first >= last or mag_low > mag_high:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        base = np.arange(first, last) * self._key_stride
+        starts = np.searchsorted(self._keys, base + mag_low, side="left")
+        stops = np.searchsorted(self._keys, base + mag_high, side="right")
+        return starts, stops
+
+    def positions(self, year_range, magnitude_range):
+        """Sorted positions of the events inside both ranges (inclusive)."""
+        return _concat_ranges(*self._position_ranges(year_range, magnitude_range))
+
+    def count(self, year_range, magnitude_range):
+        """Number of events inside both ranges, without materialising their positions."""
+        starts, stops = self._position_ranges(year_range, magnitude_range)
+        return int((stops - starts).sum())
+
+    def in_ranges(self, positions, year_range, magnitude_range):
+        """Boolean mask of which `positions` fall inside both ranges."""
+        years = self.years[positions]
+        magnitudes = self.magnitudes[positions]
+        return (
+            (years >= year_range[0]) & (years <= year_range[1]) &
+            (magnitudes >= magnitude_range[0]) & (magnitudes <= magnitude_range[1])
+        )
+
+    def take(self, positions):
+        """Materialise the catalog rows at the given sorted positions."""
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = {
+            "year": self.years[positions].astype(ROW_DTYPES["year"]),
+            "magnitude": self.magnitudes[positions],
+            "lat": self.lat[positions].astype(ROW_DTYPES["lat"]),
+            "lon": self.lon[positions].astype(ROW_DTYPES["lon"]),
+        }
+        for col, values in self._columns.items():
+            rows[col] = values.take(positions) if isinstance(values, StringTable) else values[positions]
+        return pd.DataFrame(rows, index=positions, columns=_ordered_columns(rows))
+
+    def column(self, name):
+        """One column for every event, in sorted order (optional columns get their default)."""
+        keys = {"year": self.years, "magnitude": self.magnitudes, "lat": self.lat, "lon": self.lon}
+        if name in keys:
+            return keys[name]
+        if name not in self._columns:
+            return np.full(len(self), OPTIONAL_DEFAULTS[name])
+        values = self._columns[name]
+        return values.values() if isinstance(values, StringTable) else values
+
+    def _key_bytes(self):
+        return sum(array.nbytes for array in self._key_arrays().values())
+
+    def memory_usage(self):
+        """Bytes held: sorted key arrays, numeric columns and string tables."""
+        usage = {"keys": self._key_bytes(), "columns": 0, "strings": 0}
+        for values in self._columns.values():
+            usage["strings" if isinstance(values, StringTable) else "columns"] += values.nbytes
+        return usage
+
+    # ===== Array Snapshots =====
+    def _key_arrays(self):
+        arrays = {
+            "years": self.years, "magnitudes": self.magnitudes, "lat": self.lat, "lon": self.lon,
+            "keys": self._keys, "year_values": self._year_values, "year_starts": self._year_starts,
+            "magnitude_bounds": np.array([self._mag_floor, self._mag_span]),
+        }
+        if self._order is not None:
+            arrays["order"] = self._order
+        return arrays
+
+    def _restore_keys(self, arrays):
+        # Inverse of `_key_arrays`; the arrays are used as they are (possibly read-only mappings)
+        self.years, self.magnitudes = arrays["years"], arrays["magnitudes"]
+        self.lat, self.lon = arrays["lat"], arrays["lon"]
+        self._keys, self._year_values, self._year_starts = arrays["keys"], arrays["year_values"], arrays["year_starts"]
+        self._mag_floor, self._mag_span = (float(value) for value in arrays["magnitude_bounds"])
+        self._key_stride = self._mag_span + 1.0
+        self._order = arrays.get("order")
+
+    def to_arrays(self):
+        """Every array the catalog holds, by name; `from_arrays` rebuilds the catalog from them."""
+        arrays = self._key_arrays()
+        for col, values in self._columns.items():
+            if isinstance(values, StringTable):
+                arrays.update({f"text:{col}:{part}": array for part, array in values.to_arrays().items()})
+            else:
+                arrays[f"column:{col}"] = values
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, source):
+        """Catalog over the (e.g. memory-mapped, read-only) arrays returned by `to_arrays`."""
+        catalog = cls.__new__(cls)
+        catalog.source = source
+        catalog._restore_keys(arrays)
+        catalog._columns = {}
+        for name in arrays:
+            kind, _, col = name.partition(":")
+            if kind == "column":
+                catalog._columns[col] = arrays[name]
+            elif kind == "text" and name.endswith(":codes"):
+                col = col[:-len(":codes")]
+                catalog._columns[col] = StringTable(
+                    arrays[f"text:{col}:data"], arrays[f"text:{col}:offsets"], arrays[name]
+                )
+        return catalog
+
+    def query(self, year_range, magnitude_range):
+        """Events within the year and magnitude ranges as a DataFrame."""
+        return self.take(self.positions(year_range, magnitude_range))
+
+
+# ===== Arrow / Parquet Catalogs =====
+class ArrowCatalog(EarthquakeCatalog):
+    """Catalog backed by a memory-mapped Arrow table; only filtered rows are copied."""
+
+    def __init__(self, table, source, key_arrays=None):
+        _check_key_columns(table.column_names)
+        self.table = table
+        self.source = source
+        if key_arrays is not None:
+            self._restore_keys(key_arrays)
+            return
+        keys = {col: table.column(col).to_numpy() for col in KEY_COLUMNS}
+        self._index_keys(keys["year"], keys["magnitude"], keys["lat"], keys["lon"], _sort_order(keys))
+
+    @classmethod
+    def from_file(cls, path, key_arrays=None):
+        _require_pyarrow()
+        import pyarrow.feather as feather
+
+        return cls(feather.read_table(path, memory_map=True), source=path, key_arrays=key_arrays)
+
+    def to_arrays(self):
+        # Only the key arrays; every other column stays in the file
+        return self._key_arrays()
+
+    @classmethod
+    def from_arrays(cls, arrays, source):
+        return cls.from_file(source, key_arrays=arrays)
+
+    def _storage_rows(self, positions):
+        return positions if self._order is None else self._order[positions]
+
+    def take(self, positions):
+        rows = self.table.take(self._storage_rows(positions))
+        return _compact_rows(_fill_optional_columns(rows.to_pandas()))
+
+    def _read_column(self, name):
+        return self.table.column(name).to_numpy()
+
+    def column(self, name):
+        try:
+            values = self._read_column(name)
+        except KeyError:
+            return np.full(len(self), OPTIONAL_DEFAULTS[name])
+        return values if self._order is None else values[self._order]
+
+    def memory_usage(self):
+        """Bytes held in memory; only the key arrays, the other columns stay on disk."""
+        return {"keys": self._key_bytes(), "columns": 0, "strings": 0}
+
+
+class ParquetCatalog(ArrowCatalog):
+    """
+    Catalog backed by a Parquet file. The numeric key columns are read once; the
+    remaining columns are read per query from the row groups that hold matches.
+    Catalogs written with `write_sorted_parquet` keep each year window in a few
+    adjacent row groups.
+    """
+
+    def __init__(self, path, key_arrays=None):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.parquet_file = pq.ParquetFile(path)
+        self.source = path
+        _check_key_columns(self.parquet_file.schema_arrow.names)
+        metadata = self.parquet_file.metadata
+        row_counts = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self._row_group_starts = np.concatenate([[0], np.cumsum(row_counts)]).astype(np.int64)
+        if key_arrays is not None:
+            self._restore_keys(key_arrays)
+            return
+
+        key_table = self.parquet_file.read(columns=KEY_COLUMNS)
+        keys = {col: key_table.column(col).to_numpy() for col in KEY_COLUMNS}
+        self._index_keys(keys["year"], keys["magnitude"], keys["lat"], keys["lon"], _sort_order(keys))
+
+    @classmethod
+    def from_arrays(cls, arrays, source):
+        return cls(source, key_arrays=arrays)
+
+    def _read_column(self, name):
+        if name not in self.parquet_file.schema_arrow.names:
+            raise KeyError(name)
+        return self.parquet_file.read(columns=[name]).column(name).to_numpy()
+
+    def take(self, positions):
+        rows = self._storage_rows(positions)
+        if len(rows) == 0:
+            empty = self.parquet_file.schema_arrow.empty_table()
+            return _compact_rows(_fill_optional_columns(empty.to_pandas()))
+
+        # Read only the row groups that contain requested rows, then gather locally
+        groups = np.searchsorted(self._row_group_starts, rows, side="right") - 1
+        needed = np.unique(groups)
+        table = self.parquet_file.read_row_groups(needed.tolist())
+        group_sizes = self._row_group_starts[needed + 1] - self._row_group_starts[needed]
+        local_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+        local_rows = rows - self._row_group_starts[groups] + local_starts[np.searchsorted(needed, groups)]
+        return _compact_rows(_fill_optional_columns(table.take(local_rows).to_pandas()))
+
+
+def _sort_order(keys):
+    # Rows missing a key (NaN after to_numpy) are left out, like the dropna of in-memory catalogs
+    complete = np.flatnonzero(np.logical_and.reduce(
+        [np.isfinite(np.asarray(keys[col], dtype=np.float64)) for col in KEY_COLUMNS]
+    ))
+    order = complete[np.lexsort((keys["magnitude"][complete], keys["year"][complete]))]
+    if len(order) == len(keys["year"]) and np.all(order[1:] > order[:-1]):
+        return None  # File is already sorted, positions map straight to rows
+    return order
+
+
+def write_sorted_parquet(frame, path, row_group_size=100_000):
+    """Write a catalog sorted by (year, magnitude) so row groups align with year windows."""
+    _require_pyarrow()
+    _check_key_columns(frame.columns)
+    frame = frame.sort_values(["year", "magnitude"], kind="mergesort")
+    frame.to_parquet(path, index=False, row_group_size=row_group_size)
+
+
+# ===== Loader =====
+def catalog_version(path):
+    """Identifier that changes whenever the catalog file is replaced or modified."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def load_catalog(path=None, records=None):
+    """
+    Load an earthquake catalog from `path`, or from `records` when no path is given.
+    The file type is chosen from the extension. The returned catalog's `version`
+    identifies its contents for caching.
+    """
+    if not path:
+        catalog = EarthquakeCatalog(pd.DataFrame(records or [], columns=CATALOG_COLUMNS))
+        catalog.version = f"built-in:{len(catalog)}"
+        return catalog
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Earthquake catalog not found: {path}")
+    version = catalog_version(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        catalog = ParquetCatalog(path)
+    elif extension in ARROW_EXTENSIONS:
+        catalog = ArrowCatalog.from_file(path)
+    elif extension in CSV_EXTENSIONS:
+        catalog = EarthquakeCatalog(pd.read_csv(path), source=path)
+    else:
+        raise ValueError(f"Unsupported earthquake catalog format '{extension}' for {path}")
+    catalog.version = version
+    return catalog
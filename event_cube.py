@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-aggregated year x magnitude x region cube of earthquake counts.
+
+Events are binned by year, 0.1-magnitude bin and region (the fault system they
+are associated with, plus one bin for unassociated events). Each non-empty cell
+keeps the event count, summed deaths and maximum magnitude. Cells are stored
+sparsely, sorted by a composite key with the year as the major component, so a
+year window is one contiguous slice. Slider changes therefore cost time
+proportional to the occupied cells, not to the number of events. New events
+are merged in incrementally.
+
+Events whose magnitude is off the 0.1 grid (e.g. reported to two decimals) are
+also kept individually, sorted by magnitude. A magnitude window that starts or
+ends inside a bin recounts that bin's cells from them, so windows stay exact at
+the cost of scanning the off-grid events of at most two bins.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+MAGNITUDE_STEP = 0.1
+MAGNITUDE_BINS = 101 # M0.0 - M10.0
+YEAR_ORIGIN = -10_000 # Keeps year offsets non-negative for any plausible catalog
+FORMAT = 2 # Layout of `to_arrays`; part of snapshot names so older layouts are rebuilt
+
+
+def magnitude_bins(magnitudes):
+    magnitudes = np.clip(np.asarray(magnitudes, dtype=np.float64), 0.0, (MAGNITUDE_BINS - 1) * MAGNITUDE_STEP)
+    # Tolerance so 6.1 stored as 6.0999999 still lands in the 6.1 bin
+    return np.floor(magnitudes / MAGNITUDE_STEP + 1e-6).astype(np.int64)
+
+
+class EventCube:
+    """Sparse (year, magnitude bin, region) aggregate with incremental appends."""
+
+    def __init__(self, n_regions):
+        self.n_regions = n_regions + 1 # Last region collects unassociated events
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.deaths = np.empty(0, dtype=np.int64)
+        self.max_magnitude = np.empty(0, dtype=np.float64)
+        # Off-grid events, sorted by magnitude: exact magnitude, cell key and deaths
+        self.fine_magnitudes = np.empty(0, dtype=np.float64)
+        self.fine_keys = np.empty(0, dtype=np.int64)
+        self.fine_deaths = np.empty(0, dtype=np.int64)
+        self.total = 0 # Events added over the cube's lifetime
+        self.synced = 0 # Events of an external append-only source merged by `sync`
+        self.version = 0 # Bumped on every add, for cache keys
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _encode(self, years, mag_bins, regions):
+        return ((np.asarray(years, dtype=np.int64) - YEAR_ORIGIN) * MAGNITUDE_BINS + mag_bins) * self.n_regions + regions
+
+    def _decode(self, keys):
+        regions = keys % self.n_regions
+        mag_bins = (keys // self.n_regions) % MAGNITUDE_BINS
+        years = keys // (self.n_regions * MAGNITUDE_BINS) + YEAR_ORIGIN
+        return years, mag_bins, regions
+
+    def add(self, years, magnitudes, regions, deaths):
+        """Merge a batch of events; `regions` holds -1 for unassociated events."""
+        magnitudes = np.asarray(magnitudes, dtype=np.float64)
+        if len(magnitudes) == 0:
+            return
+        regions = np.asarray(regions, dtype=np.int64)
+        regions = np.where(regions < 0, self.n_regions - 1, regions)
+        mag_bins = magnitude_bins(magnitudes)
+        keys = self._encode(years, mag_bins, regions)
+        off_grid = np.abs(magnitudes - mag_bins * MAGNITUDE_STEP) > 1e-6
+        deaths = np.asarray(deaths, dtype=np.int64)
+
+        # Aggregate the batch per cell, then merge it with the existing sorted cells
+        batch_keys, inverse = np.unique(keys, return_inverse=True)
+        batch_counts = np.bincount(inverse, minlength=len(batch_keys))
+        batch_deaths = np.bincount(inverse, weights=deaths.astype(np.float64), minlength=len(batch_keys))
+        batch_max = np.full(len(batch_keys), -np.inf)
+        np.maximum.at(batch_max, inverse, magnitudes)
+
+        with self._lock:
+            merged_keys = np.union1d(self.keys, batch_keys)
+            old = np.searchsorted(merged_keys, self.keys)
+            new = np.searchsorted(merged_keys, batch_keys)
+            counts = np.zeros(len(merged_keys), dtype=np.int64)
+            deaths_sum = np.zeros(len(merged_keys), dtype=np.int64)
+            max_magnitude = np.full(len(merged_keys), -np.inf)
+            counts[old], deaths_sum[old], max_magnitude[old] = self.counts, self.deaths, self.max_magnitude
+            counts[new] += batch_counts
+            deaths_sum[new] += batch_deaths.astype(np.int64)
+            max_magnitude[new] = np.maximum(max_magnitude[new], batch_max)
+            self.keys, self.counts, self.deaths, self.max_magnitude = merged_keys, counts, deaths_sum, max_magnitude
+            if off_grid.any():
+                fine_magnitudes = np.concatenate([self.fine_magnitudes, magnitudes[off_grid]])
+                order = np.argsort(fine_magnitudes, kind="stable")
+                self.fine_magnitudes = fine_magnitudes[order]
+                self.fine_keys = np.concatenate([self.fine_keys, keys[off_grid]])[order]
+                self.fine_deaths = np.concatenate([self.fine_deaths, deaths[off_grid]])[order]
+            self.total += len(magnitudes)
+            self.version += 1
+
+    def to_arrays(self):
+        """Cells and event totals as named arrays, for `from_arrays`."""
+        with self._lock:
+            return {
+                "keys": self.keys, "counts": self.counts, "deaths": self.deaths,
+                "max_magnitude": self.max_magnitude, "totals": np.array([self.total, self.synced]),
+                "fine_magnitudes": self.fine_magnitudes, "fine_keys": self.fine_keys, "fine_deaths": self.fine_deaths,
+            }
+
+    @classmethod
+    def from_arrays(cls, n_regions, arrays):
+        """
+        Cube over cells from `to_arrays`. Read-only (e.g. memory-mapped) arrays are
+        fine: `add` builds new cell arrays instead of writing into the old ones.
+        """
+        cube = cls(n_regions)
+        cube.keys, cube.counts = arrays["keys"], arrays["counts"]
+        cube.deaths, cube.max_magnitude = arrays["deaths"], arrays["max_magnitude"]
+        cube.fine_magnitudes, cube.fine_keys = arrays["fine_magnitudes"], arrays["fine_keys"]
+        cube.fine_deaths = arrays["fine_deaths"]
+        cube.total, cube.synced = (int(value) for value in arrays["totals"])
+        return cube
+
+    def sync(self, fetch_since):
+        """
+        Merge the events an append-only source (e.g. a live feed) produced since the
+        last call. `fetch_since(count)` returns (years, magnitudes, regions, deaths) of
+        the events after the source's first `count`, together with its new total,
+        both read from one snapshot of the source.
+        """
+        with self._sync_lock:
+            batch, source_total = fetch_since(self.synced)
+            pending = source_total - self.synced
+            if pending <= 0:
+                return 0
+            self.add(*batch)
+            self.synced = source_total
+            return pending
+
+    def _window(self, year_range, magnitude_range, regions=None):
+        # Cells inside the window: a key slice for the years, then a mask on magnitude bin/region.
+        # An infinite upper bound leaves the window open-ended.
+        with self._lock:
+            keys, counts, deaths, max_magnitude = self.keys, self.counts, self.deaths, self.max_magnitude
+            fine = self.fine_magnitudes, self.fine_keys, self.fine_deaths
+        span = self.n_regions * MAGNITUDE_BINS
+        lo = np.searchsorted(keys, (int(year_range[0]) - YEAR_ORIGIN) * span)
+        hi = len(keys)
+        if np.isfinite(year_range[1]):
+            hi = np.searchsorted(keys, (int(year_range[1]) + 1 - YEAR_ORIGIN) * span)
+        keys = keys[lo:hi]
+        years, mag_bins, cell_regions = self._decode(keys)
+        bin_lo, bin_hi = magnitude_bins([magnitude_range[0], magnitude_range[1]])
+        keep = (mag_bins >= bin_lo) & (mag_bins <= bin_hi)
+        if regions is not None:
+            keep &= np.isin(cell_regions, np.where(np.asarray(regions) < 0, self.n_regions - 1, regions))
+        keys, years, mag_bins, cell_regions = keys[keep], years[keep], mag_bins[keep], cell_regions[keep]
+        counts, deaths, max_magnitude = counts[lo:hi][keep], deaths[lo:hi][keep], max_magnitude[lo:hi][keep]
+        # The edge bins may hold events outside the magnitude window
+        counts, deaths, max_magnitude = counts.copy(), deaths.copy(), max_magnitude.copy()
+        for mag_bin in {int(bin_lo), int(bin_hi)}:
+            self._recount_bin(mag_bin, magnitude_range, keys, mag_bins, counts, deaths, max_magnitude, fine)
+        keep = counts > 0
+        return years[keep], mag_bins[keep], cell_regions[keep], counts[keep], deaths[keep], max_magnitude[keep]
+
+    @staticmethod
+    def _recount_bin(mag_bin, magnitude_range, keys, mag_bins, counts, deaths, max_magnitude, fine):
+        # Reduce the cells of one magnitude bin (in place) to the events inside `magnitude_range`.
+        # On-grid events all sit at the bin edge; off-grid ones are looked up in the sorted store.
+        cells = np.flatnonzero(mag_bins == mag_bin)
+        if not len(cells):
+            return
+        fine_magnitudes, fine_keys, fine_deaths = fine
+        edge = mag_bin * MAGNITUDE_STEP
+        start = 0 if mag_bin == 0 else np.searchsorted(fine_magnitudes, edge - 1e-6)
+        stop = len(fine_magnitudes)
+        if mag_bin < MAGNITUDE_BINS - 1:
+            stop = np.searchsorted(fine_magnitudes, edge + MAGNITUDE_STEP - 1e-6)
+        magnitudes, event_keys = fine_magnitudes[start:stop], fine_keys[start:stop]
+        slots = np.minimum(np.searchsorted(keys[cells], event_keys), len(cells) - 1)
+        in_cells = keys[cells][slots] == event_keys
+        magnitudes, slots, event_deaths = magnitudes[in_cells], slots[in_cells], fine_deaths[start:stop][in_cells]
+        inside = (magnitudes >= magnitude_range[0]) & (magnitudes <= magnitude_range[1])
+
+        off_counts = np.bincount(slots, minlength=len(cells))
+        off_deaths = np.bincount(slots, weights=event_deaths, minlength=len(cells)).astype(np.int64)
+        on_counts, on_deaths = counts[cells] - off_counts, deaths[cells] - off_deaths
+        if not magnitude_range[0] - 1e-6 <= edge <= magnitude_range[1] + 1e-6:
+            on_counts, on_deaths = np.zeros_like(on_counts), np.zeros_like(on_deaths)
+        inside_max = np.full(len(cells), -np.inf)
+        np.maximum.at(inside_max, slots[inside], magnitudes[inside])
+        counts[cells] = on_counts + np.bincount(slots[inside], minlength=len(cells))
+        deaths[cells] = on_deaths + np.bincount(
+            slots[inside], weights=event_deaths[inside], minlength=len(cells)
+        ).astype(np.int64)
+        # The cell maximum is an on-grid event's exact value unless an off-grid event is larger
+        on_max = np.where(np.abs(max_magnitude[cells] - edge) <= 1e-6, max_magnitude[cells], round(edge, 1))
+        max_magnitude[cells] = np.where(on_counts > 0, np.maximum(inside_max, on_max), inside_max)
+
+    def totals(self, year_range, magnitude_range, regions=None):
+        """Event count, summed deaths and maximum magnitude inside the window."""
+        _, _, _, counts, deaths, max_magnitude = self._window(year_range, magnitude_range, regions)
+        return {
+            "events": int(counts.sum()),
+            "deaths": int(deaths.sum()),
+            "max_magnitude": float(max_magnitude.max()) if len(max_magnitude) else None,
+        }
+
+    def _group(self, labels, counts, deaths, max_magnitude, name):
+        values, inverse = np.unique(labels, return_inverse=True)
+        grouped_max = np.full(len(values), -np.inf)
+        np.maximum.at(grouped_max, inverse, max_magnitude)
+        return pd.DataFrame({
+            name: values,
+            "events": np.bincount(inverse, weights=counts, minlength=len(values)).astype(np.int64),
+            "deaths": np.bincount(inverse, weights=deaths, minlength=len(values)).astype(np.int64),
+            "max_magnitude": grouped_max,
+        })
+
+    def by_year(self, year_range, magnitude_range, regions=None):
+        """Per-year events, deaths and maximum magnitude (occupied years only)."""
+        years, _, _, counts, deaths, max_magnitude = self._window(year_range, magnitude_range, regions)
+        return self._group(years, counts, deaths, max_magnitude, "year")
+
+    def by_magnitude(self, year_range, magnitude_range, regions=None):
+        """Per-0.1-bin events, deaths and maximum magnitude."""
+        _, mag_bins, _, counts, deaths, max_magnitude = self._window(year_range, magnitude_range, regions)
+        grouped = self._group(mag_bins, counts, deaths, max_magnitude, "magnitude")
+        grouped["magnitude"] = np.round(grouped["magnitude"] * MAGNITUDE_STEP, 1)
+        return grouped
+
+    def by_region(self, year_range, magnitude_range):
+        """Per-region events, deaths and maximum magnitude; region -1 is unassociated."""
+        _, _, regions, counts, deaths, max_magnitude = self._window(year_range, magnitude_range)
+        grouped = self._group(regions, counts, deaths, max_magnitude, "region")
+        grouped.loc[grouped["region"] == self.n_regions - 1, "region"] = -1
+        return grouped
+
+
+def deadliest_order(deaths, positions):
+    """`positions` ordered by deaths, highest first; ties keep catalog order (like `nlargest`)."""
+    deaths = np.asarray(deaths)[positions]
+    return np.asarray(positions)[np.argsort(-deaths, kind="stable")]
+
+
+def deadliest_positions(catalog, order, year_range, magnitude_range, count=5, chunk=4096):
+    """
+    The `count` deadliest catalog positions inside the window, scanning `order`
+    (from `deadliest_order`) only until enough matching events are found.
+    """
+    found = []
+    for start in range(0, len(order), chunk):
+        candidates = order[start:start + chunk]
+        found.extend(candidates[catalog.in_ranges(candidates, year_range, magnitude_range)][:count - len(found)])
+        if len(found) >= count:
+            break
+    return np.asarray(found, dtype=np.int64)
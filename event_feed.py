@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental ingestion of a local earthquake feed.
+
+A feed is a CSV or QuakeML file that another process keeps appending to.
+`FeedTailer.poll()` reads only the bytes added since the previous poll, parses
+the complete records among them and appends them to a bounded ring buffer.
+The oldest events are dropped once the buffer is full. A shrinking file
+(truncation or rotation) restarts the tail from the beginning.
+"""
+import codecs
+import io
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from earthquake_catalog import CATALOG_COLUMNS, OPTIONAL_DEFAULTS
+from spatial_index import haversine_km
+
+DEFAULT_CAPACITY = 100_000
+NUMERIC_DTYPES = {"year": np.int64, "magnitude": np.float64, "lat": np.float64, "lon": np.float64, "deaths": np.int64}
+
+_EVENT_END = re.compile(r"</(?:\w+:)?event\s*>")
+_EVENT_START = re.compile(r"<(?:\w+:)?event[\s>]")
+_TAG_PREFIX = re.compile(r"<(/?)\w+:")
+_PREFIXED_ATTRIBUTE = re.compile(r"\s[\w-]+:[\w-]+=\"[^\"]*\"")
+
+
+# ===== Ring Buffer =====
+class EventRingBuffer:
+    """Fixed-capacity columnar store of the most recent feed events."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._columns = {
+            col: np.zeros(capacity, dtype=NUMERIC_DTYPES.get(col, object)) for col in CATALOG_COLUMNS
+        }
+        self._next = 0 # Slot the next event is written to
+        self.total = 0 # Events appended over the buffer's lifetime
+        self.version = 0 # Bumped on every append, for cache keys
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, events):
+        """Append a DataFrame of events with the catalog columns."""
+        if events.empty:
+            return
+        # Only the newest `capacity` events can survive the append
+        events = events.iloc[-self.capacity:]
+        count = len(events)
+        with self._lock:
+            slots = (self._next + np.arange(count)) % self.capacity
+            for col, values in self._columns.items():
+                values[slots] = events[col].to_numpy()
+            self._next = (self._next + count) % self.capacity
+            self.total += count
+            self.version += 1
+
+    def _newest(self, count):
+        # The newest `count` buffered events, oldest first; the caller holds the lock
+        order = (self._next - count + np.arange(count)) % self.capacity
+        return pd.DataFrame({col: values[order] for col, values in self._columns.items()})
+
+    def frame(self):
+        """Buffered events, oldest first, as a DataFrame."""
+        with self._lock:
+            return self._newest(len(self))
+
+    def since(self, total):
+        """
+        Events appended after the first `total` (those still buffered) and the new
+        total, read together so an append in between cannot skip or repeat events.
+        """
+        with self._lock:
+            return self._newest(min(max(self.total - total, 0), len(self))), self.total
+
+
+# ===== Record Parsing =====
+def _normalise_events(frame):
+    # Map a parsed batch onto the catalog schema
+    if "year" not in frame.columns and "time" in frame.columns:
+        frame["year"] = pd.to_datetime(frame["time"], errors="coerce", utc=True).dt.year
+    for col, default in OPTIONAL_DEFAULTS.items():
+        if col not in frame.columns:
+            frame[col] = default
+    # Malformed values become NaN, and rows missing a required field are skipped
+    for col in NUMERIC_DTYPES:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    frame = frame.dropna(subset=["year", "magnitude", "lat", "lon"])
+    frame["deaths"] = frame["deaths"].fillna(0)
+    frame = frame.astype({col: dtype for col, dtype in NUMERIC_DTYPES.items()})
+    return frame[CATALOG_COLUMNS]
+
+
+def parse_csv_lines(header, text):
+    """
+    Parse complete CSV lines (without header) using the feed's header line. Lines
+    with the wrong number of fields or unparseable values are skipped.
+    """
+    return _normalise_events(pd.read_csv(io.StringIO(header + text), on_bad_lines="skip"))
+
+
+def _child_text(element, path):
+    node = element.find(path)
+    return node.text.strip() if node is not None and node.text else None
+
+
+def parse_quakeml_events(text):
+    """Parse a string of complete QuakeML <event> elements, skipping malformed ones."""
+    records = []
+    # Events are parsed one at a time, outside their document, so drop namespace prefixes
+    text = _PREFIXED_ATTRIBUTE.sub("", _TAG_PREFIX.sub(r"<\1", text))
+    for chunk in _EVENT_END.split(text):
+        start = _EVENT_START.search(chunk)
+        if not start:
+            continue
+        try:
+            event = ET.fromstring(chunk[start.start():] + "</event>")
+        except ET.ParseError:
+            continue
+        origin_time = _child_text(event, "origin/time/value")
+        records.append({
+            "time": origin_time,
+            "location": _child_text(event, "description/text") or "",
+            "magnitude": pd.to_numeric(_child_text(event, "magnitude/mag/value"), errors="coerce"),
+            "lat": pd.to_numeric(_child_text(event, "origin/latitude/value"), errors="coerce"),
+            "lon": pd.to_numeric(_child_text(event, "origin/longitude/value"), errors="coerce"),
+        })
+    return _normalise_events(pd.DataFrame(records, columns=["time", "location", "magnitude", "lat", "lon"]))
+
+
+# ===== Tailer =====
+class FeedTailer:
+    """Tail a CSV or QuakeML feed file into an `EventRingBuffer`."""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.format = "quakeml" if path.lower().endswith((".xml", ".quakeml", ".qml")) else "csv"
+        self.buffer = EventRingBuffer(capacity)
+        self._offset = 0
+        self._inode = None
+        self._pending = "" # Incomplete trailing record from the previous poll
+        self._header = None
+        # Holds back the bytes of a UTF-8 character split across two polls
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self._offset, self._pending, self._header = 0, "", None
+        self._decoder.reset()
+
+    def poll(self):
+        """Ingest records appended since the last poll; returns how many were added."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return 0 # Feed not created yet
+            size = stat.st_size
+            if size < self._offset or stat.st_ino != self._inode:
+                self._reset() # First poll, truncated or rotated
+                self._inode = stat.st_ino
+            if size == self._offset:
+                return 0
+            with open(self.path, "rb") as feed:
+                feed.seek(self._offset)
+                data = feed.read(size - self._offset)
+            self._offset = size
+            text = self._pending + self._decoder.decode(data)
+
+            if self.format == "csv":
+                if self._header is None:
+                    if "\n" not in text:
+                        self._pending = text
+                        return 0
+                    self._header, text = text.split("\n", 1)
+                    self._header += "\n"
+                complete, _, self._pending = text.rpartition("\n")
+                events = parse_csv_lines(self._header, complete + "\n") if complete.strip() else None
+            else:
+                matches = list(_EVENT_END.finditer(text))
+                if not matches:
+                    self._pending = text
+                    return 0
+                cut = matches[-1].end()
+                complete, self._pending = text[:cut], text[cut:]
+                events = parse_quakeml_events(complete)
+
+            if events is None or events.empty:
+                return 0
+            self.buffer.append(events)
+            return len(events)
+
+    def events(self, year_range=None, magnitude_range=None, bbox=None, circle=None):
+        """
+        Buffered events, optionally filtered like the catalog: year/magnitude ranges,
+        a (south, west, north, east) `bbox` and a (lat, lon, radius_km) `circle`.
+        """
+        events = self.buffer.frame()
+        keep = np.ones(len(events), dtype=bool)
+        if year_range is not None:
+            keep &= events["year"].between(*year_range).to_numpy()
+        if magnitude_range is not None:
+            keep &= events["magnitude"].between(*magnitude_range).to_numpy()
+        if bbox is not None:
+            south, west, north, east = bbox
+            keep &= (events["lat"].between(south, north) & events["lon"].between(west, east)).to_numpy()
+        if circle is not None:
+            lat, lon, radius_km = circle
+            keep &= haversine_km(lat, lon, events["lat"].to_numpy(), events["lon"].to_numpy()) <= radius_km
+        return events[keep]
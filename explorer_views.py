@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+"""
+Map and chart builders for the Southern Italy explorer.
+
+Everything here takes already-filtered DataFrames and returns Folium/Plotly
+objects without touching Streamlit, so results can be cached, rendered to
+HTML/JSON and reused outside of a Streamlit session.
+
+Folium, Plotly Express and the custom map layers are imported inside the
+builders that need them, so importing this module (and starting the app) does
+not pay for them before the first map or chart is actually built.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from event_cube import MAGNITUDE_BINS, MAGNITUDE_STEP, magnitude_bins
+from risk_heatmap import risk_heat_points
+from stage_profiler import stage
+
+MAP_CENTER = [40.0, 15.5] # Slightly adjusted center
+MAP_ZOOM = 6
+MAP_HEIGHT = 650
+MAP_TILE_OPTIONS = ['CartoDB positron', 'OpenStreetMap', 'CartoDB dark_matter']
+HEATMAP_MODES = ["Precomputed raster", "Point heatmap", "Probabilistic hazard (PGA)"]
+MAP_MODES = ["Server-side filtering", "Client-side filtering", "Time playback"]
+FULL_EXTENT_OPTION = "Southern Italy (full extent)"
+# Large-data charts: the timeline never sends more points than this (so its JSON stays bounded),
+# switches to WebGL above WEBGL_THRESHOLD points, and the slip-rate chart shows at most SLIP_MAX_BARS bars
+TIMELINE_MAX_POINTS = 5000
+TIMELINE_PINNED = 250 # Largest and deadliest events always plotted individually
+WEBGL_THRESHOLD = 1000
+SLIP_MAX_BARS = 40
+RISK_COLORS = {
+    'Low': '#2ECC71', # Emerald
+    'Moderate': '#3498DB', # Peter River
+    'Moderate to High': '#9B59B6', # Amethyst
+    'High': '#F39C12', # Orange
+    'Very High': '#E74C3C' # Alizarin
+}
+
+
+# ===== Map =====
+def focus_view(faults, focus_area, focus_radius_km):
+    """
+    (focus_circle, map_center, map_zoom, focus_radius_km) for the sidebar focus area:
+    a radius around the named fault system, or the full extent without a circle (and
+    without a radius, which then has no effect).
+    """
+    if focus_area == FULL_EXTENT_OPTION:
+        return None, MAP_CENTER, MAP_ZOOM, None
+    focus_fault = faults[faults["name"] == focus_area].iloc[0]
+    focus_circle = (focus_fault["latitude"], focus_fault["longitude"], focus_radius_km)
+    map_zoom = int(min(max(round(math.log2(20000 / focus_radius_km)), 6), 10)) # Fit the radius in view
+    return focus_circle, [focus_fault["latitude"], focus_fault["longitude"]], map_zoom, focus_radius_km
+
+
+def build_map(filtered_faults, filtered_quakes, display_options, selected_tile,
+              heatmap_mode=HEATMAP_MODES[0], map_center=MAP_CENTER, map_zoom=MAP_ZOOM,
+              focus_circle=None, focus_label=None, fault_traces=None, client_filters=None, playback=None):
+    """
+    Folium map with the tile layers and the selected data layers.
+    `focus_circle` is an optional (lat, lon, radius_km) outline labelled `focus_label`.
+    `fault_traces` maps fault system names to `FaultTrace` geometry drawn at the
+    level of detail suited to `map_zoom`.
+    `client_filters` (year_bounds, magnitude_bounds, year_range, magnitude_range keyword
+    arguments for `ClientFilterQuakeLayer`) ships all of `filtered_quakes` and filters
+    them by year and magnitude in the browser instead.
+    `playback` (`PlaybackFrames` of the same events) replays them frame by frame,
+    with the seismic moment they release accumulating on its own layer.
+    Maps showing earthquakes, other than playbacks, get a `LiveFeedSlot` so that
+    `with_live_feed` can add feed events to the rendered HTML.
+    """
+    import folium
+    from hazard_raster import hazard_overlay
+    from map_layers import (
+        BATCH_RENDER_THRESHOLD, COORDINATE_DECIMALS, BatchQuakeLayer, ClientFilterQuakeLayer, PlaybackLayer,
+        LiveFeedSlot, PointHeatMap, magnitude_styles,
+    )
+    from seismic_hazard import hazard_map_layers
+
+    # Initialize the Folium map
+    m = folium.Map(
+        location=map_center,
+        zoom_start=map_zoom,
+        tiles=None, # Start with no tiles, add them below
+        control_scale=True
+    )
+
+    # Add base tile layers first using the selected_tile from the sidebar as the default visible one
+    # The name parameter is crucial for the LayerControl
+    # --- REMOVE Stamen tiles from dictionary ---
+    tiles = {
+        'CartoDB positron': folium.TileLayer(
+            'CartoDB positron',
+            attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors © <a href="https://carto.com/attributions">CARTO</a>',
+            name='CartoDB Positron'
+        ),
+        'OpenStreetMap': folium.TileLayer(
+            'OpenStreetMap',
+            attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
+            name='OpenStreetMap'
+        ),
+        'CartoDB dark_matter': folium.TileLayer(
+            'CartoDB dark_matter',
+            attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors © <a href="https://carto.com/attributions">CARTO</a>',
+            name='CartoDB Dark Matter'
+        )
+    }
+
+    # Add the selected tile layer first to make it the default visible layer
+    if selected_tile in tiles:
+        tiles[selected_tile].add_to(m)
+    else: # Fallback if selected_tile somehow becomes invalid
+         tiles['CartoDB positron'].add_to(m)
+
+    # Add the other tile layers for selection in LayerControl
+    for tile_name, tile_layer in tiles.items():
+        if tile_name != selected_tile:
+            tile_layer.add_to(m)
+
+
+    # Add Fault Systems Layer
+    if "Fault Systems" in display_options and not filtered_faults.empty:
+        with stage("map.faults"):
+            fault_group = folium.FeatureGroup(name="Fault Systems", show=True).add_to(m)
+            for _, fault in filtered_faults.iterrows():
+                # --- CHANGE Fault Icon ---
+                icon = folium.Icon(
+                    color="white", # Background of icon circle
+                    icon_color=fault["color"], # Color of the icon itself
+                    icon="exclamation-triangle", # General hazard icon
+                    # Other options: 'mountain', 'wave-square', 'bolt', 'atom'
+                    prefix="fa" # Font Awesome prefix
+                )
+
+                popup_html = f"""
+                <div style="width: 300px; font-family: Arial, sans-serif; font-size: 13px;">
+                    <h4 style="color: {fault['color']}; margin-bottom: 5px;">{fault['name']}</h4>
+                    <hr style="margin-top: 0; margin-bottom: 10px;">
+                    <p><b>Description:</b> {fault['description']}</p>
+                    <p><b>Types:</b> {fault['fault_types']}</p>
+                    <p><b>Drivers:</b> {fault['tectonic_drivers']}</p>
+                    <p><b>Examples:</b> {fault['examples']}</p>
+                    <p><b>Last Major EQ:</b> {fault['last_major_earthquake']}</p>
+                    <p><b>Seismic Risk:</b> <span style="font-weight: bold; color: {fault['color']};">{fault['seismic_risk']}</span></p>
+                    <p><b>Slip Rate:</b> {fault['annual_slip_rate']:.1f} mm/year</p>
+                </div>
+                """
+
+                folium.Marker(
+                    location=[fault["latitude"], fault["longitude"]],
+                    popup=folium.Popup(popup_html, max_width=350),
+                    tooltip=f"<b>{fault['name']}</b><br>Risk: {fault['seismic_risk']}",
+                    icon=icon
+                ).add_to(fault_group)
+
+                trace = (fault_traces or {}).get(fault["name"])
+                trace_parts = trace.at_zoom(map_zoom) if trace is not None else []
+                if trace_parts:
+                    # Real fault trace, simplified to the current zoom; line weight scales with slip rate
+                    trace_style = dict(
+                        color=fault["color"],
+                        weight=2 + fault["annual_slip_rate"],
+                        opacity=0.8,
+                        tooltip=f"{fault['name']} (Slip: {fault['annual_slip_rate']} mm/yr)"
+                    )
+                    if trace.kind == "polygon":
+                        folium.Polygon(trace_parts, fill=True, fill_opacity=0.15, **trace_style).add_to(fault_group)
+                    else:
+                        folium.PolyLine(trace_parts, **trace_style).add_to(fault_group)
+                else:
+                    # Circle representing slip rate influence (scaled visually)
+                    folium.Circle(
+                        location=[fault["latitude"], fault["longitude"]],
+                        radius=max(5000, fault["annual_slip_rate"] * 7000), # Ensure minimum size, scale factor adjusted
+                        color=fault["color"],
+                        fill=True,
+                        fill_opacity=0.15,
+                        weight=1,
+                        tooltip=f"{fault['name']} (Slip: {fault['annual_slip_rate']} mm/yr)"
+                    ).add_to(fault_group)
+
+    # Add Historical Earthquakes Layer
+    if "Historical Earthquakes" in display_options and not filtered_quakes.empty:
+        with stage("map.earthquakes"):
+            earthquake_group = folium.FeatureGroup(name="Historical Earthquakes", show=True).add_to(m)
+
+            if playback is not None:
+                # Per-frame deltas built in the background; each frame only draws its own events
+                moment_group = folium.FeatureGroup(name="Released Seismic Moment", show=True).add_to(m)
+                PlaybackLayer(playback, earthquake_group, moment_group).add_to(m)
+            elif client_filters is not None:
+                # Whole selection shipped once; the on-map sliders filter without a rerun
+                ClientFilterQuakeLayer(filtered_quakes, **client_filters).add_to(earthquake_group)
+            elif len(filtered_quakes) > BATCH_RENDER_THRESHOLD:
+                # Large selections: one columnar payload styled and drawn client-side
+                BatchQuakeLayer(filtered_quakes).add_to(earthquake_group)
+            else:
+                # Radius and colour for every event in one vectorized pass
+                quake_radii, quake_colors = magnitude_styles(filtered_quakes['magnitude'])
+
+                for (_, quake), radius, quake_color in zip(filtered_quakes.iterrows(), quake_radii, quake_colors):
+                    popup_html = f"""
+                    <div style="width: 250px; font-family: Arial, sans-serif; font-size: 13px;">
+                        <h4 style="margin-bottom: 5px;">{quake['year']} {quake['location']}</h4>
+                        <hr style="margin-top: 0; margin-bottom: 10px;">
+                        <p><b>Magnitude (Mw):</b> {quake['magnitude']}</p>
+                        <p><b>Deaths:</b> {quake['deaths']:,}</p>
+                        <p><i>{quake['description']}</i></p>
+                    </div>
+                    """
+
+                    folium.CircleMarker(
+                        # float32 catalog coordinates, rounded so they serialise compactly
+                        location=[round(float(quake['lat']), COORDINATE_DECIMALS), round(float(quake['lon']), COORDINATE_DECIMALS)],
+                        radius=radius,
+                        color=quake_color,
+                        fill=True,
+                        fill_color=quake_color,
+                        fill_opacity=0.6,
+                        weight=1,
+                        popup=folium.Popup(popup_html, max_width=300),
+                        tooltip=f"{quake['year']} {quake['location']} (M{quake['magnitude']})"
+                    ).add_to(earthquake_group)
+            # Add colormap legend to the map (optional, can clutter)
+            # colormap = magnitude_colormap(filtered_quakes['magnitude'])
+            # colormap.caption = 'Earthquake Magnitude (Mw)'
+            # m.add_child(colormap)
+
+    # Add Seismic Risk Heatmap Layer
+    if "Seismic Risk Heatmap" in display_options and not filtered_faults.empty:
+        with stage("map.heatmap"):
+            # Make heatmap initially not visible if other layers are present
+            show_heatmap = not ("Fault Systems" in display_options or "Historical Earthquakes" in display_options)
+            layer_name = "Seismic Hazard (PGA)" if heatmap_mode == HEATMAP_MODES[2] else "Seismic Risk Heatmap"
+            heatmap_group = folium.FeatureGroup(name=layer_name, show=show_heatmap).add_to(m)
+            if heatmap_mode == HEATMAP_MODES[2]:
+                # Slip-rate-driven PGA grid computed once per fault selection, sent as one image with its scale
+                pga_overlay, pga_legend = hazard_map_layers(filtered_faults, fault_traces)
+                pga_overlay.add_to(heatmap_group)
+                m.add_child(pga_legend)
+            elif heatmap_mode == "Precomputed raster":
+                # Kernel-density grid computed once per fault selection, sent as one image
+                hazard_overlay(filtered_faults).add_to(heatmap_group)
+            else:
+                # All points for all faults in one seeded batch, memoized per fault selection
+                risk_points = risk_heat_points(filtered_faults)
+
+                if len(risk_points):
+                    # Convert float keys in gradient to strings
+                    gradient_str_keys = {
+                        '0.1': 'blue',
+                        '0.3': 'lime',
+                        '0.5': 'yellow',
+                        '0.7': 'orange',
+                        '1.0': 'red' # Use '1.0' or '1' as string key
+                    }
+
+                    PointHeatMap(
+                        risk_points,
+                        name="Seismic Risk Heatmap", # Name already set in FeatureGroup
+                        radius=18,
+                        blur=15,
+                        gradient=gradient_str_keys, # Use the dictionary with string keys
+                        min_opacity=0.2,
+                        max_val=5.0 # Corresponds to max risk value
+                    ).add_to(heatmap_group)
+
+    # Outline the focus area so it is clear why events outside it are hidden
+    if focus_circle is not None:
+        folium.Circle(
+            location=map_center,
+            radius=focus_circle[2] * 1000,
+            color="#1E3A8A",
+            fill=False,
+            weight=1,
+            dash_array="6 6",
+            tooltip=f"Focus: {focus_label} ({focus_circle[2]} km)"
+        ).add_to(m)
+
+    # Add Layer Control to toggle layers (base maps and feature groups)
+    layer_control = folium.LayerControl(collapsed=False).add_to(m)
+    if "Historical Earthquakes" in display_options and playback is None:
+        LiveFeedSlot(layer_control).add_to(m)
+
+    return m
+
+
+def render_map_html(m):
+    """Standalone HTML for the map, as embedded by `folium_static`."""
+    import folium
+
+    with stage("map.serialise") as timed:
+        html = folium.Figure().add_child(m).render()
+        timed.output_bytes = len(html)
+    return html
+
+
+# ===== Downsampling =====
+def downsample_events(quakes, max_points=TIMELINE_MAX_POINTS, pinned=TIMELINE_PINNED):
+    """
+    At most `max_points` of the `quakes` for a year/magnitude chart, with an
+    `events` column counting the filtered events each one stands for.
+
+    The `pinned` largest and deadliest events are kept as they are. The others are
+    binned by year and 0.1 magnitude, and each bin is drawn as its largest event
+    (then deadliest). Bins span a single year unless there are too many, in which
+    case the year bins double in width until they fit. When even one bin per
+    magnitude over the whole span is too many, the magnitude bins double as well.
+    """
+    max_points = max(int(max_points), 1)
+    if len(quakes) <= max_points:
+        return quakes.assign(events=1)
+    magnitudes = quakes['magnitude'].to_numpy(dtype=np.float64)
+    deaths = quakes['deaths'].to_numpy(dtype=np.int64)
+    pinned = min(pinned, (max_points - 1) // 2) # Leaves room for at least one bin
+    keep = np.zeros(len(quakes), dtype=bool)
+    keep[np.argsort(-magnitudes, kind='stable')[:pinned]] = True
+    keep[np.argsort(-deaths, kind='stable')[:pinned]] = True
+
+    rest = np.flatnonzero(~keep)
+    years = quakes['year'].to_numpy(dtype=np.int64)[rest]
+    years -= years.min()
+    mag_bins = magnitude_bins(magnitudes[rest])
+    budget = max_points - int(keep.sum())
+    year_width = mag_width = 1
+    while True:
+        cells = years // year_width * MAGNITUDE_BINS + mag_bins // mag_width
+        # Sorted by cell, then largest magnitude and most deaths first: the first of each cell represents it
+        order = np.lexsort((-deaths[rest], -magnitudes[rest], cells))
+        first = np.concatenate([[True], cells[order][1:] != cells[order][:-1]])
+        if first.sum() <= budget:
+            break
+        if year_width <= years.max(): # Year bins do not cover the whole span yet
+            year_width *= 2
+        else:
+            mag_width *= 2
+    counts = np.diff(np.append(np.flatnonzero(first), len(order)))
+
+    events = np.ones(len(quakes), dtype=np.int64)
+    events[rest[order[first]]] = counts
+    keep[rest[order[first]]] = True
+    return quakes[keep].assign(events=events[keep])
+
+
+# ===== Charts =====
+def build_slip_figure(filtered_faults, max_bars=SLIP_MAX_BARS):
+    """Bar chart of slip rate per fault system, coloured by seismic risk; the `max_bars` fastest are shown."""
+    import plotly.express as px
+
+    title = 'Fault System Activity (Slip Rate)'
+    if len(filtered_faults) > max_bars:
+        title += f' - top {max_bars} of {len(filtered_faults)}'
+    slip_fig = px.bar(
+        filtered_faults.nlargest(max_bars, 'annual_slip_rate'),
+        x='name',
+        y='annual_slip_rate',
+        color='seismic_risk',
+        labels={'annual_slip_rate': 'Avg. Slip Rate (mm/yr)', 'name': 'Fault System Name'},
+        title=title,
+        color_discrete_map=RISK_COLORS,
+        height=350
+    )
+    slip_fig.update_layout(
+        xaxis_title=None,
+        yaxis_title="Slip Rate (mm/yr)",
+        xaxis_tickangle=-45,
+        margin=dict(t=30, b=0, l=0, r=0),
+        legend_title_text='Risk'
+    )
+    return slip_fig
+
+
+def build_fault_type_figure(filtered_faults):
+    """Donut chart of reported fault types, or None when no types are listed."""
+    import plotly.express as px
+
+    all_fault_types = []
+    for types in filtered_faults['fault_types']:
+        # Handle potential None or non-string types defensively
+        if isinstance(types, str):
+            all_fault_types.extend([t.strip() for t in types.split(',') if t.strip()]) # Ensure no empty strings
+    fault_type_counts = pd.Series(all_fault_types).value_counts()
+    if fault_type_counts.empty:
+        return None
+    type_fig = px.pie(
+        names=fault_type_counts.index,
+        values=fault_type_counts.values,
+        title='Distribution of Reported Fault Types',
+        hole=0.4,
+        height=300
+    )
+    type_fig.update_traces(textposition='inside', textinfo='percent+label')
+    type_fig.update_layout(margin=dict(t=50, b=0, l=0, r=0), showlegend=False)
+    return type_fig
+
+
+def build_fault_activity_figure(fault_stats):
+    """Bar chart of seismic moment released near each fault system, or None without events."""
+    import plotly.express as px
+
+    active = fault_stats[fault_stats["events"] > 0]
+    if active.empty:
+        return None
+    activity_fig = px.bar(
+        active,
+        x='name',
+        y='moment_release_nm',
+        hover_data={'events': True, 'max_magnitude': ':.1f', 'equivalent_mw': ':.2f'},
+        labels={'moment_release_nm': 'Moment Release (N·m)', 'name': 'Fault System Name',
+                'events': 'Events', 'max_magnitude': 'Max Mw', 'equivalent_mw': 'Equivalent Mw'},
+        title='Seismic Moment Released near Each Fault System',
+        log_y=True,
+        height=350
+    )
+    activity_fig.update_traces(marker_color='#1E3A8A')
+    activity_fig.update_layout(xaxis_title=None, xaxis_tickangle=-45, margin=dict(t=30, b=0, l=0, r=0))
+    return activity_fig
+
+
+def build_hazard_curve_figure(curves, target_rate):
+    """Log-log hazard curves (annual rate of exceeding each PGA) per site, with the design rate marked."""
+    import plotly.express as px
+
+    hazard_fig = px.line(
+        curves,
+        x='pga_g',
+        y='annual_rate',
+        color='site',
+        log_x=True,
+        log_y=True,
+        labels={'pga_g': 'PGA (g)', 'annual_rate': 'Annual Exceedance Rate', 'site': 'Fault System'},
+        title='Seismic Hazard Curves',
+        height=350
+    )
+    hazard_fig.add_hline(
+        y=target_rate, line_dash='dash', line_color='#6B7280',
+        annotation_text=f'{1 / target_rate:,.0f}-year return period', annotation_position='bottom left'
+    )
+    hazard_fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), legend_title_text=None)
+    return hazard_fig
+
+
+def build_magnitude_frequency_figure(histogram, stats):
+    """
+    Cumulative and per-bin event counts by magnitude (log scale) for a magnitude
+    `histogram` (see gutenberg_richter), with the Gutenberg-Richter fit above Mc from a `stats` row.
+    """
+    import plotly.express as px
+
+    magnitudes = np.arange(len(histogram)) * MAGNITUDE_STEP
+    occupied = np.flatnonzero(histogram)
+    counts = pd.DataFrame({
+        'magnitude': np.round(magnitudes, 1),
+        'Cumulative N(≥M)': np.cumsum(histogram[::-1])[::-1],
+        'Per bin': histogram,
+    }).iloc[occupied[0]:occupied[-1] + 1]
+    counts = counts.melt(id_vars='magnitude', var_name='count', value_name='events')
+    mf_fig = px.scatter(
+        counts[counts['events'] > 0],
+        x='magnitude',
+        y='events',
+        color='count',
+        log_y=True,
+        labels={'magnitude': 'Magnitude (Mw)', 'events': 'Events', 'count': ''},
+        color_discrete_sequence=['#1E3A8A', '#DD6B20'],
+        title='Magnitude-Frequency Distribution',
+        height=350
+    )
+    if np.isfinite(stats['b_value']):
+        # log10 N(≥M) = a - b M, anchored on the events above Mc
+        fit_magnitudes = magnitudes[int(round(stats['mc'] / MAGNITUDE_STEP)):occupied[-1] + 1]
+        fit_counts = stats['events_above_mc'] * 10.0 ** (-stats['b_value'] * (fit_magnitudes - stats['mc']))
+        mf_fig.add_scatter(
+            x=fit_magnitudes, y=fit_counts, mode='lines', line=dict(color='#6B7280', dash='dash'),
+            name=f"b = {stats['b_value']:.2f}"
+        )
+    if np.isfinite(stats['mc']):
+        mf_fig.add_vline(
+            x=stats['mc'], line_dash='dot', line_color='#6B7280',
+            annotation_text=f"Mc {stats['mc']:.1f}", annotation_position='top right'
+        )
+    mf_fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), legend_title_text=None)
+    return mf_fig
+
+
+def build_b_value_figure(window_stats):
+    """b-value of each sliding time window with its bootstrap confidence interval, or None without estimates."""
+    import plotly.express as px
+
+    windows = window_stats[np.isfinite(window_stats['b_value'])].copy()
+    if windows.empty:
+        return None
+    windows['window'] = windows['start_year'].astype(str) + '-' + windows['end_year'].astype(str)
+    windows['mid_year'] = (windows['start_year'] + windows['end_year']) / 2
+    b_fig = px.line(
+        windows,
+        x='mid_year',
+        y='b_value',
+        error_y=windows['b_value_high'] - windows['b_value'],
+        error_y_minus=windows['b_value'] - windows['b_value_low'],
+        markers=True,
+        hover_data={'window': True, 'mid_year': False, 'events': True, 'mc': ':.1f', 'annual_rate': ':.2f'},
+        labels={'mid_year': 'Year', 'b_value': 'b-value', 'window': 'Window', 'events': 'Events',
+                'mc': 'Mc', 'annual_rate': 'Events/yr ≥ Mc'},
+        title='b-value per Time Window',
+        height=300
+    )
+    b_fig.update_traces(line_color='#1E3A8A')
+    b_fig.update_layout(margin=dict(t=30, b=0, l=0, r=0))
+    return b_fig
+
+
+def build_yearly_activity_figure(yearly):
+    """Bar chart of events per year with deaths and maximum magnitude on hover."""
+    import plotly.express as px
+
+    yearly_fig = px.bar(
+        yearly,
+        x='year',
+        y='events',
+        hover_data={'year': True, 'events': True, 'deaths': ':,', 'max_magnitude': ':.1f'},
+        labels={'year': 'Year', 'events': 'Events', 'deaths': 'Deaths', 'max_magnitude': 'Max Mw'},
+        title='Events per Year',
+        height=250
+    )
+    yearly_fig.update_traces(marker_color='#DD6B20')
+    yearly_fig.update_layout(xaxis_title=None, margin=dict(t=30, b=0, l=0, r=0))
+    return yearly_fig
+
+
+def build_timeline_figure(filtered_quakes, year_range, magnitude_range, max_points=TIMELINE_MAX_POINTS):
+    """
+    Scatter timeline of the filtered earthquakes, sized by deaths. Beyond `max_points`
+    events it is drawn from `downsample_events`; large charts use WebGL.
+    """
+    import plotly.express as px
+
+    points = downsample_events(filtered_quakes, max_points)
+    title = f'Earthquakes ({year_range[0]}-{year_range[1]}, M{magnitude_range[0]:.1f}-{magnitude_range[1]:.1f})'
+    if len(points) < len(filtered_quakes):
+        title += f' - {len(points):,} of {len(filtered_quakes):,} shown'
+    timeline_fig = px.scatter(
+        points.sort_values('year'),
+        x='year',
+        y='magnitude',
+        size='deaths',
+        color='magnitude',
+        hover_name='location',
+        hover_data={'year': True, 'magnitude': True, 'deaths': True, 'location': False, 'description': True, # Added description
+                    'events': True},
+        size_max=25,
+        color_continuous_scale=px.colors.sequential.OrRd, # Orange-Red scale
+        title=title,
+        render_mode='webgl' if len(points) > WEBGL_THRESHOLD else 'svg',
+        height=350
+    )
+    timeline_fig.update_layout(
+        xaxis_title='Year',
+        yaxis_title='Magnitude (Mw)',
+        coloraxis_colorbar_title='Mw',
+        margin=dict(t=30, b=0, l=0, r=0)
+    )
+    timeline_fig.update_traces(hovertemplate=
+        "<b>%{hovertext} (%{customdata[0]})</b><br>" +
+        "Magnitude: %{customdata[1]:.1f} Mw<br>" +
+        "Deaths: %{customdata[2]:,}<br>" +
+        "<i>%{customdata[3]}</i>" + # Show description on hover
+        ("<br>%{customdata[4]:,} event(s) in this bin" if len(points) < len(filtered_quakes) else "") +
+        "<extra></extra>") # Hide extra trace info
+    return timeline_fig
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Attribution of earthquakes to their nearest fault system.
+
+Every fault system is represented by anchor points: its location and, when a
+fault trace is loaded, the trace vertices densified to a few kilometres apart.
+Each event is attributed to the fault system with the closest anchor, provided
+it lies within a distance threshold. For every fault system, only the events in
+the grid-index cells around its anchors are considered. Their distances are
+computed as chunked, broadcast haversine matrices, so the cost grows with the
+number of nearby (event, anchor) pairs, not with catalog size x fault count.
+"""
+import numpy as np
+import pandas as pd
+
+from spatial_index import KM_PER_DEGREE_LAT, haversine_km, radius_bounds
+
+ASSOCIATION_RADIUS_KM = 50.0
+TRACE_SPACING_KM = 2.0 # Maximum gap between anchors along a fault trace
+CHUNK_PAIRS = 2_000_000 # (event, anchor) distances evaluated per block
+
+
+# ===== Fault Anchors =====
+def densify(part, spacing_km=TRACE_SPACING_KM):
+    """(lat, lon) vertices of a polyline with points inserted so no gap exceeds `spacing_km`."""
+    part = np.asarray(part, dtype=np.float64)
+    if len(part) < 2:
+        return part
+    lengths = haversine_km(part[:-1, 0], part[:-1, 1], part[1:, 0], part[1:, 1])
+    steps = np.maximum(np.ceil(lengths / spacing_km).astype(np.int64), 1)
+    # Fractions 0, 1/k, ..., (k-1)/k along every segment, then the final vertex
+    segment = np.repeat(np.arange(len(steps)), steps)
+    offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+    t = (offsets / steps[segment])[:, None]
+    points = part[segment] * (1.0 - t) + part[segment + 1] * t
+    return np.vstack([points, part[-1:]])
+
+
+def fault_anchors(faults, fault_traces=None, spacing_km=TRACE_SPACING_KM):
+    """(lat, lon, fault position) arrays of anchor points for every row of `faults`."""
+    lat, lon, owner = [], [], []
+    for position, (name, fault_lat, fault_lon) in enumerate(
+        zip(faults["name"], faults["latitude"], faults["longitude"])
+    ):
+        points = [np.array([[fault_lat, fault_lon]], dtype=np.float64)]
+        trace = (fault_traces or {}).get(name)
+        if trace is not None:
+            points.extend(densify(part, spacing_km) for part in trace.parts)
+        points = np.vstack(points)
+        lat.append(points[:, 0])
+        lon.append(points[:, 1])
+        owner.append(np.full(len(points), position, dtype=np.int64))
+    if not lat:
+        empty = np.empty(0)
+        return empty, empty, np.empty(0, dtype=np.int64)
+    return np.concatenate(lat), np.concatenate(lon), np.concatenate(owner)
+
+
+# ===== Association =====
+def _nearest_anchor_km(event_lat, event_lon, anchor_lat, anchor_lon):
+    # Distance from every event to its closest anchor, in blocks of at most CHUNK_PAIRS
+    distances = np.empty(len(event_lat))
+    step = max(1, CHUNK_PAIRS // max(len(anchor_lat), 1))
+    for start in range(0, len(event_lat), step):
+        stop = start + step
+        distances[start:stop] = haversine_km(
+            event_lat[start:stop, None], event_lon[start:stop, None], anchor_lat[None, :], anchor_lon[None, :]
+        ).min(axis=1)
+    return distances
+
+
+class FaultAssociation:
+    """Nearest fault system (row of `faults`) and distance for every catalog position."""
+
+    def __init__(self, fault_index, distance_km, fault_names, radius_km):
+        self.fault_index = fault_index # -1 where no fault system lies within radius_km
+        self.distance_km = distance_km # NaN where unassociated
+        self.fault_names = list(fault_names)
+        self.radius_km = radius_km
+
+    def __len__(self):
+        return len(self.fault_index)
+
+    def fault_names_for(self, positions):
+        """Associated fault system name (or None) for the given catalog positions."""
+        names = np.array(self.fault_names + [None], dtype=object)
+        return names[self.fault_index[positions]]
+
+
+def associate_events(index, faults, fault_traces=None, radius_km=ASSOCIATION_RADIUS_KM,
+                     spacing_km=TRACE_SPACING_KM):
+    """
+    Attribute every event of the `GridIndex` over the catalog to the nearest fault
+    system in `faults` (point or trace) within `radius_km`.
+    """
+    anchor_lat, anchor_lon, anchor_owner = fault_anchors(faults, fault_traces, spacing_km)
+    best_distance = np.full(len(index), np.inf)
+    best_fault = np.full(len(index), -1, dtype=np.int32)
+
+    # Anchors are grouped by fault system, so each system's anchors are one slice
+    anchor_starts = np.searchsorted(anchor_owner, np.arange(len(faults) + 1))
+    for position in range(len(faults)):
+        fault_lat = anchor_lat[anchor_starts[position]:anchor_starts[position + 1]]
+        fault_lon = anchor_lon[anchor_starts[position]:anchor_starts[position + 1]]
+        # Candidate events: the anchors' bounding box padded by the radius
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlon = radius_bounds(np.abs(fault_lat).max(), 0.0, radius_km)[3]
+        candidates = index.query_bbox(
+            fault_lat.min() - dlat, fault_lon.min() - dlon, fault_lat.max() + dlat, fault_lon.max() + dlon
+        )
+        if not len(candidates):
+            continue
+        distances = _nearest_anchor_km(index.lat[candidates], index.lon[candidates], fault_lat, fault_lon)
+        closer = (distances <= radius_km) & (distances < best_distance[candidates])
+        best_distance[candidates[closer]] = distances[closer]
+        best_fault[candidates[closer]] = position
+
+    distance_km = np.where(best_fault >= 0, best_distance, np.nan).astype(np.float32)
+    return FaultAssociation(best_fault, distance_km, faults["name"], radius_km)
+
+
+# ===== Per-Fault Statistics =====
+def seismic_moment(magnitudes):
+    """Scalar seismic moment in N·m from moment magnitude (Hanks & Kanamori)."""
+    return 10.0 ** (1.5 * np.asarray(magnitudes, dtype=np.float64) + 9.1)
+
+
+def fault_statistics(association, magnitudes, positions, fault_names=None):
+    """
+    Event count, maximum magnitude and total moment release per fault system for
+    the events at catalog `positions` (with their `magnitudes`). Rows are limited
+    to `fault_names` when given; fault systems without events are included.
+    """
+    owners = association.fault_index[positions]
+    associated = owners >= 0
+    owners, magnitudes = owners[associated], np.asarray(magnitudes, dtype=np.float64)[associated]
+    n_faults = len(association.fault_names)
+
+    counts = np.bincount(owners, minlength=n_faults)
+    moment = np.bincount(owners, weights=seismic_moment(magnitudes), minlength=n_faults)
+    max_magnitude = np.full(n_faults, np.nan)
+    np.fmax.at(max_magnitude, owners, magnitudes)
+
+    stats = pd.DataFrame({
+        "name": association.fault_names,
+        "events": counts,
+        "max_magnitude": max_magnitude,
+        "moment_release_nm": moment,
+        # Single event that would release the same total moment
+        "equivalent_mw": np.where(moment > 0, (np.log10(np.where(moment > 0, moment, 1.0)) - 9.1) / 1.5, np.nan),
+    })
+    if fault_names is not None:
+        stats = stats[stats["name"].isin(list(fault_names))]
+    return stats.sort_values("moment_release_nm", ascending=False).reset_index(drop=True)
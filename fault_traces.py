@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Fault trace geometry with zoom-dependent level of detail.
+
+Traces are read from local GeoJSON files (or shapefiles when the optional
+``pyshp`` package is installed). Each feature is matched to a fault system by
+its ``name`` property. Every vertex gets a Douglas-Peucker importance once at
+load time; a simplified trace at any tolerance is then a single mask, and the
+traces are precomputed at a few tolerances. The map picks the coarsest level
+whose error stays below one screen pixel at the current zoom, so
+high-resolution traces do not bloat the HTML of every rerun.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+
+# Simplification tolerances in degrees, finest first
+LOD_TOLERANCES = (0.0002, 0.001, 0.004, 0.016)
+COORDINATE_DECIMALS = 5
+NAME_PROPERTIES = ("name", "fault_system", "system")
+TRACE_EXTENSIONS = (".geojson", ".json", ".shp")
+
+
+# ===== Simplification =====
+def _segment_distances(points, start, end):
+    # Distance of every point to the segment start-end (or to `start` when degenerate)
+    segment = end - start
+    length_sq = float(segment @ segment)
+    if length_sq == 0.0:
+        return np.hypot(*(points - start).T)
+    t = np.clip(((points - start) @ segment) / length_sq, 0.0, 1.0)
+    return np.hypot(*(points - (start + t[:, None] * segment)).T)
+
+
+def douglas_peucker_importance(coords):
+    """
+    Largest tolerance at which each vertex survives Douglas-Peucker simplification.
+    Endpoints are always kept (importance inf). `coords[importance > tol]` is the
+    simplified line for any tolerance `tol`.
+    """
+    n = len(coords)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[[0, -1]] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, bound = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(coords[first + 1:last], coords[first], coords[last])
+        split = first + 1 + int(np.argmax(distances))
+        # A vertex can never outlive the split that exposed it
+        importance[split] = min(float(distances[split - first - 1]), bound)
+        stack.append((first, split, importance[split]))
+        stack.append((split, last, importance[split]))
+    return importance
+
+
+def tolerance_for_zoom(zoom, tolerances=LOD_TOLERANCES):
+    """Coarsest tolerance no larger than one 256px-tile pixel at `zoom`."""
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    usable = [tol for tol in tolerances if tol <= degrees_per_pixel]
+    return max(usable) if usable else min(tolerances)
+
+
+# ===== Trace Geometry =====
+class FaultTrace:
+    """Polyline or polygon parts of one fault system with per-vertex importances."""
+
+    def __init__(self, name, kind, parts):
+        self.name = name
+        self.kind = kind # "line" or "polygon"
+        self.parts = [np.asarray(part, dtype=np.float64) for part in parts] # (lat, lon) vertices
+        self.importance = [douglas_peucker_importance(part) for part in self.parts]
+        self.levels = {tol: self.simplify(tol) for tol in LOD_TOLERANCES}
+
+    @property
+    def vertex_count(self):
+        return sum(len(part) for part in self.parts)
+
+    def simplify(self, tolerance):
+        minimum = 4 if self.kind == "polygon" else 2
+        simplified = []
+        for part, importance in zip(self.parts, self.importance):
+            kept = part[importance > tolerance]
+            if len(kept) >= minimum:
+                simplified.append(np.round(kept, COORDINATE_DECIMALS).tolist())
+        return simplified
+
+    def at_zoom(self, zoom):
+        """Simplified parts as [[lat, lon], ...] lists for the given map zoom."""
+        return self.levels[tolerance_for_zoom(zoom)]
+
+
+def _geometry_parts(geometry):
+    # GeoJSON geometry -> ("line" | "polygon", list of (lat, lon) arrays)
+    kind, coordinates = geometry.get("type"), geometry.get("coordinates", [])
+    if kind == "LineString":
+        lines, shape = [coordinates], "line"
+    elif kind == "MultiLineString":
+        lines, shape = coordinates, "line"
+    elif kind == "Polygon":
+        lines, shape = coordinates, "polygon"
+    elif kind == "MultiPolygon":
+        lines, shape = [ring for polygon in coordinates for ring in polygon], "polygon"
+    else:
+        return None, []
+    return shape, [np.asarray(line, dtype=np.float64)[:, [1, 0]] for line in lines if len(line)]
+
+
+def _feature_name(properties):
+    for key in NAME_PROPERTIES:
+        if properties.get(key):
+            return str(properties[key])
+    return None
+
+
+def _read_features(path):
+    if path.lower().endswith(".shp"):
+        try:
+            import shapefile
+        except ImportError as exc:
+            raise ImportError("Reading shapefile fault traces requires the 'pyshp' package.") from exc
+        with shapefile.Reader(path) as reader:
+            return [
+                {"geometry": record.shape.__geo_interface__, "properties": record.record.as_dict()}
+                for record in reader.shapeRecords()
+            ]
+    with open(path, encoding="utf-8") as trace_file:
+        data = json.load(trace_file)
+    return data.get("features", [data] if data.get("type") == "Feature" else [])
+
+
+def load_fault_traces(path):
+    """
+    Fault traces keyed by fault system name from a GeoJSON/shapefile, or from every
+    such file in a directory. Features of the same system are merged.
+    """
+    if os.path.isdir(path):
+        paths = sorted(p for ext in TRACE_EXTENSIONS for p in glob.glob(os.path.join(path, f"*{ext}")))
+    else:
+        paths = [path]
+
+    collected = {}
+    for trace_path in paths:
+        for feature in _read_features(trace_path):
+            name = _feature_name(feature.get("properties") or {})
+            kind, parts = _geometry_parts(feature.get("geometry") or {})
+            if name and parts:
+                entry = collected.setdefault(name, {"kind": kind, "parts": []})
+                entry["parts"].extend(parts)
+    return {name: FaultTrace(name, entry["kind"], entry["parts"]) for name, entry in collected.items()}
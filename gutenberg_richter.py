@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Gutenberg-Richter magnitude-frequency statistics with bootstrap confidence intervals.
+
+For a set of events this estimates the magnitude of completeness Mc (maximum
+curvature plus 0.2, Woessner & Wiemer 2005), the b-value above Mc (Aki-Utsu
+maximum likelihood with the correction for 0.1 magnitude bins) and the annual
+rate of events at or above Mc. Confidence intervals come from bootstrap
+resamples of the events.
+
+Every estimate depends on the events only through their 0.1-bin magnitude
+histogram (the binning of `event_cube`). Drawing n events with replacement
+therefore only changes the bin counts: a resample is one multinomial draw over
+the histogram. Batches of resamples are drawn as (resamples x bins) arrays and
+the estimators run on all rows at once, so the cost does not grow with the
+number of events. Runs of batches, usually spanning several histograms, are
+spread across a process pool when there are enough of them. Each batch has its
+own seed, so results do not depend on the number of workers.
+
+Statistics are computed per fault system (events attributed by
+`fault_association`) and per sliding time window.
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from event_cube import MAGNITUDE_BINS, MAGNITUDE_STEP, magnitude_bins
+from process_pool import pool_map
+
+MAXC_CORRECTION = 0.2 # Added to the maximum-curvature Mc, which tends to underestimate it
+MIN_EVENTS = 20 # Events at or above Mc needed for a b-value
+BOOTSTRAP_SAMPLES = int(os.environ.get("FAULTS_BOOTSTRAP_SAMPLES", "1000"))
+BOOTSTRAP_BATCH = 250 # Resamples drawn at once (one seed each)
+BOOTSTRAP_SEED = 2024
+CONFIDENCE = 0.95
+GR_WORKERS = int(os.environ.get("FAULTS_GR_WORKERS", str(os.cpu_count() or 1)))
+JOBS_PER_WORKER = 4 # Pool tasks per worker, each a run of batches
+POOL_MIN_WORK = 50_000_000 # Resamples x magnitude bins below which worker processes cost more than they save
+ALL_EVENTS = "All events"
+STATISTICS = ("mc", "b_value", "annual_rate")
+
+
+# ===== Estimators =====
+def magnitude_histogram(magnitudes):
+    """Event counts per 0.1 magnitude bin."""
+    return np.bincount(magnitude_bins(magnitudes), minlength=MAGNITUDE_BINS)
+
+
+def gr_estimates(histograms, years, min_events=MIN_EVENTS):
+    """
+    {"mc", "b_value", "annual_rate", "events"} for every row of `histograms`
+    (... x MAGNITUDE_BINS) observed over `years`. "events" counts the events at
+    or above Mc; the b-value is NaN with fewer than `min_events` of them.
+    """
+    histograms = np.atleast_2d(histograms)
+    bin_magnitudes = np.arange(MAGNITUDE_BINS) * MAGNITUDE_STEP
+    mc_bins = np.minimum(
+        histograms.argmax(axis=1) + int(round(MAXC_CORRECTION / MAGNITUDE_STEP)), MAGNITUDE_BINS - 1
+    )[:, None]
+    # Counts and magnitude sums of every bin and those above it
+    tail_counts = np.cumsum(histograms[:, ::-1], axis=1)[:, ::-1]
+    tail_sums = np.cumsum((histograms * bin_magnitudes)[:, ::-1], axis=1)[:, ::-1]
+    events = np.take_along_axis(tail_counts, mc_bins, axis=1)[:, 0]
+    mc = np.where(histograms.sum(axis=1) > 0, mc_bins[:, 0] * MAGNITUDE_STEP, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_magnitude = np.take_along_axis(tail_sums, mc_bins, axis=1)[:, 0] / events
+        b_value = np.log10(np.e) / (mean_magnitude - (mc - MAGNITUDE_STEP / 2))
+    return {
+        "mc": mc,
+        "b_value": np.where(events >= min_events, b_value, np.nan),
+        "annual_rate": events / np.asarray(years, dtype=np.float64),
+        "events": events,
+    }
+
+
+def _bootstrap_job(batches):
+    # Estimates of a run of (histogram, years, samples, seed) batches, concatenated in order
+    estimates = []
+    for histogram, years, samples, seed in batches:
+        rng = np.random.default_rng(seed)
+        total = int(histogram.sum())
+        estimates.append(gr_estimates(rng.multinomial(total, histogram / total, size=samples), years))
+    return {name: np.concatenate([batch[name] for batch in estimates]) for name in STATISTICS}
+
+
+# ===== Bootstrap =====
+def bootstrap_statistics(histograms, years, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE,
+                         workers=GR_WORKERS, seed=BOOTSTRAP_SEED):
+    """
+    One row per histogram: the events, Mc, b-value and annual rate, each
+    statistic with its `confidence` interval (`<name>_low`, `<name>_high`) from
+    `samples` bootstrap resamples. `years` is the observation span of each
+    histogram (or one span for all).
+    """
+    histograms = np.atleast_2d(np.asarray(histograms, dtype=np.int64))
+    years = np.broadcast_to(np.asarray(years, dtype=np.float64), len(histograms))
+    groups = np.flatnonzero(histograms.sum(axis=1) > 0)
+    batches, owners = [], []
+    for group in groups:
+        for start in range(0, samples, BOOTSTRAP_BATCH):
+            count = min(BOOTSTRAP_BATCH, samples - start)
+            batches.append((histograms[group], years[group], count, (seed, int(group), start)))
+            owners.append(np.full(count, group))
+
+    # A job is a run of batches, usually of several groups, so large catalogs do not queue one tiny task per batch
+    pooled = workers > 1 and len(batches) > 1 and len(histograms) * samples * MAGNITUDE_BINS >= POOL_MIN_WORK
+    n_jobs = min(len(batches), workers * JOBS_PER_WORKER) if pooled else 1
+    jobs = [batches[bounds[0]:bounds[-1] + 1] for bounds in np.array_split(np.arange(len(batches)), n_jobs)
+            if len(bounds)]
+    if pooled:
+        results = pool_map(_bootstrap_job, jobs, workers)
+    else:
+        results = [_bootstrap_job(job) for job in jobs]
+
+    estimates = gr_estimates(histograms, years)
+    stats = pd.DataFrame({"events": histograms.sum(axis=1), "events_above_mc": estimates["events"]})
+    tail = (1.0 - confidence) / 2 * 100
+    # Every resampled group has `samples` estimates: gathered by owner, they form a (groups x samples) array
+    order = np.argsort(np.concatenate(owners), kind="stable") if owners else np.empty(0, dtype=np.int64)
+    for name in STATISTICS:
+        low, high = np.full(len(histograms), np.nan), np.full(len(histograms), np.nan)
+        if len(groups):
+            values = np.concatenate([result[name] for result in results])[order].reshape(len(groups), samples)
+            values = np.where(np.isfinite(values), values, np.nan)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning) # Groups without a finite estimate stay NaN
+                low[groups], high[groups] = np.nanpercentile(values, [tail, 100 - tail], axis=1)
+        stats[name], stats[f"{name}_low"], stats[f"{name}_high"] = estimates[name], low, high
+    return stats
+
+
+# ===== Per Fault System and Time Window =====
+def fault_gr_statistics(association, magnitudes, positions, years, fault_names=None, **bootstrap):
+    """
+    Statistics of the events at catalog `positions` (with their `magnitudes`)
+    observed over `years`: first for all of them (`ALL_EVENTS`), then per fault
+    system they are attributed to, limited to `fault_names` when given.
+    """
+    owners = association.fault_index[positions]
+    bins = magnitude_bins(magnitudes)
+    associated = owners >= 0
+    n_faults = len(association.fault_names)
+    per_fault = np.bincount(
+        owners[associated].astype(np.int64) * MAGNITUDE_BINS + bins[associated], minlength=n_faults * MAGNITUDE_BINS
+    ).reshape(n_faults, MAGNITUDE_BINS)
+    names = np.array([ALL_EVENTS] + list(association.fault_names), dtype=object)
+    rows = np.ones(len(names), dtype=bool)
+    if fault_names is not None:
+        rows[1:] = np.isin(names[1:], list(fault_names))
+    histograms = np.vstack([np.bincount(bins, minlength=MAGNITUDE_BINS), per_fault])[rows]
+    stats = bootstrap_statistics(histograms, years, **bootstrap)
+    stats.insert(0, "name", names[rows])
+    return stats
+
+
+def window_gr_statistics(years, magnitudes, year_range, window_years, **bootstrap):
+    """
+    Statistics of the events (with their `years` and `magnitudes`) in sliding
+    windows of `window_years` across `year_range`, each starting half a window
+    after the previous one. The last window may be shorter.
+    """
+    first, last = int(year_range[0]), int(year_range[1])
+    window_years = max(int(window_years), 1)
+    starts = np.arange(first, max(last - window_years + 1, first) + 1, max(window_years // 2, 1))
+    ends = np.minimum(starts + window_years, last + 1)
+
+    # Year x magnitude-bin counts, cumulated over years: a window is the difference of two rows
+    offsets = np.asarray(years, dtype=np.int64) - first
+    inside = (offsets >= 0) & (offsets <= last - first)
+    counts = np.bincount(
+        offsets[inside] * MAGNITUDE_BINS + magnitude_bins(np.asarray(magnitudes)[inside]),
+        minlength=(last - first + 1) * MAGNITUDE_BINS
+    ).reshape(last - first + 1, MAGNITUDE_BINS)
+    cumulative = np.vstack([np.zeros((1, MAGNITUDE_BINS), dtype=np.int64), np.cumsum(counts, axis=0)])
+    histograms = cumulative[ends - first] - cumulative[starts - first]
+
+    stats = bootstrap_statistics(histograms, ends - starts, **bootstrap)
+    stats.insert(0, "start_year", starts)
+    stats.insert(1, "end_year", ends - 1)
+    return stats
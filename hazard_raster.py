@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed seismic-hazard raster for the Southern Italy extent.
+
+The hazard surface is a kernel-density grid: every fault system contributes an
+anisotropic Gaussian weighted like the point heatmap (risk level x slip rate).
+The kernels are separable, so the whole grid is one chunked matrix product
+rather than a loop over points. Grids are computed once per fault selection,
+stored as memory-mapped ``.npy`` files plus a colourised PNG, and shown on the
+map as a single image overlay whose size does not depend on the number of
+fault systems or sample points.
+"""
+import base64
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from risk_heatmap import (
+    BASE_POINTS, BASE_SPREAD, LON_STRETCH, POINTS_PER_RISK_SLIP, SPREAD_PER_RISK, risk_values,
+)
+from spatial_index import SOUTHERN_ITALY_BOUNDS
+
+HAZARD_CACHE_DIR = os.environ.get(
+    "FAULTS_HAZARD_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".hazard_cache")
+)
+GRID_RESOLUTION = 0.02 # Degrees per cell (~2 km)
+FAULT_CHUNK = 512 # Fault systems per matrix-product chunk
+MIN_VISIBLE = 0.1 # Normalised density below which the overlay is transparent
+
+# Same colour stops as the point heatmap gradient
+HAZARD_GRADIENT = [
+    (0.1, (0, 0, 255)),    # blue
+    (0.3, (0, 255, 0)),    # lime
+    (0.5, (255, 255, 0)),  # yellow
+    (0.7, (255, 165, 0)),  # orange
+    (1.0, (255, 0, 0)),    # red
+]
+
+
+# ===== Grid Geometry =====
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def _inverse_mercator_y(y):
+    return np.degrees(2 * np.arctan(np.exp(y)) - np.pi / 2)
+
+
+def grid_axes(bounds=SOUTHERN_ITALY_BOUNDS, resolution=GRID_RESOLUTION):
+    """
+    Cell-centre latitudes (north to south) and longitudes (west to east). Rows are
+    evenly spaced in Web Mercator so the image lines up with Leaflet's projection.
+    """
+    south, west, north, east = bounds
+    n_rows = int(round((north - south) / resolution))
+    n_cols = int(round((east - west) / resolution))
+    y_edges = np.linspace(_mercator_y(north), _mercator_y(south), n_rows + 1)
+    lat = _inverse_mercator_y((y_edges[:-1] + y_edges[1:]) / 2)
+    lon = west + (np.arange(n_cols) + 0.5) * (east - west) / n_cols
+    return lat, lon
+
+
+# ===== Density =====
+def hazard_density(lat, lon, risk, slip_rate, bounds=SOUTHERN_ITALY_BOUNDS,
+                   resolution=GRID_RESOLUTION, chunk=FAULT_CHUNK):
+    """
+    Expected heatmap point density on the grid. Each fault's kernel factorises into
+    a latitude profile times a longitude profile, so a chunk of F faults costs one
+    (rows x F) @ (F x cols) product.
+    """
+    lat, lon, risk, slip_rate = (np.asarray(a, dtype=np.float64) for a in (lat, lon, risk, slip_rate))
+    grid_lat, grid_lon = grid_axes(bounds, resolution)
+    weights = (risk * slip_rate * POINTS_PER_RISK_SLIP).astype(np.int64) + BASE_POINTS
+    sigma_lat = BASE_SPREAD + risk * SPREAD_PER_RISK
+    sigma_lon = sigma_lat * LON_STRETCH
+
+    density = np.zeros((len(grid_lat), len(grid_lon)))
+    for start in range(0, len(lat), chunk):
+        part = slice(start, start + chunk)
+        lat_profile = np.exp(-0.5 * ((grid_lat[:, None] - lat[part]) / sigma_lat[part]) ** 2)
+        lon_profile = np.exp(-0.5 * ((grid_lon[None, :] - lon[part, None]) / sigma_lon[part, None]) ** 2)
+        scale = weights[part] / (2 * np.pi * sigma_lat[part] * sigma_lon[part])
+        density += (lat_profile * scale) @ lon_profile
+    return density
+
+
+def colorize(density, peak=None):
+    """RGBA uint8 image of the density normalised to `peak` (default: its maximum)."""
+    peak = density.max() if peak is None else peak
+    level = np.minimum(density / peak, 1.0) if peak > 0 else np.zeros_like(density)
+    stops = np.array([stop for stop, _ in HAZARD_GRADIENT])
+    colors = np.array([color for _, color in HAZARD_GRADIENT], dtype=np.float64)
+    rgba = np.empty(density.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(level, stops, colors[:, channel]).astype(np.uint8)
+    # Fade in from transparent so low-hazard areas do not hide the base map
+    rgba[..., 3] = (np.clip((level - MIN_VISIBLE) / (1 - MIN_VISIBLE), 0, 1) ** 0.5 * 200).astype(np.uint8)
+    return rgba
+
+
+# ===== Cached Rasters =====
+def write_atomically(path, write):
+    """
+    Call `write(file)` on a new temporary file next to `path`, then move it into
+    place. Concurrent writers (threads or processes) each get their own file, so
+    readers only ever see a complete one.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write(out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def raster_key(faults, bounds=SOUTHERN_ITALY_BOUNDS, resolution=GRID_RESOLUTION):
+    """Stable key for a fault selection and grid definition."""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(bounds, dtype=np.float64).tobytes())
+    digest.update(np.float64(resolution).tobytes())
+    for column in (faults["latitude"], faults["longitude"], faults["annual_slip_rate"]):
+        digest.update(column.to_numpy(dtype=np.float64).tobytes())
+    digest.update(risk_values(faults["seismic_risk"]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def hazard_raster(faults, bounds=SOUTHERN_ITALY_BOUNDS, resolution=GRID_RESOLUTION,
+                  cache_dir=HAZARD_CACHE_DIR):
+    """
+    Memory-mapped density grid and PNG bytes for the fault selection, computed on
+    first use and read back from `cache_dir` afterwards.
+    """
+    from folium.utilities import write_png
+
+    key = raster_key(faults, bounds, resolution)
+    grid_path = os.path.join(cache_dir, f"hazard_{key}.npy")
+    png_path = os.path.join(cache_dir, f"hazard_{key}.png")
+    if not (os.path.exists(grid_path) and os.path.exists(png_path)):
+        density = hazard_density(
+            faults["latitude"], faults["longitude"], risk_values(faults["seismic_risk"]),
+            faults["annual_slip_rate"], bounds, resolution
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        png = write_png(colorize(density))
+        write_atomically(grid_path, lambda out: np.save(out, density.astype(np.float32)))
+        write_atomically(png_path, lambda out: out.write(png))
+
+    with open(png_path, "rb") as png_file:
+        png_bytes = png_file.read()
+    return np.load(grid_path, mmap_mode="r"), png_bytes
+
+
+def hazard_overlay(faults, name="Seismic Risk Heatmap", opacity=0.75, bounds=SOUTHERN_ITALY_BOUNDS):
+    """`folium.raster_layers.ImageOverlay` showing the cached hazard raster."""
+    from folium.raster_layers import ImageOverlay
+
+    _, png_bytes = hazard_raster(faults, bounds)
+    south, west, north, east = bounds
+    return ImageOverlay(
+        image="data:image/png;base64," + base64.b64encode(png_bytes).decode("ascii"),
+        bounds=[[south, west], [north, east]],
+        opacity=opacity,
+        pixelated=False,
+        name=name,
+    )
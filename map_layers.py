@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+"""
+Folium layer builders for the Southern Italy explorer.
+
+The batch earthquake layer replaces one `folium.CircleMarker` per event with a
+single columnar JSON payload whose markers and popups are produced in the browser.
+Radius, colour and tooltip columns are built with vectorized NumPy/pandas.
+
+The client-filtered layer goes one step further: the whole selection is shipped
+once as base64-encoded typed arrays, and year/magnitude filtering and styling
+run in the map's JavaScript, so moving its sliders needs no server round-trip.
+
+The playback layer replays `PlaybackFrames` (see playback) in the browser from
+their per-frame deltas, with its own play/pause and frame controls.
+"""
+import base64
+import json
+import os
+
+import numpy as np
+from branca.colormap import LinearColormap
+from branca.element import MacroElement
+from folium.plugins import HeatMap
+from jinja2 import Template
+
+from hazard_raster import HAZARD_GRADIENT, MIN_VISIBLE
+from playback import COORDINATE_LEVELS
+
+# Above this many events the earthquake layer switches to batch (single payload) rendering
+BATCH_RENDER_THRESHOLD = int(os.environ.get("FAULTS_BATCH_RENDER_THRESHOLD", "1000"))
+
+MAGNITUDE_COLORS = ['#FFFF00', '#FFA500', '#FF0000'] # Yellow -> Orange -> Red
+COORDINATE_DECIMALS = 4 # ~10 m, plenty for epicentres and keeps the payload small
+_HEX_BYTES = np.array([f"{i:02x}" for i in range(256)])
+
+
+# ===== Earthquake Styling =====
+def magnitude_colormap(magnitudes):
+    """Colormap used for the earthquake layer, spanning the filtered magnitudes."""
+    min_mag, max_mag = float(np.min(magnitudes)), float(np.max(magnitudes))
+    # Handle case where min and max are the same
+    if min_mag == max_mag:
+        return LinearColormap(['yellow', 'red'], vmin=min_mag - 0.1, vmax=max_mag + 0.1)
+    return LinearColormap(MAGNITUDE_COLORS, vmin=min_mag, vmax=max_mag)
+
+
+def colormap_hex(colormap, values):
+    """Vectorized equivalent of calling `colormap(value)` for every value."""
+    index = np.asarray(colormap.index, dtype=np.float64)
+    colors = np.asarray(colormap.colors, dtype=np.float64)
+    values = np.clip(np.asarray(values, dtype=np.float64), index[0], index[-1])
+    # Same interpolation as LinearColormap.rgba_floats_tuple, one segment lookup per value
+    upper = np.clip(np.searchsorted(index, values, side="left"), 1, len(index) - 1)
+    p = ((values - index[upper - 1]) / (index[upper] - index[upper - 1]))[:, None]
+    rgba = (1.0 - p) * colors[upper - 1] + p * colors[upper]
+    rgba_bytes = _HEX_BYTES[(rgba * 255.9999).astype(np.int64)].astype(object)
+    return "#" + rgba_bytes[:, 0] + rgba_bytes[:, 1] + rgba_bytes[:, 2] + rgba_bytes[:, 3]
+
+
+def magnitude_styles(magnitudes):
+    """Marker radius and fill colour for every event, sized and coloured by magnitude."""
+    magnitudes = np.asarray(magnitudes, dtype=np.float64)
+    if len(magnitudes) == 0:
+        return np.empty(0), np.empty(0, dtype=object)
+    min_mag = magnitudes.min()
+    if min_mag == magnitudes.max():
+        radii = np.full(len(magnitudes), 5.0) # Fixed radius if all magnitudes are the same
+    else:
+        radii = 3 + (magnitudes - min_mag) * 2 # Scale radius based on magnitude range
+    return radii, colormap_hex(magnitude_colormap(magnitudes), magnitudes)
+
+
+def quake_tooltips(quakes):
+    return (
+        quakes["year"].astype(str) + " " + quakes["location"].astype(str) +
+        " (M" + quakes["magnitude"].astype(str) + ")"
+    )
+
+
+def quake_columns(quakes):
+    """Columnar payload of the events with precomputed styling columns."""
+    radii, colors = magnitude_styles(quakes["magnitude"])
+    return {
+        "lat": np.round(quakes["lat"].to_numpy(dtype=np.float64), COORDINATE_DECIMALS).tolist(),
+        "lon": np.round(quakes["lon"].to_numpy(dtype=np.float64), COORDINATE_DECIMALS).tolist(),
+        "radius": np.round(radii, 2).tolist(),
+        "color": colors.tolist(),
+        "tooltip": quake_tooltips(quakes).tolist(),
+        "year": quakes["year"].tolist(),
+        "location": quakes["location"].astype(str).tolist(),
+        "magnitude": quakes["magnitude"].tolist(),
+        "deaths": quakes["deaths"].tolist(),
+        "description": quakes["description"].astype(str).tolist(),
+    }
+
+
+def script_json(data):
+    # Compact JSON that is safe to inline inside a <script> block
+    return json.dumps(data, separators=(",", ":"), default=str).replace("</", "<\\/")
+
+
+# ===== Batch Earthquake Layer =====
+# Feature group of circle markers for a `quake_columns` payload
+_BATCH_GROUP_FUNCTION = """function (q) {
+            var renderer = L.canvas({padding: 0.5});
+            var group = L.featureGroup();
+            for (var i = 0; i < q.lat.length; i++) {
+                var marker = L.circleMarker([q.lat[i], q.lon[i]], {
+                    renderer: renderer, radius: q.radius[i], color: q.color[i],
+                    fillColor: q.color[i], fill: true, fillOpacity: 0.6, weight: 1
+                });
+                marker.bindTooltip(q.tooltip[i]);
+                marker.bindPopup((function (i) {
+                    return function () {
+                        return '<div style="width: 250px; font-family: Arial, sans-serif; font-size: 13px;">' +
+                            '<h4 style="margin-bottom: 5px;">' + q.year[i] + ' ' + q.location[i] + '</h4>' +
+                            '<hr style="margin-top: 0; margin-bottom: 10px;">' +
+                            '<p><b>Magnitude (Mw):</b> ' + q.magnitude[i] + '</p>' +
+                            '<p><b>Deaths:</b> ' + Number(q.deaths[i]).toLocaleString('en-US') + '</p>' +
+                            '<p><i>' + q.description[i] + '</i></p></div>';
+                    };
+                })(i), {maxWidth: 300});
+                group.addLayer(marker);
+            }
+            return group;
+        }"""
+
+
+class BatchQuakeLayer(MacroElement):
+    """
+    All earthquakes as one columnar JSON payload drawn on a shared canvas renderer.
+    Markers are styled from the precomputed columns and popups are built on demand
+    in the browser, so no per-event HTML or Python objects are generated.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (""" + _BATCH_GROUP_FUNCTION + """)({{ this.data_json }}).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, quakes):
+        super().__init__()
+        self._name = "BatchQuakeLayer"
+        self.data_json = script_json(quake_columns(quakes))
+
+
+# ===== Live Feed Overlay =====
+LIVE_FEED_FUNCTION = "addLiveFeedEvents"
+
+
+class LiveFeedSlot(MacroElement):
+    """
+    Defines `addLiveFeedEvents(payload)`, which adds a "Live Feed Events" overlay
+    to the map and its layer control. The map HTML can then be cached without the
+    feed, and `with_live_feed` appends the current feed events to it on each
+    refresh. Add it to the map after `layer_control`.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        function """ + LIVE_FEED_FUNCTION + """(q) {
+            var group = (""" + _BATCH_GROUP_FUNCTION + """)(q).addTo({{ this._parent.get_name() }});
+            {{ this.layer_control.get_name() }}.addOverlay(group, "Live Feed Events");
+        }
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer_control):
+        super().__init__()
+        self._name = "LiveFeedSlot"
+        self.layer_control = layer_control
+
+
+def with_live_feed(map_html, quakes):
+    """Map HTML rendered with a `LiveFeedSlot`, plus `quakes` (feed events) on its live feed overlay."""
+    if quakes.empty:
+        return map_html
+    head, end, tail = map_html.rpartition("</html>")
+    # Maps without the slot (earthquake layer hidden) leave the events off
+    script = (f"<script>if (typeof {LIVE_FEED_FUNCTION} === 'function') "
+              f"{{ {LIVE_FEED_FUNCTION}({script_json(quake_columns(quakes))}); }}</script>\n")
+    return head + script + end + tail
+
+
+# ===== Client-Filtered Earthquake Layer =====
+def encode_column(values, dtype):
+    """Base64 of the values as a little-endian typed array, decoded in the browser."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def encode_strings(values):
+    """String column as a table of distinct values plus a base64 uint32 code per row."""
+    table, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return {"table": table.tolist(), "codes": encode_column(codes, "<u4")}
+
+
+def client_quake_payload(quakes):
+    """Compact columnar payload of the events; styling is left to the browser."""
+    return {
+        "count": len(quakes),
+        "year": encode_column(quakes["year"], "<i4"),
+        "magnitude": encode_column(np.round(quakes["magnitude"].to_numpy(dtype=np.float64) * 100), "<i2"), # Mw can be < 0
+        "lat": encode_column(quakes["lat"], "<f4"),
+        "lon": encode_column(quakes["lon"], "<f4"),
+        "deaths": encode_column(np.clip(quakes["deaths"].to_numpy(), 0, 2 ** 32 - 1), "<u4"),
+        "location": encode_strings(quakes["location"]),
+        "description": encode_strings(quakes["description"]),
+    }
+
+
+class ClientFilterQuakeLayer(MacroElement):
+    """
+    All events of the selection plus an on-map control that filters them by year
+    and magnitude in the browser. Marker radius and colour follow the same rules
+    as `magnitude_styles`, recomputed over the events currently shown.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function (q, init) {
+            function decode(b64, Type) {
+                var bin = atob(b64), bytes = new Uint8Array(bin.length);
+                for (var i = 0; i < bin.length; i++) { bytes[i] = bin.charCodeAt(i); }
+                return new Type(bytes.buffer);
+            }
+            var year = decode(q.year, Int32Array), mag100 = decode(q.magnitude, Int16Array);
+            var lat = decode(q.lat, Float32Array), lon = decode(q.lon, Float32Array);
+            var deaths = decode(q.deaths, Uint32Array);
+            var locations = decode(q.location.codes, Uint32Array);
+            var descriptions = decode(q.description.codes, Uint32Array);
+            var renderer = L.canvas({padding: 0.5});
+            var group = L.featureGroup();
+
+            // Same colours as magnitude_colormap/colormap_hex: yellow -> orange -> red over the shown range
+            function colormap(lo, hi) {
+                if (lo === hi) { return {index: [lo - 0.1, hi + 0.1], colors: [[1, 1, 0], [1, 0, 0]]}; }
+                return {index: [lo, (lo + hi) / 2, hi], colors: [[1, 1, 0], [1, 165 / 255, 0], [1, 0, 0]]};
+            }
+            function hex(v) { var h = Math.floor(v * 255.9999).toString(16); return h.length < 2 ? '0' + h : h; }
+            function color(cmap, m) {
+                var idx = cmap.index, n = idx.length;
+                m = Math.min(Math.max(m, idx[0]), idx[n - 1]);
+                var k = 1;
+                while (k < n - 1 && idx[k] < m) { k++; }
+                var p = (m - idx[k - 1]) / (idx[k] - idx[k - 1]), a = cmap.colors[k - 1], b = cmap.colors[k];
+                return '#' + hex((1 - p) * a[0] + p * b[0]) + hex((1 - p) * a[1] + p * b[1]) +
+                    hex((1 - p) * a[2] + p * b[2]) + 'ff';
+            }
+            function popup(i) {
+                return function () {
+                    return '<div style="width: 250px; font-family: Arial, sans-serif; font-size: 13px;">' +
+                        '<h4 style="margin-bottom: 5px;">' + year[i] + ' ' + q.location.table[locations[i]] + '</h4>' +
+                        '<hr style="margin-top: 0; margin-bottom: 10px;">' +
+                        '<p><b>Magnitude (Mw):</b> ' + (mag100[i] / 100) + '</p>' +
+                        '<p><b>Deaths:</b> ' + deaths[i].toLocaleString('en-US') + '</p>' +
+                        '<p><i>' + q.description.table[descriptions[i]] + '</i></p></div>';
+                };
+            }
+
+            var status = null;
+            function apply(y0, y1, m0, m1) {
+                var lo100 = Math.round(m0 * 100), hi100 = Math.round(m1 * 100), shown = [];
+                var lo = Infinity, hi = -Infinity;
+                for (var i = 0; i < q.count; i++) {
+                    if (year[i] >= y0 && year[i] <= y1 && mag100[i] >= lo100 && mag100[i] <= hi100) {
+                        shown.push(i);
+                        lo = Math.min(lo, mag100[i] / 100);
+                        hi = Math.max(hi, mag100[i] / 100);
+                    }
+                }
+                group.clearLayers();
+                var cmap = colormap(lo, hi);
+                shown.forEach(function (i) {
+                    var m = mag100[i] / 100, c = color(cmap, m);
+                    var marker = L.circleMarker([lat[i], lon[i]], {
+                        renderer: renderer, radius: lo === hi ? 5 : 3 + (m - lo) * 2, color: c,
+                        fillColor: c, fill: true, fillOpacity: 0.6, weight: 1
+                    });
+                    marker.bindTooltip(year[i] + ' ' + q.location.table[locations[i]] + ' (M' + m + ')');
+                    marker.bindPopup(popup(i), {maxWidth: 300});
+                    group.addLayer(marker);
+                });
+                if (status) { status.textContent = shown.length.toLocaleString('en-US') + ' of ' + q.count.toLocaleString('en-US') + ' events'; }
+            }
+
+            // The control follows the layer: shown while it is on the map, built once
+            var control = L.control({position: 'bottomleft'}), container = null;
+            control.onAdd = function () {
+                if (container) { return container; }
+                var div = container = L.DomUtil.create('div', 'leaflet-bar');
+                div.style.cssText = 'background: white; padding: 6px 10px; font: 12px Arial, sans-serif;';
+                var inputs = {};
+                function row(label, key, min, max, step, value) {
+                    var line = L.DomUtil.create('div', '', div);
+                    var text = L.DomUtil.create('span', '', line);
+                    var input = L.DomUtil.create('input', '', line);
+                    input.type = 'range'; input.min = min; input.max = max; input.step = step; input.value = value;
+                    input.style.cssText = 'width: 140px; vertical-align: middle;';
+                    inputs[key] = {input: input, text: text, label: label};
+                }
+                row('Year from', 'y0', init.years[0], init.years[1], 1, init.year_range[0]);
+                row('Year to', 'y1', init.years[0], init.years[1], 1, init.year_range[1]);
+                row('Mw from', 'm0', init.magnitudes[0], init.magnitudes[1], 0.1, init.magnitude_range[0]);
+                row('Mw to', 'm1', init.magnitudes[0], init.magnitudes[1], 0.1, init.magnitude_range[1]);
+                status = L.DomUtil.create('div', '', div);
+                var pending = null;
+                function update() {
+                    var v = {};
+                    Object.keys(inputs).forEach(function (key) {
+                        v[key] = parseFloat(inputs[key].input.value);
+                        inputs[key].text.textContent = inputs[key].label + ' ' + v[key] + ' ';
+                    });
+                    clearTimeout(pending);
+                    pending = setTimeout(function () { apply(v.y0, v.y1, v.m0, v.m1); }, 60);
+                }
+                Object.keys(inputs).forEach(function (key) { L.DomEvent.on(inputs[key].input, 'input', update); });
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                update();
+                return div;
+            };
+            group.on('add', function () { control.addTo(group._map); });
+            group.on('remove', function () { control.remove(); });
+            return group;
+        })({{ this.data_json }}, {{ this.init_json }}).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, quakes, year_bounds, magnitude_bounds, year_range, magnitude_range):
+        super().__init__()
+        self._name = "ClientFilterQuakeLayer"
+        self.data_json = script_json(client_quake_payload(quakes))
+        self.init_json = script_json({
+            "years": [int(v) for v in year_bounds],
+            "magnitudes": [float(v) for v in magnitude_bounds],
+            "year_range": [int(v) for v in year_range],
+            "magnitude_range": [float(v) for v in magnitude_range],
+        })
+
+
+# ===== Heatmap =====
+class PointHeatMap(HeatMap):
+    """HeatMap fed straight from an (N, 2) NumPy array, skipping folium's per-point validation."""
+
+    def __init__(self, points, **kwargs):
+        super().__init__([], **kwargs)
+        self.data = np.round(np.asarray(points, dtype=np.float64), 5).tolist()
+
+
+# ===== Time Playback Layer =====
+MOMENT_MAGNITUDE_SPAN = 3.0 # Released moment is coloured over this many magnitude units below the peak cell
+
+
+def moment_magnitude(moment):
+    """Moment magnitude equivalent to a seismic moment in N·m (inverse of `seismic_moment`)."""
+    return (np.log10(moment) - 9.1) / 1.5
+
+
+def playback_payload(frames):
+    """Per-frame deltas of `PlaybackFrames` as base64 typed arrays, decoded in the browser."""
+    n_rows, n_cols = frames.grid_shape
+    return {
+        "frames": len(frames),
+        "period": int(frames.period),
+        "first_year": int(frames.first_year),
+        "offsets": encode_column(frames.offsets, "<u4"),
+        "lat": encode_column(frames.lat, "<u2"),
+        "lon": encode_column(frames.lon, "<u2"),
+        "magnitude": encode_column(frames.magnitude, "<i2"),
+        "moment_offsets": encode_column(frames.moment_offsets, "<u4"),
+        "moment_cells": encode_column(frames.moment_cells, "<u4"),
+        "moment": encode_column(frames.moment, "<f4"),
+        "grid": {"rows": int(n_rows), "cols": int(n_cols), "bounds": [float(v) for v in frames.bounds]},
+    }
+
+
+class PlaybackLayer(MacroElement):
+    """
+    Time playback of `PlaybackFrames` with an on-map player. Each frame draws its
+    own events (styled like `magnitude_styles`) over the earlier ones in grey on
+    the `events_parent` group, and adds its released moment to a running grid
+    shown on the `moment_parent` group. Stepping forward only touches the frame's
+    deltas; seeking backwards redraws from the first frame. Added to the map after
+    both groups.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function (q, init, map, eventsGroup, momentGroup) {
+            function decode(b64, Type) {
+                var bin = atob(b64), bytes = new Uint8Array(bin.length);
+                for (var i = 0; i < bin.length; i++) { bytes[i] = bin.charCodeAt(i); }
+                return new Type(bytes.buffer);
+            }
+            var offsets = decode(q.offsets, Uint32Array), mag100 = decode(q.magnitude, Int16Array);
+            var latQ = decode(q.lat, Uint16Array), lonQ = decode(q.lon, Uint16Array);
+            var momentOffsets = decode(q.moment_offsets, Uint32Array), momentCells = decode(q.moment_cells, Uint32Array);
+            var moment = decode(q.moment, Float32Array);
+            var b = q.grid.bounds, lat = new Float32Array(latQ.length), lon = new Float32Array(lonQ.length);
+            for (var i = 0; i < latQ.length; i++) {
+                lat[i] = b[0] + latQ[i] / init.levels * (b[2] - b[0]);
+                lon[i] = b[1] + lonQ[i] / init.levels * (b[3] - b[1]);
+            }
+
+            // Same colours and radii as magnitude_styles, over the magnitudes of the whole selection
+            var lo = init.magnitudes[0], hi = init.magnitudes[1];
+            var cmap = lo === hi ? {index: [lo - 0.1, hi + 0.1], colors: [[1, 1, 0], [1, 0, 0]]}
+                : {index: [lo, (lo + hi) / 2, hi], colors: [[1, 1, 0], [1, 165 / 255, 0], [1, 0, 0]]};
+            function hex(v) { var h = Math.floor(v * 255.9999).toString(16); return h.length < 2 ? '0' + h : h; }
+            function color(m) {
+                var idx = cmap.index, n = idx.length;
+                m = Math.min(Math.max(m, idx[0]), idx[n - 1]);
+                var k = 1;
+                while (k < n - 1 && idx[k] < m) { k++; }
+                var p = (m - idx[k - 1]) / (idx[k] - idx[k - 1]), a = cmap.colors[k - 1], c = cmap.colors[k];
+                return '#' + hex((1 - p) * a[0] + p * c[0]) + hex((1 - p) * a[1] + p * c[1]) + hex((1 - p) * a[2] + p * c[2]);
+            }
+
+            // Events: earlier frames in grey on one canvas, the current frame in colour on another
+            var frame = -1;
+            var EventCanvas = L.Layer.extend({
+                onAdd: function (map) {
+                    var pane = map.getPanes().overlayPane;
+                    this._trail = L.DomUtil.create('canvas', 'leaflet-zoom-hide', pane);
+                    this._current = L.DomUtil.create('canvas', 'leaflet-zoom-hide', pane);
+                    map.on('moveend', this.redraw, this);
+                    this.redraw();
+                },
+                onRemove: function (map) {
+                    L.DomUtil.remove(this._trail);
+                    L.DomUtil.remove(this._current);
+                    map.off('moveend', this.redraw, this);
+                },
+                redraw: function () {
+                    if (!this._map) { return; }
+                    var size = this._map.getSize(), origin = this._map.containerPointToLayerPoint([0, 0]);
+                    [this._trail, this._current].forEach(function (canvas) {
+                        canvas.width = size.x; canvas.height = size.y;
+                        L.DomUtil.setPosition(canvas, origin);
+                    });
+                    if (frame >= 0) { this.trail(0, offsets[frame]); this.current(frame); }
+                },
+                trail: function (start, stop) {
+                    if (!this._map) { return; }
+                    var ctx = this._trail.getContext('2d');
+                    ctx.fillStyle = 'rgba(90, 90, 90, 0.5)';
+                    for (var i = start; i < stop; i++) {
+                        var p = this._map.latLngToContainerPoint([lat[i], lon[i]]);
+                        ctx.fillRect(p.x - 1.5, p.y - 1.5, 3, 3);
+                    }
+                },
+                current: function (f) {
+                    if (!this._map) { return; }
+                    var ctx = this._current.getContext('2d');
+                    ctx.clearRect(0, 0, this._current.width, this._current.height);
+                    ctx.lineWidth = 1;
+                    for (var i = offsets[f]; i < offsets[f + 1]; i++) {
+                        var m = mag100[i] / 100, c = color(m), p = this._map.latLngToContainerPoint([lat[i], lon[i]]);
+                        ctx.beginPath();
+                        ctx.arc(p.x, p.y, lo === hi ? 5 : 3 + (m - lo) * 2, 0, 2 * Math.PI);
+                        ctx.globalAlpha = 0.6; ctx.fillStyle = c; ctx.fill();
+                        ctx.globalAlpha = 1.0; ctx.strokeStyle = c; ctx.stroke();
+                    }
+                }
+            });
+            var events = new EventCanvas();
+            eventsGroup.addLayer(events);
+
+            // Released moment: running total per grid cell, coloured like the hazard raster
+            var cells = q.grid.rows * q.grid.cols, total = new Float64Array(cells);
+            var grid = document.createElement('canvas');
+            grid.width = q.grid.cols; grid.height = q.grid.rows;
+            var gridContext = grid.getContext('2d'), image = gridContext.createImageData(q.grid.cols, q.grid.rows);
+            var overlay = L.imageOverlay(grid.toDataURL(), [[b[0], b[1]], [b[2], b[3]]], {opacity: 0.75});
+            if (momentGroup) { momentGroup.addLayer(overlay); }
+            function paint(cell) {
+                var mw = (Math.log(total[cell]) / Math.LN10 - 9.1) / 1.5;
+                var level = Math.min(Math.max((mw - init.moment_floor) / (init.moment_peak - init.moment_floor), 0), 1);
+                var stops = init.gradient.stops, colors = init.gradient.colors, k = 1;
+                while (k < stops.length - 1 && stops[k] < level) { k++; }
+                var p = Math.min(Math.max((level - stops[k - 1]) / (stops[k] - stops[k - 1]), 0), 1);
+                for (var channel = 0; channel < 3; channel++) {
+                    image.data[4 * cell + channel] = (1 - p) * colors[k - 1][channel] + p * colors[k][channel];
+                }
+                var alpha = Math.min(Math.max((level - init.min_visible) / (1 - init.min_visible), 0), 1);
+                image.data[4 * cell + 3] = total[cell] > 0 ? Math.sqrt(alpha) * 200 : 0;
+            }
+            function addMoment(f0, f1) {
+                for (var k = momentOffsets[f0]; k < momentOffsets[f1]; k++) {
+                    total[momentCells[k]] += moment[k];
+                    paint(momentCells[k]);
+                }
+                gridContext.putImageData(image, 0, 0);
+                overlay.setUrl(grid.toDataURL());
+            }
+
+            var slider = null, label = null;
+            function show(target) {
+                if (target > frame) {
+                    // Forward: only the frames in between are drawn and added
+                    events.trail(frame >= 0 ? offsets[frame] : 0, offsets[target]);
+                    addMoment(frame + 1, target + 1);
+                } else if (target < frame) {
+                    total.fill(0); image.data.fill(0);
+                    frame = target;
+                    events.redraw();
+                    addMoment(0, target + 1);
+                }
+                frame = target;
+                events.current(frame);
+                if (slider) { slider.value = frame; }
+                if (label) {
+                    var start = q.first_year + frame * q.period;
+                    label.textContent = (q.period > 1 ? start + '–' + (start + q.period - 1) : start) + ': ' +
+                        (offsets[frame + 1] - offsets[frame]).toLocaleString('en-US') + ' events, ' +
+                        offsets[frame + 1].toLocaleString('en-US') + ' of ' +
+                        offsets[q.frames].toLocaleString('en-US') + ' so far';
+                }
+            }
+
+            // Player: play/pause, frame slider and speed
+            var timer = null, control = L.control({position: 'bottomleft'});
+            control.onAdd = function () {
+                var div = L.DomUtil.create('div', 'leaflet-bar');
+                div.style.cssText = 'background: white; padding: 6px 10px; font: 12px Arial, sans-serif;';
+                var line = L.DomUtil.create('div', '', div);
+                var button = L.DomUtil.create('button', '', line);
+                button.textContent = '▶';
+                slider = L.DomUtil.create('input', '', line);
+                slider.type = 'range'; slider.min = 0; slider.max = q.frames - 1; slider.step = 1; slider.value = 0;
+                slider.style.cssText = 'width: 180px; vertical-align: middle;';
+                var speed = L.DomUtil.create('select', '', line);
+                init.speeds.forEach(function (fps) {
+                    var option = L.DomUtil.create('option', '', speed);
+                    option.value = fps; option.textContent = fps + ' frames/s';
+                    option.selected = fps === init.speed;
+                });
+                label = L.DomUtil.create('div', '', div);
+                function pause() { clearInterval(timer); timer = null; button.textContent = '▶'; }
+                function play() {
+                    if (frame >= q.frames - 1) { show(0); }
+                    timer = setInterval(function () {
+                        if (frame >= q.frames - 1) { pause(); } else { show(frame + 1); }
+                    }, 1000 / parseFloat(speed.value));
+                    button.textContent = '⏸';
+                }
+                L.DomEvent.on(button, 'click', function () { if (timer) { pause(); } else { play(); } });
+                L.DomEvent.on(speed, 'change', function () { if (timer) { pause(); play(); } });
+                L.DomEvent.on(slider, 'input', function () { show(parseInt(slider.value, 10)); });
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                return div;
+            };
+            control.addTo(map);
+            show(0);
+            return events;
+        })({{ this.data_json }}, {{ this.init_json }}, {{ this._parent.get_name() }},
+           {{ this.events_parent.get_name() }}, {{ this.moment_parent.get_name() if this.moment_parent else 'null' }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, frames, events_parent, moment_parent=None, speeds=(1, 2, 4, 8, 16), speed=4):
+        super().__init__()
+        self._name = "PlaybackLayer"
+        self.events_parent, self.moment_parent = events_parent, moment_parent
+        self.data_json = script_json(playback_payload(frames))
+        moment_peak = float(moment_magnitude(frames.peak_moment())) if frames.events else 0.0
+        self.init_json = script_json({
+            "levels": COORDINATE_LEVELS,
+            "magnitudes": [float(frames.magnitude.min()) / 100, float(frames.magnitude.max()) / 100]
+            if frames.events else [0.0, 0.0],
+            "moment_peak": moment_peak,
+            "moment_floor": moment_peak - MOMENT_MAGNITUDE_SPAN,
+            "gradient": {
+                "stops": [stop for stop, _ in HAZARD_GRADIENT], "colors": [list(color) for _, color in HAZARD_GRADIENT]
+            },
+            "min_visible": MIN_VISIBLE,
+            "speeds": list(speeds),
+            "speed": speed,
+        })
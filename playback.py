@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Time playback of the earthquake selection, one year or decade per frame.
+
+A naive animation (one `TimestampedGeoJson` feature or `HeatMapWithTime` list
+per frame) repeats every earlier event in every later frame, so its size grows
+with events x frames and it is rebuilt and re-serialised on each rerun. Here a
+frame is stored as a delta: the events it adds and the seismic moment they
+release per grid cell. The catalog keeps its events in (year, magnitude)
+order, so the events of a frame are one contiguous slice of the selection and
+the deltas are flat arrays plus per-frame offsets (the CSR layout of the grid
+index). The browser replays them by drawing each frame's events over the
+previous ones and adding its moment to a running grid, so a frame costs time
+proportional to its own events.
+
+Coordinates are quantised to 16 bits over the map extent (about 15 m) and
+magnitudes to signed hundredths, six bytes per event. Frames are built in chunks of
+events by `PlaybackBuilder`, a daemon thread that reports progress, and are
+cached per filter set like the other render artefacts.
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from fault_association import seismic_moment
+from hazard_raster import _mercator_y, grid_axes
+from render_cache import approximate_size
+from spatial_index import SOUTHERN_ITALY_BOUNDS
+
+PLAYBACK_PERIODS = {"Year": 1, "Decade": 10} # Frame length in years
+MOMENT_RESOLUTION = 0.1 # Degrees per cell of the released-moment grid
+CHUNK_EVENTS = 250_000 # Events per build step; progress is reported after each
+COORDINATE_LEVELS = 65535 # uint16 quantisation of lat/lon over the extent
+STALE_SECONDS = float(os.environ.get("FAULTS_PLAYBACK_STALE_SECONDS", "30"))
+
+
+# ===== Frames =====
+class PlaybackFrames:
+    """
+    Per-frame deltas of a selection. Frame `f` covers the years from
+    `first_year + f * period` and adds the events `offsets[f]:offsets[f + 1]`
+    and the (cell, moment) pairs `moment_offsets[f]:moment_offsets[f + 1]`.
+    """
+
+    def __init__(self, period, first_year, offsets, lat, lon, magnitude, moment_offsets, moment_cells,
+                 moment, grid_shape, bounds=SOUTHERN_ITALY_BOUNDS):
+        self.period = period
+        self.first_year = first_year
+        self.offsets = offsets # uint32, frames + 1
+        self.lat, self.lon = lat, lon # uint16 over the extent
+        self.magnitude = magnitude # int16, hundredths of a magnitude unit (Mw can be negative)
+        self.moment_offsets = moment_offsets # uint32, frames + 1
+        self.moment_cells = moment_cells # uint32 row-major cell of the grid (north row first)
+        self.moment = moment # float32 N·m released in the cell during the frame
+        self.grid_shape = grid_shape
+        self.bounds = bounds
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def events(self):
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.offsets, self.lat, self.lon, self.magnitude, self.moment_offsets, self.moment_cells, self.moment
+        ))
+
+    def peak_moment(self):
+        """Largest moment released in one cell over the whole playback."""
+        if not len(self.moment):
+            return 0.0
+        totals = np.bincount(self.moment_cells, weights=self.moment, minlength=self.grid_shape[0] * self.grid_shape[1])
+        return float(totals.max())
+
+
+def _grid_cells(lat, lon, bounds, grid_shape):
+    # Row-major cell of the Web Mercator grid of `grid_axes` (north row first)
+    south, west, north, east = bounds
+    n_rows, n_cols = grid_shape
+    y_north, y_south = _mercator_y(north), _mercator_y(south)
+    rows = np.clip(((y_north - _mercator_y(lat)) / (y_north - y_south) * n_rows).astype(np.int64), 0, n_rows - 1)
+    cols = np.clip(((lon - west) / (east - west) * n_cols).astype(np.int64), 0, n_cols - 1)
+    return rows * n_cols + cols
+
+
+def _quantise(values, low, high):
+    return np.round(np.clip((values - low) / (high - low), 0.0, 1.0) * COORDINATE_LEVELS).astype(np.uint16)
+
+
+def build_playback(catalog, positions, period, progress=None, bounds=SOUTHERN_ITALY_BOUNDS,
+                   resolution=MOMENT_RESOLUTION, chunk_events=CHUNK_EVENTS):
+    """
+    `PlaybackFrames` of the catalog events at `positions`, with frames of `period`
+    years aligned to multiples of it. `progress(fraction)` is called after every
+    `chunk_events` events.
+    """
+    positions = np.sort(np.asarray(positions, dtype=np.int64)) # (year, magnitude) order
+    years = catalog.years[positions].astype(np.int64)
+    n_events = len(positions)
+    first_year = int(years[0] // period * period) if n_events else 0
+    frame_of = (years - first_year) // period
+    n_frames = int(frame_of[-1]) + 1 if n_events else 0
+    offsets = np.searchsorted(frame_of, np.arange(n_frames + 1)).astype(np.uint32)
+
+    south, west, north, east = bounds
+    lat = np.empty(n_events, dtype=np.uint16)
+    lon = np.empty(n_events, dtype=np.uint16)
+    magnitude = np.empty(n_events, dtype=np.int16)
+    moment_frames, moment_cells, moment = [], [], []
+    grid_shape = tuple(len(axis) for axis in grid_axes(bounds, resolution))
+    n_cells = grid_shape[0] * grid_shape[1]
+    for start in range(0, n_events, chunk_events):
+        part = slice(start, start + chunk_events)
+        event_lat, event_lon = catalog.lat[positions[part]], catalog.lon[positions[part]]
+        event_magnitudes = catalog.magnitudes[positions[part]]
+        lat[part], lon[part] = _quantise(event_lat, south, north), _quantise(event_lon, west, east)
+        magnitude[part] = np.round(event_magnitudes * 100).astype(np.int16)
+        # Moment per (frame, cell) of the chunk; a frame split across chunks just has two entries for a cell
+        keys, inverse = np.unique(
+            frame_of[part] * n_cells + _grid_cells(event_lat, event_lon, bounds, grid_shape), return_inverse=True
+        )
+        moment_frames.append(keys // n_cells)
+        moment_cells.append((keys % n_cells).astype(np.uint32))
+        moment.append(np.bincount(inverse.reshape(-1), weights=seismic_moment(event_magnitudes)).astype(np.float32))
+        if progress is not None:
+            progress(min(start + chunk_events, n_events) / n_events)
+
+    moment_frames = np.concatenate(moment_frames) if moment_frames else np.empty(0, dtype=np.int64)
+    return PlaybackFrames(
+        period, first_year, offsets, lat, lon, magnitude,
+        np.searchsorted(moment_frames, np.arange(n_frames + 1)).astype(np.uint32),
+        np.concatenate(moment_cells) if moment_cells else np.empty(0, dtype=np.uint32),
+        np.concatenate(moment) if moment else np.empty(0, dtype=np.float32),
+        grid_shape, bounds,
+    )
+
+
+# ===== Background Builder =====
+class PlaybackTooLarge(ValueError):
+    """Built playback artefact larger than the whole byte budget of its cache."""
+
+
+class PlaybackBuilder:
+    """
+    Daemon thread that builds playback artefacts into a render cache. The most
+    recent request is built first, and requests nobody has repeated for
+    `stale_seconds` (the session moved on) are dropped. An artefact the cache
+    cannot hold is reported as `PlaybackTooLarge` on every later request
+    instead of being rebuilt.
+    """
+
+    def __init__(self, stale_seconds=STALE_SECONDS):
+        self.stale_seconds = stale_seconds
+        self._queue = queue.LifoQueue()
+        self._progress = {} # key -> fraction built, for queued and running jobs
+        self._requested = {} # key -> last time a session asked for it
+        self._errors = {}
+        self._oversized = {} # key -> PlaybackTooLarge, kept: rebuilding would not make it fit
+        self._lock = threading.Lock()
+        self._thread = None
+        self.built = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def start(self):
+        """Start the worker thread (no-op when running)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="playback-builder", daemon=True)
+            self._thread.start()
+        return self
+
+    def request(self, cache, key, build):
+        """
+        Cached value of `key`, or None after queueing `build(progress)` to compute it.
+        Call again (e.g. on the next poll) to pick the value up; a failed build
+        raises its exception on the next call, and `PlaybackTooLarge` on every call.
+        """
+        sentinel = object()
+        value = cache.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            if key in self._oversized:
+                raise self._oversized[key]
+            if key in self._errors:
+                raise self._errors.pop(key)
+            self._requested[key] = time.monotonic()
+            if key in self._progress:
+                return None
+            self._progress[key] = 0.0
+        self._queue.put((cache, key, build))
+        return None
+
+    def progress(self, key):
+        """Fraction of `key` built so far, or None when it is not queued or building."""
+        with self._lock:
+            return self._progress.get(key)
+
+    def oversized(self, key):
+        """True when `key` was built but is too large for its cache."""
+        with self._lock:
+            return key in self._oversized
+
+    def _set_progress(self, key, fraction):
+        with self._lock:
+            self._progress[key] = fraction
+
+    def _work(self):
+        while True:
+            cache, key, build = self._queue.get()
+            with self._lock:
+                stale = time.monotonic() - self._requested.get(key, 0.0) > self.stale_seconds
+                if stale:
+                    self._progress.pop(key, None)
+                    self._requested.pop(key, None)
+                    self.dropped += 1
+            if stale:
+                continue
+            try:
+                value = build(lambda fraction: self._set_progress(key, fraction))
+                # Stored before the job is cleared, so a request never finds neither
+                cache.put(key, value)
+                if key in cache:
+                    self.built += 1
+                else: # Dropped by put(): larger than the cache's whole byte budget
+                    with self._lock:
+                        self._oversized[key] = PlaybackTooLarge(
+                            f"The playback needs {approximate_size(value) / 1024 ** 2:.1f} MB, more than the "
+                            f"{cache.max_bytes / 1024 ** 2:.1f} MB of the {cache.name} cache"
+                        )
+                    self.failures += 1
+            except Exception as exc: # Handed to the session that asks next
+                with self._lock:
+                    self._errors[key] = exc
+                self.failures += 1
+            with self._lock:
+                self._progress.pop(key, None)
+                self._requested.pop(key, None)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "built": self.built,
+            "dropped_stale": self.dropped,
+            "failures": self.failures,
+        }
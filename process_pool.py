@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Process pool shared by the CPU-bound analytics (hazard grids, bootstrap resamples).
+
+Workers are spawned rather than forked: the app server process runs threads,
+and a forked child could inherit a lock that one of them was holding.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+def pool_map(function, jobs, workers):
+    """`function` applied to every job, in order, across at most `workers` spawned processes."""
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=get_context("spawn")) as pool:
+        return list(pool.map(function, jobs))
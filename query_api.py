@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Local HTTP query API over the shared catalog and the fault systems.
+
+Tools that need the explorer's filtered views can query this endpoint instead of
+scraping the app:
+
+    GET /earthquakes?year_min=&year_max=&mag_min=&mag_max=&bbox=south,west,north,east&declustered=1
+    GET /faults?risk=High&risk=Very%20High&bbox=south,west,north,east
+
+Filters mean what they do in the app's sidebar. Earthquakes are looked up with
+`select_positions` on the shared, memory-mapped catalog and are limited to the
+map extent, so only the rows a response contains are materialised. Omitted
+windows default to the catalog bounds.
+
+`format=geojson` (the default) returns one page of a FeatureCollection
+(`page`, `page_size`) with the total match count and a link to the next page.
+`format=arrow` streams every match as an Arrow IPC stream, written in record
+batches as the rows are taken. Numeric columns go from the catalog's arrays to
+Arrow without conversion and text stays dictionary-encoded.
+
+Every response has an ETag derived from the catalog version and the normalised
+query. A request whose If-None-Match matches it gets 304 Not Modified.
+
+Set FAULTS_API_PORT to start the API inside the app's server process, or run it
+on its own:
+    python query_api.py --port 8765 --catalog catalog.parquet
+
+Arrow output needs the optional ``pyarrow`` package.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+from spatial_index import SOUTHERN_ITALY_BOUNDS, select_positions
+
+API_HOST = os.environ.get("FAULTS_API_HOST", "127.0.0.1")
+API_PORT = os.environ.get("FAULTS_API_PORT", "") # Empty: the app does not start the API
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10_000
+ARROW_BATCH_ROWS = 65_536
+GEOJSON_DECIMALS = 4 # ~10 m
+API_VERSION = 1 # Part of every ETag; bump when responses change shape
+FORMATS = ("geojson", "arrow")
+TRUE_VALUES = ("1", "true", "yes")
+
+
+class QueryError(ValueError):
+    """Invalid query parameter, answered with 400 Bad Request."""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc # noqa: F401
+    except ImportError as exc:
+        raise ImportError("Arrow output requires the 'pyarrow' package (pip install pyarrow).") from exc
+    return pyarrow
+
+
+# ===== Query Parsing =====
+def _param(params, name, cast, default=None):
+    values = params.get(name)
+    if not values or values[-1] == "":
+        return default
+    try:
+        return cast(values[-1])
+    except QueryError:
+        raise
+    except ValueError:
+        raise QueryError(f"invalid {name}: {values[-1]!r}") from None
+
+
+def parse_bbox(text):
+    """'south,west,north,east' -> tuple of floats."""
+    try:
+        south, west, north, east = (float(value) for value in text.split(","))
+    except ValueError:
+        raise QueryError(f"bbox must be 'south,west,north,east', got {text!r}") from None
+    if south > north or west > east:
+        raise QueryError(f"empty bbox: {text!r}")
+    return south, west, north, east
+
+
+def _bbox(params):
+    # The requested box, clipped to the map extent like every query in the app
+    south, west, north, east = _param(params, "bbox", parse_bbox, SOUTHERN_ITALY_BOUNDS)
+    bounds = SOUTHERN_ITALY_BOUNDS
+    return max(south, bounds[0]), max(west, bounds[1]), min(north, bounds[2]), min(east, bounds[3])
+
+
+def earthquake_query(params, catalog):
+    """Normalised earthquake filters from the query `params` (as from `parse_qs`)."""
+    first_year, last_year = catalog.year_bounds()
+    min_mag, max_mag = catalog.magnitude_bounds()
+    return {
+        "year_range": (_param(params, "year_min", int, first_year), _param(params, "year_max", int, last_year)),
+        "magnitude_range": (
+            _param(params, "mag_min", float, min_mag), _param(params, "mag_max", float, max_mag)
+        ),
+        "bbox": _bbox(params),
+        "declustered": _param(params, "declustered", lambda value: value.lower() in TRUE_VALUES, False),
+    }
+
+
+def fault_query(params):
+    """Normalised fault filters: risk levels (repeated or comma-separated; None for all) and bbox."""
+    risk = [level.strip() for value in params.get("risk", []) for level in value.split(",") if level.strip()]
+    return {"risk": tuple(sorted(risk)) or None, "bbox": _bbox(params)}
+
+
+def page_query(params):
+    """(format, page, page_size); pages only apply to GeoJSON."""
+    fmt = _param(params, "format", str.lower, FORMATS[0])
+    if fmt not in FORMATS:
+        raise QueryError(f"format must be one of {', '.join(FORMATS)}")
+    page = _param(params, "page", int, 1)
+    page_size = _param(params, "page_size", int, DEFAULT_PAGE_SIZE)
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise QueryError(f"page must be >= 1 and page_size between 1 and {MAX_PAGE_SIZE}")
+    return (fmt, None, None) if fmt == "arrow" else (fmt, page, page_size)
+
+
+def query_etag(*parts):
+    return '"' + hashlib.sha1(repr((API_VERSION,) + parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+# ===== Encoding =====
+def geojson_features(frame, lat="lat", lon="lon"):
+    """GeoJSON point features for the rows of `frame`, every other column as a property."""
+    records = json.loads(frame.drop(columns=[lat, lon]).to_json(orient="records"))
+    coordinates = zip(
+        frame[lon].astype(float).round(GEOJSON_DECIMALS).tolist(), frame[lat].astype(float).round(GEOJSON_DECIMALS).tolist()
+    )
+    return [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [x, y]}, "properties": properties}
+        for (x, y), properties in zip(coordinates, records)
+    ]
+
+
+def _chunks(positions, size=ARROW_BATCH_ROWS):
+    # At least one (possibly empty) chunk, so an empty result still carries its schema
+    for start in range(0, max(len(positions), 1), size):
+        yield positions[start:start + size]
+
+
+def arrow_schema(frame):
+    """
+    Stream schema for batches shaped like `frame`. Categorical columns always get
+    int32 dictionary indices: the categories of a batch only cover its own rows,
+    so the inferred index width would change from batch to batch.
+    """
+    pa = _require_pyarrow()
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    for number, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(number, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+# ===== Server =====
+class QueryHandler(BaseHTTPRequestHandler):
+    """Answers the API's GET requests from `server.resources()`."""
+
+    server_version = f"FaultsQueryAPI/{API_VERSION}"
+
+    def log_message(self, format, *args):
+        pass # Requests are not echoed into the app's console
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        routes = {"/earthquakes": self._earthquakes, "/faults": self._faults, "/": self._describe}
+        route = routes.get(url.path.rstrip("/") or "/")
+        if route is None:
+            self._send_json(404, {"error": f"unknown path {url.path!r}", "paths": sorted(routes)})
+            return
+        try:
+            route(url.path, parse_qs(url.query))
+        except QueryError as exc:
+            self._send_json(400, {"error": str(exc)})
+        except ImportError as exc:
+            self._send_json(501, {"error": str(exc)})
+
+    def _send_json(self, status, body, etag=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/geo+json" if "features" in body else "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self._cache_headers(etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _cache_headers(self, etag):
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache") # Revalidate: the catalog can change
+
+    def _not_modified(self, etag):
+        if etag not in (tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")):
+            return False
+        self.send_response(304)
+        self._cache_headers(etag)
+        self.end_headers()
+        return True
+
+    def _send_arrow(self, frames, etag):
+        pa = _require_pyarrow()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.apache.arrow.stream")
+        self._cache_headers(etag)
+        self.end_headers()
+        writer = schema = None
+        for frame in frames:
+            if schema is None:
+                schema = arrow_schema(frame)
+                writer = pa.ipc.new_stream(self.wfile, schema)
+            writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+        writer.close()
+
+    def _send_page(self, path, params, frame, matched, page, page_size, etag, lat="lat", lon="lon"):
+        body = {
+            "type": "FeatureCollection",
+            "numberMatched": matched,
+            "numberReturned": len(frame),
+            "page": page,
+            "pageSize": page_size,
+            "features": geojson_features(frame, lat, lon),
+            "links": [],
+        }
+        if page * page_size < matched:
+            next_params = dict(params, page=[str(page + 1)])
+            body["links"].append({"rel": "next", "href": f"{path}?{urlencode(next_params, doseq=True)}"})
+        self._send_json(200, body, etag)
+
+    def _describe(self, path, params):
+        self._send_json(200, {
+            "paths": {
+                "/earthquakes": "year_min, year_max, mag_min, mag_max, bbox, declustered",
+                "/faults": "risk (repeatable), bbox",
+            },
+            "common": f"format ({'|'.join(FORMATS)}), page and page_size (GeoJSON, at most {MAX_PAGE_SIZE})",
+        })
+
+    def _earthquakes(self, path, params):
+        resources = self.server.resources()
+        catalog = resources["catalog"]
+        query = earthquake_query(params, catalog)
+        fmt, page, page_size = page_query(params)
+        etag = query_etag("earthquakes", catalog.version, sorted(query.items()), fmt, page, page_size)
+        if self._not_modified(etag):
+            return
+        positions = select_positions(
+            catalog, resources["index"], query["year_range"], query["magnitude_range"], bbox=query["bbox"],
+            mask=resources["declustering"]().mainshock if query["declustered"] else None
+        )
+        if fmt == "arrow":
+            self._send_arrow((catalog.take(chunk) for chunk in _chunks(positions)), etag)
+            return
+        frame = catalog.take(positions[(page - 1) * page_size:page * page_size])
+        self._send_page(path, params, frame, len(positions), page, page_size, etag)
+
+    def _faults(self, path, params):
+        faults = self.server.resources()["faults"]
+        query = fault_query(params)
+        fmt, page, page_size = page_query(params)
+        faults_version = int(pd.util.hash_pandas_object(faults, index=False).sum()) if not faults.empty else 0
+        etag = query_etag("faults", faults_version, sorted(query.items()), fmt, page, page_size)
+        if self._not_modified(etag):
+            return
+        south, west, north, east = query["bbox"]
+        keep = faults["latitude"].between(south, north) & faults["longitude"].between(west, east)
+        if query["risk"] is not None:
+            keep &= faults["seismic_risk"].isin(query["risk"])
+        selected = faults[keep]
+        if fmt == "arrow":
+            self._send_arrow([selected], etag)
+            return
+        frame = selected.iloc[(page - 1) * page_size:page * page_size]
+        self._send_page(path, params, frame, len(selected), page, page_size, etag, "latitude", "longitude")
+
+
+def start_query_server(resources, host=API_HOST, port=0):
+    """
+    Serve the API on a daemon thread and return the server (`server_address`
+    holds the bound port; 0 picks a free one). `resources()` is called for every
+    request and returns {"catalog", "index", "faults", "declustering"}, the last a
+    function returning the catalog's `Declustering`.
+    """
+    server = ThreadingHTTPServer((host, int(port)), QueryHandler)
+    server.daemon_threads = True
+    server.resources = resources
+    threading.Thread(target=server.serve_forever, name="query-api", daemon=True).start()
+    return server
+
+
+class CatalogResources:
+    """`resources()` for a stand-alone server: the shared snapshots of a catalog file, reloaded when it changes."""
+
+    def __init__(self, path, faults):
+        self.path = path
+        self.faults = faults
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        from shared_catalog import load_shared_catalog, shared_declustering, shared_grid_index, source_version
+        from seismic_data import historical_earthquakes
+
+        version = source_version(self.path)
+        with self._lock:
+            if self._loaded is None or self._loaded["version"] != version:
+                catalog = load_shared_catalog(self.path or None, records=historical_earthquakes)
+                index = shared_grid_index(self.path, catalog)
+                self._loaded = {
+                    "version": version, "catalog": catalog, "index": index, "faults": self.faults,
+                    # Declustered only on first request
+                    "declustering": functools.lru_cache(maxsize=1)(
+                        lambda: shared_declustering(self.path, catalog, index)
+                    ),
+                }
+            return self._loaded
+
+
+def main(argv=None):
+    from seismic_data import fault_data, fault_frame
+
+    parser = argparse.ArgumentParser(description="Serve filtered catalog and fault queries over HTTP.")
+    parser.add_argument("--host", default=API_HOST, help="Interface to listen on (default: FAULTS_API_HOST or localhost)")
+    parser.add_argument("--port", type=int, default=int(API_PORT or 8765), help="Port (default: FAULTS_API_PORT or 8765)")
+    parser.add_argument("--catalog", default=os.environ.get("FAULTS_CATALOG_PATH", ""),
+                        help="Earthquake catalog file (default: FAULTS_CATALOG_PATH or built-in events)")
+    args = parser.parse_args(argv)
+    faults = fault_frame([item for item in fault_data if isinstance(item, dict)])
+    server = start_query_server(CatalogResources(args.catalog, faults), args.host, args.port)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide caches for the explorer's expensive artefacts.
+
+Streamlit re-runs the whole script on every widget interaction. Filtered
+frames, rendered map HTML and Plotly figure JSON are stored here under the
+normalised sidebar state, so a repeated filter combination from any session
+costs a dictionary lookup instead of a rebuild. Each cache is an LRU bounded by
+entry count and approximate size in bytes, and keeps hit/miss counters.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def approximate_size(value):
+    """Rough memory footprint in bytes, used for size-based eviction."""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(approximate_size(item) for item in value)
+    nbytes = getattr(value, "nbytes", None) # NumPy arrays and array-backed artefacts (e.g. playback frames)
+    if isinstance(nbytes, (int, np.integer)):
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and total approximate size."""
+
+    def __init__(self, name, max_entries=128, max_bytes=256 * 1024 ** 2):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (value, size)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Cached value for `key` without counting a lookup or refreshing its recency."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else default
+
+    def put(self, key, value):
+        size = approximate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value # Too large to keep without evicting everything else
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Cached value for `key`, calling `compute()` and storing the result on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cache": self.name,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def filter_key(display_options, filter_risk, year_range, magnitude_range, selected_tile, **extra):
+    """
+    Normalised, hashable form of the sidebar state. Selections are order-independent,
+    so equivalent states share a key; magnitudes are kept exact because the filters
+    use the exact slider values. A `None` window leaves that slider out of the key.
+    Extra keyword arguments (e.g. heatmap mode, focus area) are appended sorted by name.
+    """
+    return (
+        tuple(sorted(display_options)),
+        tuple(sorted(filter_risk)),
+        None if year_range is None else (int(year_range[0]), int(year_range[1])),
+        None if magnitude_range is None else (float(magnitude_range[0]), float(magnitude_range[1])),
+        selected_tile,
+    ) + tuple(sorted(extra.items()))
+
+
+def _sidebar_key(state, catalog_version, year_range, magnitude_range):
+    return filter_key(
+        state["display_options"], state["filter_risk"], year_range, magnitude_range,
+        state["selected_tile"], heatmap_mode=state["heatmap_mode"], focus_area=state["focus_area"],
+        focus_radius_km=state["focus_radius_km"], map_mode=state["map_mode"], declustered=state["declustered"],
+        playback_period=state["playback_period"], catalog=catalog_version
+    )
+
+
+def client_map_key(state, catalog_version):
+    """Key of a client-side map for `state`: the browser filters it, so the year/magnitude sliders are left out."""
+    return _sidebar_key(state, catalog_version, None, None)
+
+
+def state_keys(state, catalog_version):
+    """
+    (state_key, risk_key, quake_key) for a sidebar `state` dict: the full normalised
+    state, the risk selection that fault artefacts depend on, and the catalog version,
+    windows, focus area and declustering that earthquake artefacts depend on.
+    """
+    state_key = _sidebar_key(state, catalog_version, state["year_range"], state["magnitude_range"])
+    quake_key = (catalog_version,) + state_key[2:4] + (
+        state["focus_area"], state["focus_radius_km"], state["declustered"]
+    )
+    return state_key, state_key[1], quake_key
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch renderer for map and chart snapshots.
+
+Renders the explorer's map (HTML) and Plotly charts (JSON, optionally PNG) for
+every combination of risk sets x year windows x magnitude windows x tiles,
+without a Streamlit session, spread across a process pool.
+
+Example:
+    python render_snapshots.py --risk all --risk "High,Very High" \\
+        --years 1900- --years 1600-1900 --magnitudes 6.0- --tiles "CartoDB positron" \\
+        --out snapshots --workers 4
+
+Chart PNGs (--png) need Plotly's optional `kaleido` package.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from explorer_views import (
+    HEATMAP_MODES, MAP_TILE_OPTIONS, build_fault_type_figure, build_map, build_slip_figure,
+    build_timeline_figure, render_map_html,
+)
+from fault_traces import load_fault_traces
+from seismic_data import fault_data, fault_frame, historical_earthquakes
+from shared_catalog import load_shared_catalog, shared_grid_index
+from spatial_index import SOUTHERN_ITALY_BOUNDS, select_positions
+
+LAYER_OPTIONS = ["Fault Systems", "Historical Earthquakes", "Seismic Risk Heatmap"]
+
+# Per-process state, loaded once by the pool initializer
+_worker = {}
+
+
+# ===== Argument Parsing =====
+def parse_range(text, cast):
+    """'START-END' -> (start, end); either side may be left empty for the catalog bound."""
+    match = re.fullmatch(r"\s*([0-9.]*)\s*-\s*([0-9.]*)\s*", text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected START-END, got '{text}'")
+    return tuple(cast(value) if value else None for value in match.groups())
+
+
+def parse_risk(text):
+    return "all" if text.strip().lower() == "all" else tuple(r.strip() for r in text.split(",") if r.strip())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render explorer map/chart snapshots for a grid of filters.")
+    parser.add_argument("--risk", action="append", type=parse_risk,
+                        help="Comma-separated risk levels, or 'all' (repeatable; default: all)")
+    parser.add_argument("--years", action="append", type=lambda t: parse_range(t, int),
+                        help="Year window START-END (repeatable; default: 1900-)")
+    parser.add_argument("--magnitudes", action="append", type=lambda t: parse_range(t, float),
+                        help="Magnitude window MIN-MAX (repeatable; default: 6.0-)")
+    parser.add_argument("--tiles", action="append", choices=MAP_TILE_OPTIONS,
+                        help="Background tile (repeatable; default: CartoDB positron)")
+    parser.add_argument("--layers", default="Fault Systems,Historical Earthquakes",
+                        help=f"Comma-separated map layers from: {', '.join(LAYER_OPTIONS)}")
+    parser.add_argument("--heatmap-mode", choices=HEATMAP_MODES, default=HEATMAP_MODES[0])
+    parser.add_argument("--catalog", default=os.environ.get("FAULTS_CATALOG_PATH", ""),
+                        help="Earthquake catalog file (default: FAULTS_CATALOG_PATH or built-in events)")
+    parser.add_argument("--traces", default=os.environ.get("FAULTS_TRACES_PATH", ""),
+                        help="Fault trace GeoJSON/shapefile or directory (default: FAULTS_TRACES_PATH)")
+    parser.add_argument("--out", default="snapshots", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--png", action="store_true", help="Also write chart PNGs (requires kaleido)")
+    return parser
+
+
+# ===== Rendering =====
+def _require_kaleido():
+    try:
+        import kaleido  # noqa: F401
+    except ImportError as exc:
+        raise ImportError("Writing chart PNGs requires the optional 'kaleido' package (pip install kaleido).") from exc
+
+
+def _init_worker(catalog_path, traces_path):
+    # Workers memory-map the same catalog and index snapshot instead of each loading a copy
+    catalog = load_shared_catalog(catalog_path or None, records=historical_earthquakes)
+    _worker["catalog"] = catalog
+    _worker["index"] = shared_grid_index(catalog_path, catalog)
+    _worker["faults"] = fault_frame([item for item in fault_data if isinstance(item, dict)])
+    _worker["traces"] = load_fault_traces(traces_path) if traces_path else {}
+
+
+def _slug(risk, year_range, magnitude_range, tile):
+    risk_part = "all" if risk == "all" else "+".join(r.lower().replace(" ", "") for r in risk)
+    tile_part = tile.lower().replace(" ", "-")
+    return f"risk-{risk_part}_y{year_range[0]}-{year_range[1]}_m{magnitude_range[0]:.1f}-{magnitude_range[1]:.1f}_{tile_part}"
+
+
+def render_job(job):
+    """Render one filter combination into its own directory; returns timing and size info."""
+    started = time.perf_counter()
+    catalog, df_faults = _worker["catalog"], _worker["faults"]
+    risk, years, magnitudes, tile = job["risk"], job["years"], job["magnitudes"], job["tile"]
+
+    # Open-ended windows take the catalog bounds, like the sidebar sliders
+    min_year, max_year = catalog.year_bounds()
+    min_mag, max_mag = catalog.magnitude_bounds()
+    year_range = (years[0] if years[0] is not None else min_year, years[1] if years[1] is not None else max_year)
+    magnitude_range = (
+        magnitudes[0] if magnitudes[0] is not None else min_mag,
+        magnitudes[1] if magnitudes[1] is not None else max_mag,
+    )
+    filter_risk = sorted(df_faults["seismic_risk"].unique()) if risk == "all" else list(risk)
+
+    filtered_faults = df_faults[df_faults["seismic_risk"].isin(filter_risk)]
+    positions = select_positions(
+        catalog, _worker["index"], year_range, magnitude_range, bbox=SOUTHERN_ITALY_BOUNDS
+    )
+    filtered_quakes = catalog.take(positions)
+
+    slug = _slug(risk, year_range, magnitude_range, tile)
+    out_dir = os.path.join(job["out"], slug)
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = {}
+
+    map_html = render_map_html(build_map(
+        filtered_faults, filtered_quakes, job["layers"], tile,
+        heatmap_mode=job["heatmap_mode"], fault_traces=_worker["traces"]
+    ))
+    outputs["map.html"] = map_html.encode("utf-8")
+
+    figures = {}
+    if not filtered_faults.empty:
+        figures["slip_rate"] = build_slip_figure(filtered_faults)
+        type_fig = build_fault_type_figure(filtered_faults)
+        if type_fig is not None:
+            figures["fault_types"] = type_fig
+    if not filtered_quakes.empty:
+        figures["timeline"] = build_timeline_figure(filtered_quakes, year_range, magnitude_range)
+    for name, fig in figures.items():
+        outputs[f"{name}.json"] = fig.to_json().encode("utf-8")
+        if job["png"]:
+            outputs[f"{name}.png"] = fig.to_image(format="png")
+
+    for filename, payload in outputs.items():
+        with open(os.path.join(out_dir, filename), "wb") as out:
+            out.write(payload)
+
+    return {
+        "name": slug,
+        "faults": len(filtered_faults),
+        "earthquakes": len(filtered_quakes),
+        "bytes": {filename: len(payload) for filename, payload in outputs.items()},
+        "seconds": time.perf_counter() - started,
+        "pid": os.getpid(),
+    }
+
+
+def build_jobs(args):
+    risks = args.risk or ["all"]
+    year_windows = args.years or [(1900, None)]
+    magnitude_windows = args.magnitudes or [(6.0, None)]
+    tiles = args.tiles or [MAP_TILE_OPTIONS[0]]
+    layers = [layer.strip() for layer in args.layers.split(",") if layer.strip()]
+    unknown = [layer for layer in layers if layer not in LAYER_OPTIONS]
+    if unknown:
+        raise SystemExit(f"Unknown layer(s): {', '.join(unknown)}")
+    return [
+        {
+            "risk": risk, "years": years, "magnitudes": magnitudes, "tile": tile, "layers": layers,
+            "heatmap_mode": args.heatmap_mode, "png": args.png, "out": args.out,
+        }
+        for risk, years, magnitudes, tile in itertools.product(risks, year_windows, magnitude_windows, tiles)
+    ]
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    jobs = build_jobs(args)
+    if args.png:
+        _require_kaleido()
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Rendering {len(jobs)} snapshot(s) with {workers} worker(s) into {args.out}/")
+    if args.catalog:
+        # Publish the shared snapshot once, before the workers start mapping it
+        shared_grid_index(args.catalog, load_shared_catalog(args.catalog))
+
+    results, failures = [], 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.catalog, args.traces)) as pool:
+        futures = {pool.submit(render_job, job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except Exception as exc: # Report and keep rendering the rest of the grid
+                failures += 1
+                print(f"[{done}/{len(jobs)}] FAILED {futures[future]}: {exc}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(
+                f"[{done}/{len(jobs)}] {result['name']}: {result['seconds']:.2f}s, "
+                f"{result['earthquakes']} events, map {result['bytes']['map.html'] / 1024:.0f} KB"
+            )
+    wall = time.perf_counter() - started
+
+    render_seconds = sum(result["seconds"] for result in results)
+    summary = {
+        "renders": len(results),
+        "failures": failures,
+        "workers": workers,
+        "wall_seconds": wall,
+        "renders_per_second": len(results) / wall if wall > 0 else 0.0,
+        "mean_render_seconds": render_seconds / len(results) if results else 0.0,
+        "results": sorted(results, key=lambda result: result["name"]),
+    }
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "render_report.json"), "w", encoding="utf-8") as report:
+        json.dump(summary, report, indent=2)
+    print(
+        f"Done: {len(results)} render(s) in {wall:.2f}s wall "
+        f"({summary['renders_per_second']:.2f} renders/s, mean {summary['mean_render_seconds']:.2f}s per render)"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Seismic-risk heatmap point generation.
+
+Every fault system contributes a cloud of normally distributed points around
+its location, with more points and a wider spread for higher risk and slip
+rate. All clouds are drawn in one batched call from a seeded generator, so the
+same faults and parameters always give the same heatmap and the result can be
+memoized.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+RISK_LEVELS = {"Low": 1, "Moderate": 2, "Moderate to High": 3, "High": 4, "Very High": 5}
+
+HEATMAP_SEED = 42
+POINTS_PER_RISK_SLIP = 15 # Points per (risk level x mm/yr of slip)
+BASE_POINTS = 10 # Minimum points per fault system
+BASE_SPREAD = 0.15 # Degrees
+SPREAD_PER_RISK = 0.05 # Wider spread for higher risk
+LON_STRETCH = 1.5 # Wider E-W spread
+HEATMAP_CACHE_SIZE = 64
+
+
+def risk_values(seismic_risk):
+    """Numeric risk level (1-5) for each seismic risk label; unknown labels count as 1."""
+    return np.array([RISK_LEVELS.get(label, 1) for label in seismic_risk], dtype=np.float64)
+
+
+def generate_risk_points(lat, lon, risk, slip_rate, seed=HEATMAP_SEED,
+                         points_per_risk_slip=POINTS_PER_RISK_SLIP, base_points=BASE_POINTS):
+    """(N, 2) array of [lat, lon] heatmap points for all faults, drawn in one batch."""
+    lat, lon, risk, slip_rate = (np.asarray(a, dtype=np.float64) for a in (lat, lon, risk, slip_rate))
+    counts = (risk * slip_rate * points_per_risk_slip).astype(np.int64) + base_points
+    spread = BASE_SPREAD + risk * SPREAD_PER_RISK
+
+    # Expand per-fault parameters to per-point columns, then offset them with one normal draw
+    offsets = np.random.default_rng(seed).standard_normal((int(counts.sum()), 2))
+    offsets *= np.repeat(spread, counts)[:, None]
+    offsets[:, 1] *= LON_STRETCH
+    offsets[:, 0] += np.repeat(lat, counts)
+    offsets[:, 1] += np.repeat(lon, counts)
+    return offsets
+
+
+@lru_cache(maxsize=HEATMAP_CACHE_SIZE)
+def _cached_risk_points(fault_key, seed, points_per_risk_slip, base_points):
+    lat, lon, risk, slip_rate = (np.array(column, dtype=np.float64) for column in zip(*fault_key))
+    points = generate_risk_points(lat, lon, risk, slip_rate, seed, points_per_risk_slip, base_points)
+    points.setflags(write=False) # Shared between reruns and sessions
+    return points
+
+
+def risk_heat_points(faults, seed=HEATMAP_SEED, points_per_risk_slip=POINTS_PER_RISK_SLIP,
+                     base_points=BASE_POINTS):
+    """
+    Heatmap points for the fault systems in `faults` (a filtered df_faults).
+    Results are memoized per (fault selection, parameters) with LRU eviction.
+    """
+    if faults.empty:
+        return np.empty((0, 2))
+    fault_key = tuple(zip(
+        faults["latitude"].tolist(),
+        faults["longitude"].tolist(),
+        risk_values(faults["seismic_risk"]).tolist(),
+        faults["annual_slip_rate"].tolist(),
+    ))
+    return _cached_risk_points(fault_key, seed, points_per_risk_slip, base_points)
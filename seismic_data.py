@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Built-in fault system and historical earthquake data for the Southern Italy explorer.
+
+Kept free of Streamlit so the app, the batch renderer and the benchmarks share
+one copy of the records.
+"""
+import numpy as np
+import pandas as pd
+
+# ===== Enhanced Fault System Data =====
+# --- NOTE: You had a stray integer '1' at the end of your fault_data list. I've removed it. ---
+fault_data = [
+    {
+        "name": "Apennine Fault System",
+        "location": [41.2, 13.5],
+        "fault_types": "Normal, Thrust, Strike-Slip",
+        "tectonic_drivers": "Extension (back-arc), Historical Compression",
+        "examples": "Irpinia Faults, Paganica Fault",
+        "last_major_earthquake": "L'Aquila (2009), 6.3 Mw",
+        "seismic_risk": "High",
+        "description": "Runs along the spine of Italy, responsible for many devastating earthquakes. Characterized by complex normal faulting due to regional extension.",
+        "annual_slip_rate": 1.8,  # mm/year
+        "color": "#E53E3E"  # red
+    },
+    {
+        "name": "Calabrian Arc",
+        "location": [38.5, 16.3],
+        "fault_types": "Normal, Strike-Slip, Thrust, Oblique-Slip",
+        "tectonic_drivers": "Subduction of Ionian slab, Africa-Eurasia collision",
+        "examples": "Rossano Fault",
+        "last_major_earthquake": "Crotone (1832), 6.6 Mw",
+        "seismic_risk": "Very High",
+        "description": "One of the most seismically active regions in the Mediterranean, formed by Ionian plate subduction. Experiences complex deformation.",
+        "annual_slip_rate": 2.3,  # mm/year
+        "color": "#DD6B20"  # orange
+    },
+    {
+        "name": "Messina Strait",
+        "location": [38.2, 15.6],
+        "fault_types": "Normal",
+        "tectonic_drivers": "Subduction Rollback, Crustal Extension",
+        "examples": "Messina-Taormina Fault",
+        "last_major_earthquake": "Messina (1908), 7.1 Mw",
+        "seismic_risk": "Very High",
+        "description": "Produced Italy's devastating 1908 earthquake and tsunami. High hazard zone due to active extensional tectonics.",
+        "annual_slip_rate": 2.5,  # mm/year
+        "color": "#D53F8C"  # pink
+    },
+    {
+        "name": "Gargano Fault System",
+        "location": [41.8, 15.9],
+        "fault_types": "Thrust, Strike-Slip, Transpressional, Minor Normal",
+        "tectonic_drivers": "Intraforeland Transpression, Adriatic Slab Subduction",
+        "examples": "Mattinata Fault",
+        "last_major_earthquake": "Gargano (1646), 6.7 Mw",
+        "seismic_risk": "Moderate to High",
+        "description": "Structural high affected by E-W right-lateral faults accommodating Adria-Apulia microplate movements.",
+        "annual_slip_rate": 1.0,  # mm/year
+        "color": "#3182CE"  # blue
+    },
+    {
+        "name": "Siculo-Calabrian Rift Zone",
+        "location": [38.4, 15.0],
+        "fault_types": "Normal",
+        "tectonic_drivers": "Extension from Ionian Subduction and Back-Arc Opening",
+        "examples": "Scilla Fault, Capo Vaticano Fault",
+        "last_major_earthquake": "Southern Calabria (1783), 7.0 Mw",
+        "seismic_risk": "High",
+        "description": "Extends from NE Sicily to SW Calabria, characterized by normal faults accommodating extension related to Ionian subduction.",
+        "annual_slip_rate": 1.6,  # mm/year
+        "color": "#805AD5"  # purple
+    },
+]
+
+# Columns of the fault DataFrame; the records' [lat, lon] `location` becomes latitude/longitude
+REQUIRED_FAULT_COLUMNS = ['latitude', 'longitude', 'name', 'seismic_risk', 'annual_slip_rate', 'color', 'fault_types', 'tectonic_drivers', 'examples', 'last_major_earthquake', 'description']
+CATEGORICAL_FAULT_COLUMNS = ['seismic_risk', 'color']
+
+
+def fault_frame(records):
+    """
+    DataFrame of fault systems. The [lat, lon] `location` lists are replaced by
+    numeric latitude/longitude columns and repeated labels are categorical.
+    """
+    df = pd.DataFrame(records)
+    if 'location' in df.columns:
+        coordinates = np.array(df.pop('location').tolist(), dtype=np.float64).reshape(-1, 2)
+        df['latitude'], df['longitude'] = coordinates[:, 0], coordinates[:, 1]
+    for col in CATEGORICAL_FAULT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+# ===== Historical Earthquake Data =====
+historical_earthquakes = [
+    {"year": 1693, "location": "Eastern Sicily", "magnitude": 7.4, "lat": 37.1, "lon": 15.0, "deaths": 60000, "description": "Strongest earthquake in Italian history, destroying 45+ towns."},
+    {"year": 1783, "location": "Calabria", "magnitude": 7.0, "lat": 38.3, "lon": 15.9, "deaths": 50000, "description": "Sequence of five strong earthquakes struck Calabria within two months."},
+    {"year": 1857, "location": "Basilicata", "magnitude": 7.0, "lat": 40.4, "lon": 15.9, "deaths": 11000, "description": "Great Neapolitan Earthquake affecting Basilicata and Campania."},
+    {"year": 1908, "location": "Messina Strait", "magnitude": 7.1, "lat": 38.2, "lon": 15.6, "deaths": 123000, "description": "Europe's deadliest quake, caused tsunami, destroyed Messina & Reggio Calabria."},
+    {"year": 1915, "location": "Avezzano", "magnitude": 6.7, "lat": 42.0, "lon": 13.5, "deaths": 30000, "description": "Destroyed Avezzano and damaged surrounding areas in Central Italy."},
+    {"year": 1930, "location": "Irpinia", "magnitude": 6.6, "lat": 41.0, "lon": 15.3, "deaths": 1400, "description": "Affected the southern Apennines region, causing severe damage."},
+    {"year": 1968, "location": "Belice Valley, Sicily", "magnitude": 6.4, "lat": 37.8, "lon": 13.0, "deaths": 300, "description": "Series of earthquakes destroyed several towns in western Sicily."},
+    {"year": 1980, "location": "Irpinia", "magnitude": 6.9, "lat": 40.8, "lon": 15.3, "deaths": 2900, "description": "One of Italy's strongest 20th-century quakes, widespread destruction."},
+    {"year": 2009, "location": "L'Aquila", "magnitude": 6.3, "lat": 42.3, "lon": 13.4, "deaths": 308, "description": "Severely damaged the historic city of L'Aquila and surrounding villages."},
+    {"year": 2016, "location": "Central Italy", "magnitude": 6.2, "lat": 42.7, "lon": 13.2, "deaths": 299, "description": "Sequence devastated towns including Amatrice, Accumoli, Arquata."}
+]
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Probabilistic seismic hazard from fault slip rates.
+
+Every fault system is a seismic source. Its long-term moment rate (rigidity x
+rupture area x slip rate) is released by a truncated Gutenberg-Richter
+magnitude distribution (Youngs & Coppersmith, 1985) that ends at the magnitude
+its rupture area supports (Wells & Coppersmith, 1994). Ground motion follows
+Campbell's (1981) peak-ground-acceleration relation with lognormal scatter.
+For each cell of a ~1 km grid over Southern Italy, the annual rates of exceeding
+a ladder of PGA levels are summed over sources and magnitudes. The PGA with a
+10% chance of exceedance in 50 years (475-year return period) is then read off
+the resulting hazard curve.
+
+A cell's exceedance rates depend on it only through its distance to each
+source. They are therefore tabulated once per source over distance, and the
+grid is evaluated by interpolation in those tables. Blocks of grid rows are
+independent and are spread across a process pool. Grids are stored in the
+hazard cache directory next to the kernel-density rasters, once per fault
+selection.
+
+Fault dimensions come from optional `length_km`/`width_km` fault attributes or
+the mapped trace length. Failing those, the length is inferred from the
+magnitude in `last_major_earthquake`. Sources are finite ruptures centred on the
+fault system's location. This is a screening model, not a site-specific
+assessment.
+"""
+import base64
+import hashlib
+import math
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from fault_association import seismic_moment
+from hazard_raster import HAZARD_CACHE_DIR, HAZARD_GRADIENT, colorize, grid_axes, write_atomically
+from process_pool import pool_map
+from spatial_index import SOUTHERN_ITALY_BOUNDS, haversine_km, radius_bounds
+
+# Source model
+RIGIDITY_PA = 3.0e10
+SEISMOGENIC_THICKNESS_KM = 15.0
+DIP_DEGREES = 60.0
+DEFAULT_LENGTH_KM = 50.0
+MIN_MAGNITUDE = 5.0
+MAGNITUDE_STEP = 0.1
+B_VALUE = 1.0
+# Ground motion: Campbell (1981), ln PGA[g] = a + b M - c ln(R + d exp(e M)), sigma in ln units
+GMPE_COEFFICIENTS = (-4.141, 0.868, 1.09, 0.0606, 0.7)
+GMPE_SIGMA = 0.37
+RUPTURE_DEPTH_KM = 10.0
+PGA_LEVELS_G = np.geomspace(0.005, 2.0, 25)
+# 10% probability of exceedance in 50 years (Poisson): a 475-year return period
+EXCEEDANCE_PROBABILITY = 0.10
+INVESTIGATION_YEARS = 50
+# Grid and evaluation
+HAZARD_RESOLUTION = 0.01 # Degrees per cell (~1 km)
+DISTANCE_SAMPLES = 1024 # Table rows, evenly spaced in sqrt(distance)
+INTEGRATION_DISTANCE_KM = 300.0 # Sources farther from a site than this are ignored, as usual in PSHA
+CHUNK_ROWS = 64 # Grid rows per pool task
+HAZARD_WORKERS = int(os.environ.get("FAULTS_HAZARD_WORKERS", str(os.cpu_count() or 1)))
+RATE_FLOOR = 1e-7 # Annual exceedance rates below this are ignored (the 475-year target is 2.1e-3)
+POOL_MIN_WORK = 5_000_000 # Grid cells x sources below which starting worker processes costs more than it saves
+PGA_SCALE_G = 0.3 # PGA drawn in the top colour of the map overlay
+HAZARD_MODEL_VERSION = 1 # Bump when the model changes so cached grids are recomputed
+
+
+# ===== Sources =====
+def historical_magnitude(text):
+    """Moment magnitude quoted in a `last_major_earthquake` string ("L'Aquila (2009), 6.3 Mw"), or NaN."""
+    match = re.search(r"(\d+(?:\.\d+)?)\s*M", text) if isinstance(text, str) else None
+    return float(match.group(1)) if match else np.nan
+
+
+def trace_length_km(trace):
+    """Length of a fault trace in km (half the perimeter for polygon outlines)."""
+    total = 0.0
+    for part in trace.parts:
+        if len(part) > 1:
+            total += float(haversine_km(part[:-1, 0], part[:-1, 1], part[1:, 0], part[1:, 1]).sum())
+    return total / 2 if trace.kind == "polygon" else total
+
+
+def fault_sources(faults, fault_traces=None):
+    """
+    One row per fault system: location, slip rate (mm/yr), rupture length and
+    width (km) and maximum magnitude from the rupture area.
+    """
+    fault_traces = fault_traces or {}
+    length = faults["length_km"].to_numpy(dtype=np.float64) if "length_km" in faults else np.full(len(faults), np.nan)
+    traced = np.array([
+        trace_length_km(fault_traces[name]) if name in fault_traces else np.nan for name in faults["name"]
+    ], dtype=np.float64)
+    length = np.where(np.isnan(length), traced, length)
+    if "last_major_earthquake" in faults:
+        # Wells & Coppersmith (1994) surface rupture length for all slip types
+        quoted = np.array([historical_magnitude(text) for text in faults["last_major_earthquake"]])
+        length = np.where(np.isnan(length), 10.0 ** ((quoted - 5.08) / 1.16), length)
+    length = np.where(np.isnan(length) | (length <= 0), DEFAULT_LENGTH_KM, length)
+    down_dip = SEISMOGENIC_THICKNESS_KM / math.sin(math.radians(DIP_DEGREES))
+    width = faults["width_km"].to_numpy(dtype=np.float64) if "width_km" in faults else np.full(len(faults), np.nan)
+    width = np.where(np.isnan(width), np.minimum(length, down_dip), width)
+    return pd.DataFrame({
+        "name": faults["name"].astype(str).to_numpy(),
+        "latitude": faults["latitude"].to_numpy(dtype=np.float64),
+        "longitude": faults["longitude"].to_numpy(dtype=np.float64),
+        "slip_rate_mm": faults["annual_slip_rate"].to_numpy(dtype=np.float64),
+        "length_km": length,
+        "width_km": width,
+        # Wells & Coppersmith (1994) rupture area relation, all slip types
+        "max_magnitude": np.maximum(4.07 + 0.98 * np.log10(length * width), MIN_MAGNITUDE + MAGNITUDE_STEP),
+    })
+
+
+def magnitude_rates(sources):
+    """
+    (magnitudes, rates): bin-centre magnitudes from MIN_MAGNITUDE up to the largest
+    maximum magnitude, and each source's annual rate per bin (sources x bins). Each
+    source's truncated exponential distribution releases its moment rate exactly.
+    """
+    top = float(sources["max_magnitude"].max()) if len(sources) else MIN_MAGNITUDE + MAGNITUDE_STEP
+    edges = np.arange(MIN_MAGNITUDE, top + MAGNITUDE_STEP, MAGNITUDE_STEP)
+    magnitudes = (edges[:-1] + edges[1:]) / 2
+    beta = B_VALUE * np.log(10)
+    upper = sources["max_magnitude"].to_numpy()[:, None]
+    # Truncated exponential CDF at the bin edges, clipped at each source's maximum
+    clipped = np.minimum(edges[None, :], upper)
+    cdf = (1 - np.exp(-beta * (clipped - MIN_MAGNITUDE))) / (1 - np.exp(-beta * (upper - MIN_MAGNITUDE)))
+    probabilities = np.diff(cdf, axis=1)
+    mean_moment = probabilities @ seismic_moment(magnitudes)
+    return magnitudes, probabilities * (moment_rate(sources) / mean_moment)[:, None]
+
+
+def moment_rate(sources):
+    """Long-term seismic moment rate of each source in N·m/yr (rigidity x area x slip rate)."""
+    return (
+        RIGIDITY_PA * sources["length_km"].to_numpy() * sources["width_km"].to_numpy() * 1e6
+        * sources["slip_rate_mm"].to_numpy() * 1e-3
+    )
+
+
+# ===== Ground Motion =====
+@lru_cache(maxsize=1)
+def _normal_survival_table():
+    z = np.linspace(-8.0, 8.0, 16001)
+    return z, np.array([0.5 * math.erfc(value / math.sqrt(2)) for value in z])
+
+
+def normal_survival(z):
+    """P(Z > z) for a standard normal variable, vectorised."""
+    table_z, survival = _normal_survival_table()
+    return np.interp(z, table_z, survival)
+
+
+def median_pga(magnitudes, distance_km):
+    """Campbell (1981) median PGA in g; broadcasts magnitudes against rupture distances."""
+    a, b, c, d, e = GMPE_COEFFICIENTS
+    magnitudes = np.asarray(magnitudes, dtype=np.float64)
+    return np.exp(a + b * magnitudes - c * np.log(distance_km + d * np.exp(e * magnitudes)))
+
+
+def _distance_axis():
+    return np.linspace(0.0, np.sqrt(INTEGRATION_DISTANCE_KM), DISTANCE_SAMPLES) ** 2
+
+
+def exceedance_tables(sources, levels=PGA_LEVELS_G):
+    """
+    (tables, shape, scale): the annual rates of exceeding each PGA level with
+    distance from source i (distances x levels, see `_distance_axis`) are
+    `tables[shape[i]] * scale[i]`. Sources with the same rupture length and maximum
+    magnitude share one table, computed for a slip rate of 1 mm/yr.
+    """
+    geometry = sources[["length_km", "max_magnitude"]].to_numpy()
+    _, first, shape = np.unique(geometry, axis=0, return_index=True, return_inverse=True)
+    unit = sources.iloc[first].assign(slip_rate_mm=1.0)
+    magnitudes, rates = magnitude_rates(unit)
+    distance = _distance_axis()
+    half_length = unit["length_km"].to_numpy()[:, None] / 2
+    # Closest approach to a rupture of the source's length, at depth
+    rupture = np.sqrt(np.maximum(distance[None, :] - half_length, 0.0) ** 2 + RUPTURE_DEPTH_KM ** 2)
+    tables = np.empty((len(unit), len(distance), len(levels)))
+    log_levels = np.log(levels)
+    for number in range(len(unit)):
+        log_median = np.log(median_pga(magnitudes[None, :], rupture[number][:, None])) # distances x mags
+        exceed = normal_survival((log_levels[None, None, :] - log_median[:, :, None]) / GMPE_SIGMA)
+        tables[number] = np.einsum("dml,m->dl", exceed, rates[number])
+    return tables, shape.reshape(-1), sources["slip_rate_mm"].to_numpy()
+
+
+def source_reach_km(tables, shape, scale):
+    """Distance beyond which each source exceeds even the lowest PGA level less than RATE_FLOOR per year."""
+    significant = tables[shape, :, 0] * scale[:, None] > RATE_FLOOR
+    last = significant.shape[1] - 1 - np.argmax(significant[:, ::-1], axis=1)
+    return np.where(significant.any(axis=1), _distance_axis()[last], 0.0)
+
+
+def target_rate(probability=EXCEEDANCE_PROBABILITY, years=INVESTIGATION_YEARS):
+    """Annual exceedance rate with `probability` of at least one exceedance in `years` (Poisson)."""
+    return -math.log(1 - probability) / years
+
+
+def pga_at_rate(rates, levels=PGA_LEVELS_G, rate=None):
+    """
+    PGA whose annual exceedance rate is `rate` (default: `target_rate()`), by
+    log-log interpolation along the last axis of the hazard curves `rates`.
+    0 where even the lowest level is exceeded less often; the top level where it is exceeded more often.
+    """
+    rate = target_rate() if rate is None else rate
+    above = (rates >= rate).sum(axis=-1) # Curves decrease with level
+    low = np.clip(above - 1, 0, len(levels) - 2)
+    rate_low = np.take_along_axis(rates, low[..., None], axis=-1)[..., 0]
+    rate_high = np.take_along_axis(rates, low[..., None] + 1, axis=-1)[..., 0]
+    log_levels = np.log(levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.log(rate_low / rate) / np.log(rate_low / rate_high)
+    pga = np.exp(log_levels[low] + np.nan_to_num(np.clip(fraction, 0, 1)) * (log_levels[low + 1] - log_levels[low]))
+    pga = np.where(above == 0, 0.0, pga)
+    return np.where(above == len(levels), levels[-1], pga)
+
+
+# ===== Grid =====
+def _interpolation_tables(tables):
+    # float32 (value, slope) per distance sample, plus a zero row that sites out of reach point at
+    base = np.zeros((tables.shape[0], tables.shape[1] + 1, tables.shape[2]), dtype=np.float32)
+    base[:, :-1] = tables
+    slope = np.zeros_like(base)
+    slope[:, :-2] = np.diff(tables, axis=1)
+    return base, slope
+
+
+def _source_rates(site_lat, site_lon, source_lat, source_lon, base, slope, reach_km=INTEGRATION_DISTANCE_KM):
+    # Hazard curves (sites x levels) of one source, interpolated in its distance table
+    distance = haversine_km(site_lat, site_lon, source_lat, source_lon)
+    step = np.sqrt(INTEGRATION_DISTANCE_KM) / (DISTANCE_SAMPLES - 1)
+    position = np.sqrt(distance) / step
+    index = np.where(distance < reach_km, np.minimum(position.astype(np.int64), DISTANCE_SAMPLES - 2), DISTANCE_SAMPLES)
+    weight = (position - index).astype(np.float32)[..., None]
+    return base[index] + weight * slope[index]
+
+
+def _grid_rows(job):
+    # Pool task: PGA at the target rate for a block of grid rows. Each source only
+    # touches the columns within its reach
+    row_lat, grid_lon, source_lat, source_lon, reach, base, slope, shape, scale = job
+    rates = np.zeros((len(row_lat), len(grid_lon), base.shape[2]), dtype=np.float32)
+    for source in range(len(shape)):
+        south, west, north, east = radius_bounds(source_lat[source], source_lon[source], reach[source])
+        if reach[source] <= 0 or row_lat.min() > north or row_lat.max() < south:
+            continue
+        columns = slice(np.searchsorted(grid_lon, west), np.searchsorted(grid_lon, east, side="right"))
+        rates[:, columns] += np.float32(scale[source]) * _source_rates(
+            row_lat[:, None], grid_lon[None, columns], source_lat[source], source_lon[source],
+            base[shape[source]], slope[shape[source]], reach[source]
+        )
+    return pga_at_rate(rates).astype(np.float32)
+
+
+def hazard_grid(sources, bounds=SOUTHERN_ITALY_BOUNDS, resolution=HAZARD_RESOLUTION, workers=HAZARD_WORKERS):
+    """
+    (rows x cols) PGA in g with a 10% chance of exceedance in 50 years, on the
+    `grid_axes` of the hazard rasters. Row blocks go to a process pool of
+    `workers` when the grid is large enough to repay starting it.
+    """
+    grid_lat, grid_lon = grid_axes(bounds, resolution)
+    if not len(sources):
+        return np.zeros((len(grid_lat), len(grid_lon)), dtype=np.float32)
+    tables, shape, scale = exceedance_tables(sources)
+    model = (
+        sources["latitude"].to_numpy(), sources["longitude"].to_numpy(), source_reach_km(tables, shape, scale),
+    ) + _interpolation_tables(tables) + (shape, scale)
+    jobs = [(grid_lat[start:start + CHUNK_ROWS], grid_lon) + model for start in range(0, len(grid_lat), CHUNK_ROWS)]
+    if workers > 1 and len(grid_lat) * len(grid_lon) * len(sources) >= POOL_MIN_WORK:
+        blocks = pool_map(_grid_rows, jobs, workers)
+    else:
+        blocks = [_grid_rows(job) for job in jobs]
+    return np.vstack(blocks)
+
+
+def hazard_curves(faults, fault_traces=None, levels=PGA_LEVELS_G):
+    """Long-form hazard curves (site, pga_g, annual_rate) at each fault system's location."""
+    sources = fault_sources(faults, fault_traces)
+    if sources.empty:
+        return pd.DataFrame(columns=["site", "pga_g", "annual_rate"])
+    site_lat, site_lon = sources["latitude"].to_numpy(), sources["longitude"].to_numpy()
+    tables, shape, scale = exceedance_tables(sources, levels)
+    base, slope = _interpolation_tables(tables)
+    rates = sum(
+        scale[source] * _source_rates(site_lat, site_lon, site_lat[source], site_lon[source], base[shape[source]],
+                                      slope[shape[source]]).astype(np.float64)
+        for source in range(len(sources))
+    )
+    return pd.DataFrame({
+        "site": np.repeat(sources["name"].to_numpy(), len(levels)),
+        "pga_g": np.tile(levels, len(sources)),
+        "annual_rate": rates.ravel(),
+    })
+
+
+# ===== Cached Grids =====
+def hazard_key(sources, bounds=SOUTHERN_ITALY_BOUNDS, resolution=HAZARD_RESOLUTION):
+    """Stable key for a source model and grid definition."""
+    digest = hashlib.sha1()
+    digest.update(repr((HAZARD_MODEL_VERSION, tuple(bounds), resolution)).encode("utf-8"))
+    for column in ("latitude", "longitude", "slip_rate_mm", "length_km", "width_km"):
+        digest.update(sources[column].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def hazard_map(faults, fault_traces=None, bounds=SOUTHERN_ITALY_BOUNDS, resolution=HAZARD_RESOLUTION,
+               cache_dir=HAZARD_CACHE_DIR, workers=HAZARD_WORKERS):
+    """
+    Memory-mapped PGA grid and PNG bytes for the fault selection, computed on
+    first use and read back from `cache_dir` afterwards.
+    """
+    from folium.utilities import write_png
+
+    sources = fault_sources(faults, fault_traces)
+    key = hazard_key(sources, bounds, resolution)
+    grid_path = os.path.join(cache_dir, f"psha_{key}.npy")
+    png_path = os.path.join(cache_dir, f"psha_{key}.png")
+    if not (os.path.exists(grid_path) and os.path.exists(png_path)):
+        pga = hazard_grid(sources, bounds, resolution, workers)
+        os.makedirs(cache_dir, exist_ok=True)
+        png = write_png(colorize(pga, peak=PGA_SCALE_G))
+        write_atomically(grid_path, lambda out: np.save(out, pga))
+        write_atomically(png_path, lambda out: out.write(png))
+
+    with open(png_path, "rb") as png_file:
+        png_bytes = png_file.read()
+    return np.load(grid_path, mmap_mode="r"), png_bytes
+
+
+def hazard_map_layers(faults, fault_traces=None, name="Seismic Hazard (PGA)", opacity=0.75,
+                      bounds=SOUTHERN_ITALY_BOUNDS):
+    """`ImageOverlay` of the cached PGA grid and the `LinearColormap` legend for it."""
+    from branca.colormap import LinearColormap
+    from folium.raster_layers import ImageOverlay
+
+    _, png_bytes = hazard_map(faults, fault_traces, bounds)
+    south, west, north, east = bounds
+    overlay = ImageOverlay(
+        image="data:image/png;base64," + base64.b64encode(png_bytes).decode("ascii"),
+        bounds=[[south, west], [north, east]],
+        opacity=opacity,
+        pixelated=False,
+        name=name,
+    )
+    legend = LinearColormap(
+        ["#%02x%02x%02x" % color for _, color in HAZARD_GRADIENT],
+        index=[stop * PGA_SCALE_G for stop, _ in HAZARD_GRADIENT], vmin=HAZARD_GRADIENT[0][0] * PGA_SCALE_G,
+        vmax=PGA_SCALE_G, caption=f"PGA (g), {EXCEEDANCE_PROBABILITY:.0%} in {INVESTIGATION_YEARS} years",
+    )
+    return overlay, legend
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Read-only catalog snapshots shared by every session and server worker process.
+
+A file-backed catalog and what is derived from it (grid index, fault
+association, declustering, aggregate cube) are written once per catalog version as ``.npy``
+arrays and memory-mapped by every process that needs them. The operating
+system's page cache then holds one copy however many sessions and worker
+processes use it, and a process only reads the pages its queries touch.
+
+Snapshots live in ``<cache dir>/<source>/<version>/<artefact>/``. Each one is
+written under a temporary name and renamed into place, so readers never see a
+partial snapshot and concurrent builders keep whichever was published first.
+When the source file changes, its version changes: the next lookup builds a new
+snapshot and removes the versions nothing has been published to for
+`SNAPSHOT_RETENTION_SECONDS`, so a process that has not seen the change yet keeps
+its snapshots. Mappings that are already open stay valid until they are
+released, so a reload never disturbs a rerun in progress.
+
+The built-in catalog is small and is simply built in memory.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from declustering import METHOD as DECLUSTERING_METHOD, Declustering, decluster
+from earthquake_catalog import ArrowCatalog, EarthquakeCatalog, ParquetCatalog, catalog_version, load_catalog
+from event_cube import FORMAT as CUBE_FORMAT, EventCube, deadliest_order
+from fault_association import ASSOCIATION_RADIUS_KM, FaultAssociation, associate_events
+from spatial_index import SOUTHERN_ITALY_BOUNDS, GridIndex
+
+SNAPSHOT_DIR = os.environ.get(
+    "FAULTS_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".catalog_cache")
+)
+SNAPSHOT_RETENTION_SECONDS = float(os.environ.get("FAULTS_SNAPSHOT_RETENTION_SECONDS", "3600"))
+MANIFEST = "manifest.json"
+CATALOG_TYPES = {cls.__name__: cls for cls in (EarthquakeCatalog, ArrowCatalog, ParquetCatalog)}
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def source_version(path):
+    """Version of an optional input file or directory ("" when unset), for snapshot keys."""
+    return catalog_version(path) if path else ""
+
+
+# ===== Snapshot Storage =====
+def _write_snapshot(directory, arrays, meta):
+    # Write into a private temporary directory, then publish it with one rename
+    tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    names = list(arrays)
+    for number, name in enumerate(names):
+        np.save(os.path.join(tmp_dir, f"{number}.npy"), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as out:
+        json.dump({"arrays": names, "meta": meta}, out)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Another process published the same snapshot first (or the version was just replaced)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _read_snapshot(directory):
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    arrays = {
+        # Plain read-only ndarray views of the mappings
+        name: np.asarray(np.load(os.path.join(directory, f"{number}.npy"), mmap_mode="r"))
+        for number, name in enumerate(manifest["arrays"])
+    }
+    return arrays, manifest["meta"]
+
+
+def _remove_stale_versions(source_dir, keep, retention=SNAPSHOT_RETENTION_SECONDS):
+    # A version directory's mtime changes whenever an artefact is published into it
+    cutoff = time.time() - retention
+    for entry in os.listdir(source_dir):
+        path = os.path.join(source_dir, entry)
+        try:
+            stale = path != keep and os.path.getmtime(path) < cutoff
+        except OSError:
+            continue # Removed by another process meanwhile
+        if stale:
+            # Where open files cannot be removed (Windows) this is retried on the next build
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def shared_snapshot(path, version, name, build, cache_dir=SNAPSHOT_DIR):
+    """
+    (arrays, meta) of artefact `name` for the catalog file `path` at `version`,
+    memory-mapped read-only. `build()` returns (arrays, meta) and runs only when
+    no process has published the snapshot yet; without a `path` it always runs.
+    """
+    if not path:
+        return build()
+    source_dir = os.path.join(cache_dir, _digest(os.path.abspath(path)))
+    version_dir = os.path.join(source_dir, _digest(version))
+    directory = os.path.join(version_dir, name)
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        arrays, meta = build()
+        os.makedirs(version_dir, exist_ok=True)
+        _write_snapshot(directory, arrays, meta)
+        _remove_stale_versions(source_dir, keep=version_dir)
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            return arrays, meta # Superseded while building; use this copy unshared
+    return _read_snapshot(directory)
+
+
+# ===== Shared Artefacts =====
+def load_shared_catalog(path=None, records=None, cache_dir=SNAPSHOT_DIR):
+    """`load_catalog(path, records)`, backed by a shared snapshot for catalog files."""
+    if not path:
+        return load_catalog(None, records=records)
+    version = catalog_version(path)
+
+    def build():
+        catalog = load_catalog(path)
+        return catalog.to_arrays(), {"type": type(catalog).__name__}
+
+    arrays, meta = shared_snapshot(path, version, "catalog", build, cache_dir)
+    catalog = CATALOG_TYPES[meta["type"]].from_arrays(arrays, path)
+    catalog.version = version
+    return catalog
+
+
+def shared_grid_index(path, catalog, cache_dir=SNAPSHOT_DIR):
+    """`GridIndex` over the catalog's epicentres; the cell layout is shared, the coordinates are the catalog's."""
+    arrays, _ = shared_snapshot(
+        path, catalog.version, "grid_index",
+        lambda: (GridIndex(catalog.lat, catalog.lon).to_arrays(), {}), cache_dir
+    )
+    return GridIndex.from_arrays(catalog.lat, catalog.lon, arrays)
+
+
+def shared_declustering(path, catalog, index, cache_dir=SNAPSHOT_DIR):
+    """`decluster` for the catalog, computed once per catalog version."""
+    arrays, _ = shared_snapshot(
+        path, catalog.version, "declustering_" + _digest(DECLUSTERING_METHOD),
+        lambda: (decluster(catalog, index).to_arrays(), {}), cache_dir
+    )
+    return Declustering.from_arrays(arrays)
+
+
+def association_key(faults, traces_version="", radius_km=ASSOCIATION_RADIUS_KM):
+    """Identifies the fault geometry and radius an association was computed for."""
+    return _digest(
+        faults["name"].tolist(), faults["latitude"].tolist(), faults["longitude"].tolist(),
+        traces_version, float(radius_km)
+    )
+
+
+def shared_fault_association(path, catalog, index, faults, fault_traces=None, traces_version="",
+                             radius_km=ASSOCIATION_RADIUS_KM, cache_dir=SNAPSHOT_DIR):
+    """`associate_events` for the catalog, shared per fault geometry and radius."""
+    def build():
+        association = associate_events(index, faults, fault_traces, radius_km)
+        return {"fault_index": association.fault_index, "distance_km": association.distance_km}, {}
+
+    arrays, _ = shared_snapshot(
+        path, catalog.version, "association_" + association_key(faults, traces_version, radius_km), build, cache_dir
+    )
+    return FaultAssociation(arrays["fault_index"], arrays["distance_km"], faults["name"], radius_km)
+
+
+def shared_event_summary(path, catalog, index, association, faults, traces_version="",
+                         bounds=SOUTHERN_ITALY_BOUNDS, declustering=None, cache_dir=SNAPSHOT_DIR):
+    """
+    {"cube", "deadliest"}: the `EventCube` of the catalog events inside `bounds`
+    by fault system, and their deadliest-first positions (see `deadliest_order`).
+    With a `declustering`, only its mainshocks are counted.
+    """
+    def build():
+        positions = index.query_bbox(*bounds)
+        if declustering is not None:
+            positions = positions[declustering.mainshock[positions]]
+        deaths = catalog.column("deaths")
+        cube = EventCube(len(faults))
+        cube.add(catalog.years[positions], catalog.magnitudes[positions],
+                 association.fault_index[positions], deaths[positions])
+        return dict(cube.to_arrays(), deadliest=deadliest_order(deaths, positions)), {}
+
+    name = "summary_" + _digest(
+        association_key(faults, traces_version, association.radius_km), bounds,
+        DECLUSTERING_METHOD if declustering is not None else None, CUBE_FORMAT
+    )
+    arrays, _ = shared_snapshot(path, catalog.version, name, build, cache_dir)
+    return {"cube": EventCube.from_arrays(len(faults), arrays), "deadliest": arrays["deadliest"]}
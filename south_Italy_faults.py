@@ -1,14 +1,34 @@
 # -*- coding: utf-8 -*-
+import os
 import streamlit as st
-import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 import pandas as pd
 # import json # No longer needed
 import numpy as np
-from branca.colormap import LinearColormap
-import plotly.express as px
-# import plotly.graph_objects as go # No longer needed unless adding more complex plotly charts
-from folium.plugins import HeatMap # Ensure HeatMap is imported
+# Plotly and Folium are imported on first use (see explorer_views and plotly_figure) so the page
+# starts drawing before they load
+from seismic_data import REQUIRED_FAULT_COLUMNS, fault_data, fault_frame, historical_earthquakes
+from spatial_index import SOUTHERN_ITALY_BOUNDS, GridIndex, select_positions
+from explorer_views import (
+    FULL_EXTENT_OPTION, HEATMAP_MODES, MAP_HEIGHT, MAP_MODES, MAP_TILE_OPTIONS, build_fault_type_figure,
+    build_b_value_figure, build_fault_activity_figure, build_hazard_curve_figure, build_magnitude_frequency_figure,
+    build_map, build_slip_figure, build_timeline_figure, build_yearly_activity_figure, focus_view, render_map_html,
+)
+from render_cache import LRUCache, client_map_key, state_keys
+from cache_warmer import CacheWarmer
+from fault_traces import load_fault_traces
+from event_cube import deadliest_positions
+from event_feed import FeedTailer
+from fault_association import ASSOCIATION_RADIUS_KM, associate_events, fault_statistics
+from query_api import API_HOST, API_PORT, start_query_server
+from gutenberg_richter import ALL_EVENTS, CONFIDENCE, fault_gr_statistics, magnitude_histogram, window_gr_statistics
+from seismic_hazard import hazard_curves, target_rate
+from shared_catalog import (
+    load_shared_catalog, shared_declustering, shared_event_summary, shared_fault_association, shared_grid_index,
+    source_version,
+)
+from stage_profiler import StageProfiler, deactivate, stage
+from playback import PLAYBACK_PERIODS, PlaybackBuilder, PlaybackTooLarge, build_playback
 
 # ===== App Configuration =====
 st.set_page_config(
@@ -77,110 +97,166 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ===== Enhanced Fault System Data =====
-# --- NOTE: You had a stray integer '1' at the end of your fault_data list. I've removed it. ---
-fault_data = [
-    {
-        "name": "Apennine Fault System",
-        "location": [41.2, 13.5],
-        "fault_types": "Normal, Thrust, Strike-Slip",
-        "tectonic_drivers": "Extension (back-arc), Historical Compression",
-        "examples": "Irpinia Faults, Paganica Fault",
-        "last_major_earthquake": "L'Aquila (2009), 6.3 Mw",
-        "seismic_risk": "High",
-        "description": "Runs along the spine of Italy, responsible for many devastating earthquakes. Characterized by complex normal faulting due to regional extension.",
-        "annual_slip_rate": 1.8,  # mm/year
-        "color": "#E53E3E"  # red
-    },
-    {
-        "name": "Calabrian Arc",
-        "location": [38.5, 16.3],
-        "fault_types": "Normal, Strike-Slip, Thrust, Oblique-Slip",
-        "tectonic_drivers": "Subduction of Ionian slab, Africa-Eurasia collision",
-        "examples": "Rossano Fault",
-        "last_major_earthquake": "Crotone (1832), 6.6 Mw",
-        "seismic_risk": "Very High",
-        "description": "One of the most seismically active regions in the Mediterranean, formed by Ionian plate subduction. Experiences complex deformation.",
-        "annual_slip_rate": 2.3,  # mm/year
-        "color": "#DD6B20"  # orange
-    },
-    {
-        "name": "Messina Strait",
-        "location": [38.2, 15.6],
-        "fault_types": "Normal",
-        "tectonic_drivers": "Subduction Rollback, Crustal Extension",
-        "examples": "Messina-Taormina Fault",
-        "last_major_earthquake": "Messina (1908), 7.1 Mw",
-        "seismic_risk": "Very High",
-        "description": "Produced Italy's devastating 1908 earthquake and tsunami. High hazard zone due to active extensional tectonics.",
-        "annual_slip_rate": 2.5,  # mm/year
-        "color": "#D53F8C"  # pink
-    },
-    {
-        "name": "Gargano Fault System",
-        "location": [41.8, 15.9],
-        "fault_types": "Thrust, Strike-Slip, Transpressional, Minor Normal",
-        "tectonic_drivers": "Intraforeland Transpression, Adriatic Slab Subduction",
-        "examples": "Mattinata Fault",
-        "last_major_earthquake": "Gargano (1646), 6.7 Mw",
-        "seismic_risk": "Moderate to High",
-        "description": "Structural high affected by E-W right-lateral faults accommodating Adria-Apulia microplate movements.",
-        "annual_slip_rate": 1.0,  # mm/year
-        "color": "#3182CE"  # blue
-    },
-    {
-        "name": "Siculo-Calabrian Rift Zone",
-        "location": [38.4, 15.0],
-        "fault_types": "Normal",
-        "tectonic_drivers": "Extension from Ionian Subduction and Back-Arc Opening",
-        "examples": "Scilla Fault, Capo Vaticano Fault",
-        "last_major_earthquake": "Southern Calabria (1783), 7.0 Mw",
-        "seismic_risk": "High",
-        "description": "Extends from NE Sicily to SW Calabria, characterized by normal faults accommodating extension related to Ionian subduction.",
-        "annual_slip_rate": 1.6,  # mm/year
-        "color": "#805AD5"  # purple
-    },
-]
-
-# Convert to pandas DataFrame for easier manipulation
-# --- Check data before creating DataFrame ---
-valid_fault_data = [item for item in fault_data if isinstance(item, dict)]
-if len(valid_fault_data) != len(fault_data):
+@st.cache_resource
+def get_fault_frame():
+    # Validated and converted once per process rather than on every rerun of this script.
+    # Returns the DataFrame, the number of invalid entries skipped and any missing required columns.
+    valid_fault_data = [item for item in fault_data if isinstance(item, dict)]
+    # Latitude/longitude columns are added explicitly for the map and spatial queries
+    frame = fault_frame(valid_fault_data)
+    missing = [col for col in REQUIRED_FAULT_COLUMNS if col not in frame.columns]
+    return frame, len(fault_data) - len(valid_fault_data), missing
+
+df_faults, invalid_fault_entries, missing_cols = get_fault_frame()
+if invalid_fault_entries:
     st.error("Warning: Invalid data detected in fault_data list. Proceeding with valid entries.")
-    fault_data = valid_fault_data # Use only the valid dictionaries
-
-df_faults = pd.DataFrame(fault_data)
 
 # --- Add defensive check for required columns before proceeding ---
-required_cols = ['location', 'name', 'seismic_risk', 'annual_slip_rate', 'color', 'fault_types', 'tectonic_drivers', 'examples', 'last_major_earthquake', 'description']
-missing_cols = [col for col in required_cols if col not in df_faults.columns]
 if missing_cols:
     st.error(f"Error: The fault data is missing required columns: {', '.join(missing_cols)}. Cannot proceed.")
     st.stop() # Stop execution if essential data is missing
 
-# Add latitude/longitude columns explicitly for potential future use
-df_faults['latitude'] = df_faults['location'].apply(lambda x: x[0])
-df_faults['longitude'] = df_faults['location'].apply(lambda x: x[1])
+# Point FAULTS_CATALOG_PATH at a CSV, Parquet or Arrow file to explore a full instrumental catalog.
+# Without it the built-in historical events from seismic_data.py are used.
+# The catalog and everything derived from it are read-only snapshots memory-mapped from
+# FAULTS_SNAPSHOT_DIR (see shared_catalog.py): one copy serves every session and server process.
+# Cached objects are keyed by the file version, so a modified file is picked up on the next rerun.
+CATALOG_PATH = os.environ.get("FAULTS_CATALOG_PATH", "")
+
+@st.cache_resource(show_spinner="Loading earthquake catalog...", max_entries=1)
+def get_earthquake_catalog(path, version):
+    # One instance per process for the current version; reruns and sessions share it
+    return load_shared_catalog(path or None, records=historical_earthquakes)
+
+@st.cache_resource(show_spinner="Indexing earthquake locations...", max_entries=1)
+def get_earthquake_index(path, version):
+    # Grid index over epicentres, built once per catalog version
+    return shared_grid_index(path, get_earthquake_catalog(path, version))
+
+# Point FAULTS_TRACES_PATH at a GeoJSON/shapefile (or a directory of them) with fault traces whose
+# `name` property matches a fault system in fault_data; systems without a trace keep the slip-rate circle.
+TRACES_PATH = os.environ.get("FAULTS_TRACES_PATH", "")
+
+@st.cache_resource(show_spinner="Simplifying fault traces...", max_entries=1)
+def get_fault_traces(path, version):
+    # Level-of-detail geometry is precomputed once per process
+    return load_fault_traces(path) if path else {}
+
+# Point FAULTS_FEED_PATH at a CSV/QuakeML file that another process appends events to. New events
+# are polled every FAULTS_FEED_POLL_SECONDS and only the map and timeline fragments re-run.
+FEED_PATH = os.environ.get("FAULTS_FEED_PATH", "")
+FEED_POLL_SECONDS = float(os.environ.get("FAULTS_FEED_POLL_SECONDS", "5"))
+
+@st.cache_resource
+def get_event_feed(path):
+    # One tailer per process, so every session sees the same ring buffer
+    return FeedTailer(path) if path else None
+
+@st.cache_resource(show_spinner="Associating earthquakes with fault systems...", max_entries=8)
+def get_fault_association(path, version, traces_path, traces_version, radius_km):
+    # Nearest fault system for every catalog event, computed once per catalog version, traces and radius
+    return shared_fault_association(
+        path, get_earthquake_catalog(path, version), get_earthquake_index(path, version), df_faults,
+        get_fault_traces(traces_path, traces_version), traces_version, radius_km
+    )
+
+@st.cache_resource(show_spinner="Declustering earthquake catalog...", max_entries=1)
+def get_declustering(path, version):
+    # Gardner-Knopoff mainshocks, computed once per catalog version and only when first asked for
+    return shared_declustering(path, get_earthquake_catalog(path, version), get_earthquake_index(path, version))
+
+@st.cache_resource(show_spinner="Aggregating earthquake catalog...", max_entries=8)
+def get_event_summary(path, version, traces_path, traces_version, radius_km, declustered=False):
+    # Year x magnitude x fault-system cube of the catalog events in the map extent, plus their
+    # deadliest-first order; live feed events are merged into this process's cube as they arrive
+    return shared_event_summary(
+        path, get_earthquake_catalog(path, version), get_earthquake_index(path, version),
+        get_fault_association(path, version, traces_path, traces_version, radius_km), df_faults, traces_version,
+        declustering=get_declustering(path, version) if declustered else None
+    )
+
+# Set FAULTS_API_PORT to also serve the filtered catalog and fault systems over HTTP (see query_api.py).
+# The first server process to bind the port serves it, from the same shared snapshots as the app.
+@st.cache_resource
+def get_query_server(port):
+    def resources():
+        version = source_version(CATALOG_PATH)
+        return {
+            "catalog": get_earthquake_catalog(CATALOG_PATH, version),
+            "index": get_earthquake_index(CATALOG_PATH, version), "faults": df_faults,
+            "declustering": lambda: get_declustering(CATALOG_PATH, version),
+        }
+
+    try:
+        return start_query_server(resources, API_HOST, port)
+    except OSError: # Port taken, e.g. by another server process
+        return None
+
+# Partial reruns: st.fragment on current Streamlit, st.experimental_fragment on older releases
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+DEFAULT_LAYERS = ["Fault Systems", "Historical Earthquakes"]
+# Initial filter window, clamped to the catalog: events since 1900 of magnitude 6.0 and above
+DEFAULT_START_YEAR = 1900
+DEFAULT_MIN_MAGNITUDE = 6.0
+
+def plotly_figure(figure_json):
+    # Figures are cached as JSON; plotly.io is only imported once the first chart is drawn
+    import plotly.io as pio
+    return pio.from_json(figure_json)
+
+def default_window(bounds, start):
+    # (start, upper bound) clamped into the (lower, upper) bounds
+    return (min(max(start, bounds[0]), bounds[1]), bounds[1])
+
+@st.cache_resource
+def get_render_caches():
+    # Shared by every session in this process; keyed on the normalised sidebar state
+    return {
+        "frames": LRUCache("frames", max_entries=64, max_bytes=512 * 1024 ** 2),
+        "maps": LRUCache("maps", max_entries=64, max_bytes=256 * 1024 ** 2),
+        "figures": LRUCache("figures", max_entries=256, max_bytes=64 * 1024 ** 2),
+        # Artefacts that include live feed events: a new version on every append, so they are
+        # kept apart and never evict the maps, frames and figures of the catalog
+        "live": LRUCache("live", max_entries=8, max_bytes=256 * 1024 ** 2),
+    }
 
+# Point FAULTS_PERF_EXPORT at a file to record per-stage timings of every rerun: a `.prom` path gets
+# cumulative Prometheus text-format metrics, any other path gets one JSON line per stage.
+PERF_EXPORT_PATH = os.environ.get("FAULTS_PERF_EXPORT", "")
 
-# ===== Historical Earthquake Data =====
-historical_earthquakes = [
-    {"year": 1693, "location": "Eastern Sicily", "magnitude": 7.4, "lat": 37.1, "lon": 15.0, "deaths": 60000, "description": "Strongest earthquake in Italian history, destroying 45+ towns."},
-    {"year": 1783, "location": "Calabria", "magnitude": 7.0, "lat": 38.3, "lon": 15.9, "deaths": 50000, "description": "Sequence of five strong earthquakes struck Calabria within two months."},
-    {"year": 1857, "location": "Basilicata", "magnitude": 7.0, "lat": 40.4, "lon": 15.9, "deaths": 11000, "description": "Great Neapolitan Earthquake affecting Basilicata and Campania."},
-    {"year": 1908, "location": "Messina Strait", "magnitude": 7.1, "lat": 38.2, "lon": 15.6, "deaths": 123000, "description": "Europe's deadliest quake, caused tsunami, destroyed Messina & Reggio Calabria."},
-    {"year": 1915, "location": "Avezzano", "magnitude": 6.7, "lat": 42.0, "lon": 13.5, "deaths": 30000, "description": "Destroyed Avezzano and damaged surrounding areas in Central Italy."},
-    {"year": 1930, "location": "Irpinia", "magnitude": 6.6, "lat": 41.0, "lon": 15.3, "deaths": 1400, "description": "Affected the southern Apennines region, causing severe damage."},
-    {"year": 1968, "location": "Belice Valley, Sicily", "magnitude": 6.4, "lat": 37.8, "lon": 13.0, "deaths": 300, "description": "Series of earthquakes destroyed several towns in western Sicily."},
-    {"year": 1980, "location": "Irpinia", "magnitude": 6.9, "lat": 40.8, "lon": 15.3, "deaths": 2900, "description": "One of Italy's strongest 20th-century quakes, widespread destruction."},
-    {"year": 2009, "location": "L'Aquila", "magnitude": 6.3, "lat": 42.3, "lon": 13.4, "deaths": 308, "description": "Severely damaged the historic city of L'Aquila and surrounding villages."},
-    {"year": 2016, "location": "Central Italy", "magnitude": 6.2, "lat": 42.7, "lon": 13.2, "deaths": 299, "description": "Sequence devastated towns including Amatrice, Accumoli, Arquata."}
-]
+@st.cache_resource
+def get_cache_warmer():
+    # Started by the first session of the server process; its threads build the default and the
+    # most requested sidebar states into the render caches (FAULTS_WARM_* set its budget)
+    caches = get_render_caches()
+    return CacheWarmer({name: caches[name] for name in ("frames", "maps", "figures")}).start()
 
-df_earthquakes = pd.DataFrame(historical_earthquakes)
+# Playback frames and maps are built off the script thread; sessions poll for them this often
+PLAYBACK_POLL_SECONDS = 0.5
+
+@st.cache_resource
+def get_playback_builder():
+    # One background builder per server process, shared by every session
+    return PlaybackBuilder().start()
+
+@st.cache_resource
+def get_stage_profiler():
+    # Stage records and totals of every session in this process
+    return StageProfiler()
 
 # ===== Main App Logic =====
 def main():
+    # One stat() per rerun: a modified catalog or trace file gets a new version and is reloaded
+    catalog_file_version = source_version(CATALOG_PATH)
+    traces_version = source_version(TRACES_PATH)
+    earthquake_catalog = get_earthquake_catalog(CATALOG_PATH, catalog_file_version)
+    earthquake_index = get_earthquake_index(CATALOG_PATH, catalog_file_version)
+    fault_traces = get_fault_traces(TRACES_PATH, traces_version)
+    caches = get_render_caches()
+    if API_PORT:
+        get_query_server(int(API_PORT))
+
     # Sidebar
     with st.sidebar:
         st.markdown('<div style="text-align:center; font-size:72px; margin-bottom:15px;">🌋</div>', unsafe_allow_html=True)
@@ -189,7 +265,7 @@ def main():
         display_options = st.multiselect(
             "Layers to Display",
             ["Fault Systems", "Historical Earthquakes", "Seismic Risk Heatmap"],
-            default=["Fault Systems", "Historical Earthquakes"],
+            default=DEFAULT_LAYERS,
             help="Select which data layers to show on the map."
         )
 
@@ -211,33 +287,95 @@ def main():
             help="Show only fault systems within the selected risk categories."
         )
 
-        min_eq_year, max_eq_year = int(df_earthquakes["year"].min()), int(df_earthquakes["year"].max())
+        min_eq_year, max_eq_year = earthquake_catalog.year_bounds()
         year_range = st.slider(
             "Historical Earthquake Period",
-            min_eq_year, max_eq_year, (1900, max_eq_year), # Default range adjusted
+            min_eq_year, max_eq_year, default_window((min_eq_year, max_eq_year), DEFAULT_START_YEAR), # Default range adjusted
             help="Filter earthquakes based on the year they occurred."
         )
 
-        min_mag, max_mag = float(df_earthquakes["magnitude"].min()), float(df_earthquakes["magnitude"].max())
+        min_mag, max_mag = earthquake_catalog.magnitude_bounds()
         magnitude_range = st.slider(
             "Earthquake Magnitude Range (Mw)",
-            min_mag, max_mag, (6.0, max_mag), 0.1, # Default range adjusted
+            min_mag, max_mag, default_window((min_mag, max_mag), DEFAULT_MIN_MAGNITUDE), 0.1, # Default range adjusted
             help="Filter earthquakes based on their magnitude."
         )
 
+        declustered = st.checkbox(
+            "Declustered only",
+            value=False,
+            help="Remove aftershocks and foreshocks (Gardner-Knopoff space-time windows) so each sequence "
+                 "counts once, as its largest event. Live feed events are not declustered."
+        )
+        declustering = get_declustering(CATALOG_PATH, catalog_file_version) if declustered else None
+        if declustering is not None:
+            st.caption(f"{declustering.mainshocks:,} of {len(declustering):,} catalog events are mainshocks.")
+
+        association_radius_km = st.slider(
+            "Fault Association Distance (km)",
+            10, 150, int(ASSOCIATION_RADIUS_KM), 10,
+            help="Earthquakes are attributed to the nearest fault system (location or trace) within this distance."
+        )
+
         st.markdown("---")
         st.markdown("### Map Settings")
         # --- REMOVE Stamen tiles from options ---
-        map_tile_options = ['CartoDB positron', 'OpenStreetMap', 'CartoDB dark_matter']
         selected_tile = st.selectbox(
             "Map Background Tile",
-            options=map_tile_options,
+            options=MAP_TILE_OPTIONS,
             index=0,
              help="Choose the background style for the map."
         )
 
+        heatmap_mode = st.radio(
+            "Heatmap Rendering",
+            options=HEATMAP_MODES,
+            index=0,
+            help="The raster is computed once per fault selection and sent as a single image; "
+                 "the point heatmap sends every sample point to the browser. The probabilistic hazard "
+                 "map shows the peak ground acceleration with a 10% chance of exceedance in 50 years, "
+                 "computed from the slip rates of the selected fault systems."
+        )
+
+        map_mode = st.radio(
+            "Map Filtering",
+            options=MAP_MODES,
+            index=0,
+            help="Client-side filtering sends every earthquake in the focus area to the map once; "
+                 "its own year/magnitude sliders then filter in the browser without reloading the map. "
+                 "Time playback replays the filtered earthquakes and the seismic moment they release "
+                 "frame by frame, with a player in the map's lower-left corner."
+        )
+        playback_frame = st.selectbox(
+            "Playback Frame",
+            options=list(PLAYBACK_PERIODS),
+            index=0,
+            disabled=map_mode != MAP_MODES[2],
+            help="Length of one playback frame."
+        )
+        # Dropped outside playback, where it has no effect, to keep it out of the cache keys
+        playback_period = PLAYBACK_PERIODS[playback_frame] if map_mode == MAP_MODES[2] else None
+
+        focus_options = [FULL_EXTENT_OPTION] + (sorted(df_faults["name"]) if not df_faults.empty else [])
+        focus_area = st.selectbox(
+            "Map Focus Area",
+            options=focus_options,
+            index=0,
+            help="Only earthquakes inside the focus area are loaded into the map and analysis."
+        )
+        focus_radius_km = st.slider(
+            "Radius around Fault System (km)",
+            25, 300, 100, 25,
+            disabled=focus_area == FULL_EXTENT_OPTION,
+            help="Select earthquakes within this distance of the focused fault system."
+        )
 
         st.markdown("---")
+        show_performance = st.checkbox(
+            "Show performance panel",
+            value=False,
+            help="Time each stage of the rerun (filtering, map layers, serialisation, charts)."
+        )
         st.info("Explore the map and analysis tabs. Hover over map elements for details.")
 
 
@@ -258,212 +396,293 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+    # Stage timings are only recorded when someone looks at them or exports them
+    profiler = get_stage_profiler()
+    perf_run = profiler.start_run() if show_performance or PERF_EXPORT_PATH else None
+    if perf_run is None:
+        deactivate()
+
+    # Focus on a single fault system: radius query around its location (the radius is dropped
+    # for the full extent, where it has no effect, to keep it out of the cache keys)
+    focus_circle, map_center, map_zoom, focus_radius_km = focus_view(df_faults, focus_area, focus_radius_km)
+
+    # Normalised sidebar state shared by every cache key below
+    sidebar_state = dict(
+        display_options=display_options, filter_risk=filter_risk, year_range=year_range,
+        magnitude_range=magnitude_range, selected_tile=selected_tile, heatmap_mode=heatmap_mode,
+        focus_area=focus_area, focus_radius_km=focus_radius_km, map_mode=map_mode, declustered=declustered,
+        playback_period=playback_period
+    )
+    state_key, risk_key, quake_key = state_keys(sidebar_state, earthquake_catalog.version)
+
+    # Background warming: the untouched sidebar plus whatever sessions ask for most often
+    event_feed = get_event_feed(FEED_PATH)
+    cache_warmer = get_cache_warmer()
+    cache_warmer.configure(
+        {"catalog": earthquake_catalog, "index": earthquake_index, "faults": df_faults,
+         "traces": fault_traces, "feed": event_feed,
+         "declustering": lambda: get_declustering(CATALOG_PATH, catalog_file_version)},
+        [dict(
+            display_options=DEFAULT_LAYERS, filter_risk=risk_options,
+            year_range=default_window((min_eq_year, max_eq_year), DEFAULT_START_YEAR),
+            magnitude_range=default_window((min_mag, max_mag), DEFAULT_MIN_MAGNITUDE),
+            selected_tile=MAP_TILE_OPTIONS[0], heatmap_mode=HEATMAP_MODES[0],
+            focus_area=FULL_EXTENT_OPTION, focus_radius_km=None, map_mode=MAP_MODES[0], declustered=False,
+            playback_period=None
+        )]
+    )
+    cache_warmer.record(sidebar_state)
+
     # Apply filters
     # --- Add check if df_faults is not empty before filtering ---
-    if not df_faults.empty:
-        filtered_faults = df_faults[df_faults["seismic_risk"].isin(filter_risk)]
-    else:
-        filtered_faults = pd.DataFrame() # Create empty DataFrame if no fault data
-
-    filtered_quakes = df_earthquakes[
-        (df_earthquakes["year"] >= year_range[0]) &
-        (df_earthquakes["year"] <= year_range[1]) &
-        (df_earthquakes["magnitude"] >= magnitude_range[0]) &
-        (df_earthquakes["magnitude"] <= magnitude_range[1])
-    ].copy() # Use .copy() to avoid SettingWithCopyWarning if modifying later
-
-    # Create and display the map and analysis side-by-side
-    col1, col2 = st.columns([3, 2]) # Adjust column ratio if needed
-
-    with col1:
-        st.markdown('<h2 class="subheader">Interactive Map</h2>', unsafe_allow_html=True)
+    def filter_faults():
+        if not df_faults.empty:
+            return df_faults[df_faults["seismic_risk"].isin(filter_risk)]
+        return pd.DataFrame() # Create empty DataFrame if no fault data
 
-        # Initialize the Folium map
-        map_center = [40.0, 15.5] # Slightly adjusted center
-        map_zoom = 6
+    mainshock_mask = declustering.mainshock if declustering is not None else None
 
-        m = folium.Map(
-            location=map_center,
-            zoom_start=map_zoom,
-            tiles=None, # Start with no tiles, add them below
-            control_scale=True
+    def catalog_positions(years=year_range, magnitudes=magnitude_range):
+        # Year/magnitude ranges are resolved by binary search on the sorted catalog and the
+        # extent by the grid index
+        return select_positions(
+            earthquake_catalog, earthquake_index, years, magnitudes,
+            bbox=SOUTHERN_ITALY_BOUNDS, circle=focus_circle, mask=mainshock_mask
         )
 
-        # Add base tile layers first using the selected_tile from the sidebar as the default visible one
-        # The name parameter is crucial for the LayerControl
-        # --- REMOVE Stamen tiles from dictionary ---
-        tiles = {
-            'CartoDB positron': folium.TileLayer(
-                'CartoDB positron',
-                attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors © <a href="https://carto.com/attributions">CARTO</a>',
-                name='CartoDB Positron'
-            ),
-            'OpenStreetMap': folium.TileLayer(
-                'OpenStreetMap',
-                attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
-                name='OpenStreetMap'
-            ),
-            'CartoDB dark_matter': folium.TileLayer(
-                'CartoDB dark_matter',
-                attr='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors © <a href="https://carto.com/attributions">CARTO</a>',
-                name='CartoDB Dark Matter'
+    def filter_quakes(years=year_range, magnitudes=magnitude_range):
+        # Only the matching rows are materialised
+        return earthquake_catalog.take(catalog_positions(years, magnitudes))
+
+    with stage("filter.faults"):
+        filtered_faults = caches["frames"].get_or_compute(("faults", risk_key), filter_faults)
+    with stage("filter.earthquakes"):
+        filtered_quakes = caches["frames"].get_or_compute(("quakes",) + quake_key, filter_quakes)
+
+    # Client-side filtering: every year and magnitude inside the extent/focus area goes to the map
+    client_side = map_mode == MAP_MODES[1]
+    catalog_quakes = None
+    catalog_key = (
+        earthquake_catalog.version, (int(min_eq_year), int(max_eq_year)), (float(min_mag), float(max_mag)),
+        focus_area, focus_radius_km, declustered
+    )
+    if client_side:
+        with stage("filter.catalog"):
+            catalog_quakes = caches["frames"].get_or_compute(
+                ("quakes",) + catalog_key,
+                lambda: filter_quakes((min_eq_year, max_eq_year), (min_mag, max_mag))
             )
-        }
 
-        # Add the selected tile layer first to make it the default visible layer
-        if selected_tile in tiles:
-            tiles[selected_tile].add_to(m)
-        else: # Fallback if selected_tile somehow becomes invalid
-             tiles['CartoDB positron'].add_to(m)
-
-        # Add the other tile layers for selection in LayerControl
-        for tile_name, tile_layer in tiles.items():
-            if tile_name != selected_tile:
-                tile_layer.add_to(m)
-
-
-        # Add Fault Systems Layer
-        if "Fault Systems" in display_options and not filtered_faults.empty:
-            fault_group = folium.FeatureGroup(name="Fault Systems", show=True).add_to(m)
-            for _, fault in filtered_faults.iterrows():
-                # --- CHANGE Fault Icon ---
-                icon = folium.Icon(
-                    color="white", # Background of icon circle
-                    icon_color=fault["color"], # Color of the icon itself
-                    icon="exclamation-triangle", # General hazard icon
-                    # Other options: 'mountain', 'wave-square', 'bolt', 'atom'
-                    prefix="fa" # Font Awesome prefix
+    # Live feed: fragments below re-run on their own timer and only redraw the map and timeline
+    live_refresh = FEED_POLL_SECONDS if event_feed is not None else None
+    charts_cache = caches["live"] if event_feed is not None else caches["figures"]
+
+    # Sliders pushed to the catalog maximum also admit newer/larger live events
+    open_years = (year_range[0], np.inf if year_range[1] >= max_eq_year else year_range[1])
+    open_magnitudes = (magnitude_range[0], np.inf if magnitude_range[1] >= max_mag else magnitude_range[1])
+
+    def current_quakes():
+        # Catalog selection plus the buffered feed events that pass the same filters
+        if event_feed is None:
+            return filtered_quakes, None
+        with stage("feed.merge"):
+            event_feed.poll()
+            feed_version = event_feed.buffer.version
+            return caches["live"].get_or_compute(("feed", feed_version) + quake_key, lambda: pd.concat(
+                [filtered_quakes, event_feed.events(open_years, open_magnitudes, SOUTHERN_ITALY_BOUNDS, focus_circle)],
+                ignore_index=True
+            )), feed_version
+
+    def event_summary():
+        # Aggregate cube for the whole extent, brought up to date with the live feed
+        summary = get_event_summary(
+            CATALOG_PATH, catalog_file_version, TRACES_PATH, traces_version, float(association_radius_km), declustered
+        )
+        if event_feed is not None:
+            def new_feed_events(synced):
+                events, total = event_feed.buffer.since(synced)
+                south, west, north, east = SOUTHERN_ITALY_BOUNDS
+                events = events[events["lat"].between(south, north) & events["lon"].between(west, east)]
+                regions = np.empty(0, dtype=np.int64)
+                if not events.empty:
+                    regions = associate_events(
+                        GridIndex(events["lat"], events["lon"]), df_faults, fault_traces,
+                        float(association_radius_km)
+                    ).fault_index
+                return (events["year"], events["magnitude"], regions, events["deaths"]), total
+
+            summary["cube"].sync(new_feed_events)
+        return summary
+
+    @fragment(run_every=live_refresh)
+    def show_map():
+        if perf_run is not None:
+            profiler.activate(perf_run) # Fragment reruns execute in their own context
+        # The cached map holds the catalog events only; feed events are added to its HTML below,
+        # so appends to the feed do not re-render it
+        quakes, map_key = filtered_quakes, state_key
+        client_filters = None
+        if client_side:
+            # The year/magnitude sliders do not change this map; the browser filters it
+            quakes, map_key = catalog_quakes, client_map_key(sidebar_state, earthquake_catalog.version)
+            if not quakes.empty:
+                quake_years = (int(quakes["year"].min()), int(quakes["year"].max()))
+                quake_magnitudes = (float(quakes["magnitude"].min()), float(quakes["magnitude"].max()))
+                client_filters = dict(
+                    year_bounds=quake_years, magnitude_bounds=quake_magnitudes,
+                    year_range=default_window(quake_years, DEFAULT_START_YEAR),
+                    magnitude_range=default_window(quake_magnitudes, DEFAULT_MIN_MAGNITUDE)
                 )
-
-                popup_html = f"""
-                <div style="width: 300px; font-family: Arial, sans-serif; font-size: 13px;">
-                    <h4 style="color: {fault['color']}; margin-bottom: 5px;">{fault['name']}</h4>
-                    <hr style="margin-top: 0; margin-bottom: 10px;">
-                    <p><b>Description:</b> {fault['description']}</p>
-                    <p><b>Types:</b> {fault['fault_types']}</p>
-                    <p><b>Drivers:</b> {fault['tectonic_drivers']}</p>
-                    <p><b>Examples:</b> {fault['examples']}</p>
-                    <p><b>Last Major EQ:</b> {fault['last_major_earthquake']}</p>
-                    <p><b>Seismic Risk:</b> <span style="font-weight: bold; color: {fault['color']};">{fault['seismic_risk']}</span></p>
-                    <p><b>Slip Rate:</b> {fault['annual_slip_rate']:.1f} mm/year</p>
-                </div>
-                """
-
-                folium.Marker(
-                    location=fault["location"],
-                    popup=folium.Popup(popup_html, max_width=350),
-                    tooltip=f"<b>{fault['name']}</b><br>Risk: {fault['seismic_risk']}",
-                    icon=icon
-                ).add_to(fault_group)
-
-                # Circle representing slip rate influence (scaled visually)
-                folium.Circle(
-                    location=fault["location"],
-                    radius=max(5000, fault["annual_slip_rate"] * 7000), # Ensure minimum size, scale factor adjusted
-                    color=fault["color"],
-                    fill=True,
-                    fill_opacity=0.15,
-                    weight=1,
-                    tooltip=f"{fault['name']} (Slip: {fault['annual_slip_rate']} mm/yr)"
-                ).add_to(fault_group)
-
-        # Add Historical Earthquakes Layer
-        if "Historical Earthquakes" in display_options and not filtered_quakes.empty:
-            earthquake_group = folium.FeatureGroup(name="Historical Earthquakes", show=True).add_to(m)
-
-            # Define colormap for magnitude
-            min_mag_filtered = filtered_quakes['magnitude'].min()
-            max_mag_filtered = filtered_quakes['magnitude'].max()
-            # Handle case where min and max are the same
-            if min_mag_filtered == max_mag_filtered:
-                 colormap = LinearColormap(['yellow', 'red'], vmin=min_mag_filtered - 0.1, vmax=max_mag_filtered + 0.1)
-            else:
-                colormap = LinearColormap(
-                    ['#FFFF00', '#FFA500', '#FF0000'], # Yellow -> Orange -> Red
-                    vmin=min_mag_filtered,
-                    vmax=max_mag_filtered
+        # Map HTML is rendered once per sidebar state and reused by every session
+        with stage("map") as timed:
+            map_html = caches["maps"].get_or_compute(map_key, lambda: render_map_html(build_map(
+                filtered_faults, quakes, display_options, selected_tile,
+                heatmap_mode=heatmap_mode, map_center=map_center, map_zoom=map_zoom,
+                focus_circle=focus_circle, focus_label=focus_area, fault_traces=fault_traces,
+                client_filters=client_filters
+            )))
+            timed.output_bytes = len(map_html)
+        if event_feed is not None:
+            from map_layers import with_live_feed # Loads Folium, like build_map
+
+            with stage("feed.overlay"):
+                event_feed.poll()
+                feed_years, feed_magnitudes = (None, None) if client_side else (open_years, open_magnitudes)
+                map_html = with_live_feed(map_html, event_feed.events(
+                    feed_years, feed_magnitudes, SOUTHERN_ITALY_BOUNDS, focus_circle
+                ))
+
+        # Display the map (same embedding as folium_static, using the container width)
+        with stage("map.embed"):
+            components.html(map_html, height=MAP_HEIGHT + 10)
+        if client_side:
+            st.caption("Earthquakes on the map are filtered with the sliders in its lower-left corner; "
+                       "the sidebar year and magnitude ranges apply to the charts"
+                       + (" and live feed events are shown unfiltered on their own layer." if event_feed is not None else "."))
+
+    # While the playback map is being built, its fragment polls the builder on a timer
+    playback_ready = (
+        playback_period is None or state_key in caches["maps"] or get_playback_builder().oversized(state_key)
+    )
+
+    @fragment(run_every=None if playback_ready else PLAYBACK_POLL_SECONDS)
+    def show_playback_map():
+        if perf_run is not None:
+            profiler.activate(perf_run)
+
+        def playback_map(progress):
+            # Runs on the builder thread: frames are cached per filter set, the map per sidebar state
+            frames = caches["frames"].get_or_compute(
+                ("playback", playback_period) + quake_key,
+                lambda: build_playback(earthquake_catalog, catalog_positions(), playback_period, progress)
+            )
+            return render_map_html(build_map(
+                filtered_faults, filtered_quakes, display_options, selected_tile,
+                heatmap_mode=heatmap_mode, map_center=map_center, map_zoom=map_zoom,
+                focus_circle=focus_circle, focus_label=focus_area, fault_traces=fault_traces, playback=frames
+            ))
+
+        too_large = None
+        with stage("map.playback"):
+            try:
+                map_html = get_playback_builder().request(caches["maps"], state_key, playback_map)
+            except PlaybackTooLarge as exc:
+                map_html, too_large = None, exc
+        if too_large is not None:
+            st.error(f"{too_large}. Narrow the year or magnitude range to play it back.")
+            if not playback_ready:
+                st.rerun() # One full rerun stops the polling
+            return
+        if map_html is None:
+            built = get_playback_builder().progress(state_key) or 0.0
+            st.progress(built, text="Building playback frames..." if built < 1.0 else "Rendering playback map...")
+            if playback_ready: # Evicted since this run started: poll again
+                st.rerun()
+            return
+        if not playback_ready:
+            st.rerun() # Built: one full rerun embeds it and stops the polling
+        with stage("map.embed"):
+            components.html(map_html, height=MAP_HEIGHT + 10)
+        if "Historical Earthquakes" in display_options:
+            st.caption(
+                f"Each {playback_frame.lower()} draws its earthquakes in colour over the earlier ones in grey, and "
+                "the released seismic moment accumulates per 0.1° cell. Live feed events are not replayed."
+            )
+        else:
+            st.caption("Turn on the Historical Earthquakes layer to replay them.")
+
+    @fragment(run_every=live_refresh)
+    def show_earthquake_history():
+        if perf_run is not None:
+            profiler.activate(perf_run)
+        st.markdown("#### Historical Earthquake Patterns")
+        quakes, feed_version = current_quakes()
+        if not quakes.empty:
+            # --- Plot 1: Timeline ---
+            with stage("chart.timeline") as timed:
+                timeline_json = charts_cache.get_or_compute(
+                    ("timeline", feed_version) + quake_key,
+                    lambda: build_timeline_figure(quakes, year_range, magnitude_range).to_json()
                 )
+                timed.output_bytes = len(timeline_json)
+                st.plotly_chart(plotly_figure(timeline_json), use_container_width=True)
+
+            # --- Summaries: per-year activity and deadliest events ---
+            with stage("summary.aggregate"):
+                if focus_circle is None:
+                    # Whole extent: O(bins) slices of the pre-aggregated cube and a short scan of
+                    # the deadliest-first order instead of passes over every filtered event
+                    summary = event_summary()
+                    cube = summary["cube"]
+                    summary_key = ("cube", cube.version) + quake_key
+                    total_events = cube.totals(open_years, open_magnitudes)["events"]
+                    yearly = cube.by_year(open_years, open_magnitudes)
+                    deadliest = earthquake_catalog.take(deadliest_positions(
+                        earthquake_catalog, summary["deadliest"], year_range, magnitude_range
+                    ))
+                    if event_feed is not None:
+                        deadliest = pd.concat([deadliest, event_feed.events(
+                            open_years, open_magnitudes, SOUTHERN_ITALY_BOUNDS
+                        )], ignore_index=True)
+                    deadliest = deadliest.nlargest(5, 'deaths')
+                else:
+                    summary_key = ("focus", feed_version) + quake_key
+                    total_events = len(quakes)
+                    yearly = quakes.groupby("year").agg(
+                        events=("magnitude", "size"), deaths=("deaths", "sum"), max_magnitude=("magnitude", "max")
+                    ).reset_index()
+                    deadliest = quakes.nlargest(5, 'deaths')
+
+            with stage("chart.yearly") as timed:
+                yearly_json = charts_cache.get_or_compute(
+                    ("yearly",) + summary_key, lambda: build_yearly_activity_figure(yearly).to_json()
+                )
+                timed.output_bytes = len(yearly_json)
+                st.plotly_chart(plotly_figure(yearly_json), use_container_width=True)
+
+            st.markdown('##### Deadliest Events in Filtered Range')
+            for _, quake in deadliest.iterrows():
+                st.markdown(f"- **{quake['year']} {quake['location']} (M{quake['magnitude']})**: {quake['deaths']:,} deaths")
+            if total_events > 5:
+                st.caption(f"Showing top {min(len(deadliest), 5)} deadliest out of {total_events} filtered events.")
+            elif total_events == 0:
+                 st.caption("No events in the filtered range.")
+            else:
+                 st.caption(f"Showing all {total_events} filtered events.")
 
+        else:
+            st.info("No historical earthquakes match your filter criteria.")
 
-            for _, quake in filtered_quakes.iterrows():
-                # Ensure radius calculation handles potential edge case where min=max
-                if min_mag_filtered == max_mag_filtered:
-                    radius = 5 # Fixed radius if all magnitudes are the same
-                else:
-                    radius = 3 + (quake['magnitude'] - min_mag_filtered) * 2 # Scale radius based on magnitude range
-
-                popup_html = f"""
-                <div style="width: 250px; font-family: Arial, sans-serif; font-size: 13px;">
-                    <h4 style="margin-bottom: 5px;">{quake['year']} {quake['location']}</h4>
-                    <hr style="margin-top: 0; margin-bottom: 10px;">
-                    <p><b>Magnitude (Mw):</b> {quake['magnitude']}</p>
-                    <p><b>Deaths:</b> {quake['deaths']:,}</p>
-                    <p><i>{quake['description']}</i></p>
-                </div>
-                """
-
-                folium.CircleMarker(
-                    location=[quake['lat'], quake['lon']],
-                    radius=radius,
-                    color=colormap(quake['magnitude']),
-                    fill=True,
-                    fill_color=colormap(quake['magnitude']),
-                    fill_opacity=0.6,
-                    weight=1,
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{quake['year']} {quake['location']} (M{quake['magnitude']})"
-                ).add_to(earthquake_group)
-            # Add colormap legend to the map (optional, can clutter)
-            # colormap.caption = 'Earthquake Magnitude (Mw)'
-            # m.add_child(colormap)
-
-        # Add Seismic Risk Heatmap Layer
-        if "Seismic Risk Heatmap" in display_options and not filtered_faults.empty:
-            # Make heatmap initially not visible if other layers are present
-            show_heatmap = not ("Fault Systems" in display_options or "Historical Earthquakes" in display_options)
-            heatmap_group = folium.FeatureGroup(name="Seismic Risk Heatmap", show=show_heatmap).add_to(m)
-            risk_points = []
-            risk_map = {"Low": 1, "Moderate": 2, "Moderate to High": 3, "High": 4, "Very High": 5}
-
-            for _, fault in filtered_faults.iterrows():
-                risk_value = risk_map.get(fault["seismic_risk"], 1)
-                lat, lon = fault["location"]
-                # Generate points weighted by risk and slip rate
-                point_count = int(risk_value * fault["annual_slip_rate"] * 15) + 10 # Base + scaled points
-                spread_factor = 0.15 + (risk_value * 0.05) # Wider spread for higher risk
-
-                for _ in range(point_count):
-                    random_lat = lat + np.random.normal(0, spread_factor)
-                    random_lon = lon + np.random.normal(0, spread_factor * 1.5) # Wider E-W spread
-                    # Weight can be added as the third element if needed by HeatMapWithTime or similar
-                    risk_points.append([random_lat, random_lon])
-
-            if risk_points:
-                # Convert float keys in gradient to strings
-                gradient_str_keys = {
-                    '0.1': 'blue',
-                    '0.3': 'lime',
-                    '0.5': 'yellow',
-                    '0.7': 'orange',
-                    '1.0': 'red' # Use '1.0' or '1' as string key
-                }
-
-                HeatMap(
-                    risk_points,
-                    name="Seismic Risk Heatmap", # Name already set in FeatureGroup
-                    radius=18,
-                    blur=15,
-                    gradient=gradient_str_keys, # Use the dictionary with string keys
-                    min_opacity=0.2,
-                    max_val=5.0 # Corresponds to max risk value
-                ).add_to(heatmap_group)
-
-        # Add Layer Control to toggle layers (base maps and feature groups)
-        folium.LayerControl(collapsed=False).add_to(m)
-
-        # Display the map
-        map_height = 650
-        folium_static(m, width=None, height=map_height) # Use container width
+    # Create and display the map and analysis side-by-side
+    col1, col2 = st.columns([3, 2]) # Adjust column ratio if needed
+
+    with col1:
+        st.markdown('<h2 class="subheader">Interactive Map</h2>', unsafe_allow_html=True)
+
+        if playback_period is not None:
+            show_playback_map()
+        else:
+            show_map()
 
     # Dashboard and Analysis
     with col2:
@@ -477,101 +696,218 @@ def main():
             st.markdown("#### Fault Characteristics")
             if not filtered_faults.empty:
                 # --- Plot 1: Slip Rate ---
-                slip_fig = px.bar(
-                    filtered_faults.sort_values('annual_slip_rate', ascending=False),
-                    x='name',
-                    y='annual_slip_rate',
-                    color='seismic_risk',
-                    labels={'annual_slip_rate': 'Avg. Slip Rate (mm/yr)', 'name': 'Fault System Name'},
-                    title='Fault System Activity (Slip Rate)',
-                    color_discrete_map={
-                        'Low': '#2ECC71', # Emerald
-                        'Moderate': '#3498DB', # Peter River
-                        'Moderate to High': '#9B59B6', # Amethyst
-                        'High': '#F39C12', # Orange
-                        'Very High': '#E74C3C' # Alizarin
-                    },
-                    height=350
-                )
-                slip_fig.update_layout(
-                    xaxis_title=None,
-                    yaxis_title="Slip Rate (mm/yr)",
-                    xaxis_tickangle=-45,
-                    margin=dict(t=30, b=0, l=0, r=0),
-                    legend_title_text='Risk'
-                )
-                st.plotly_chart(slip_fig, use_container_width=True)
+                with stage("chart.slip") as timed:
+                    slip_json = caches["figures"].get_or_compute(
+                        ("slip",) + risk_key, lambda: build_slip_figure(filtered_faults).to_json()
+                    )
+                    timed.output_bytes = len(slip_json)
+                    st.plotly_chart(plotly_figure(slip_json), use_container_width=True)
 
                 # --- Plot 2: Fault Types ---
-                all_fault_types = []
-                for types in filtered_faults['fault_types']:
-                    # Handle potential None or non-string types defensively
-                    if isinstance(types, str):
-                        all_fault_types.extend([t.strip() for t in types.split(',') if t.strip()]) # Ensure no empty strings
-                fault_type_counts = pd.Series(all_fault_types).value_counts()
-
-                if not fault_type_counts.empty:
-                    type_fig = px.pie(
-                        names=fault_type_counts.index,
-                        values=fault_type_counts.values,
-                        title='Distribution of Reported Fault Types',
-                        hole=0.4,
-                        height=300
-                    )
-                    type_fig.update_traces(textposition='inside', textinfo='percent+label')
-                    type_fig.update_layout(margin=dict(t=50, b=0, l=0, r=0), showlegend=False)
-                    st.plotly_chart(type_fig, use_container_width=True)
-                else:
+                def fault_type_json():
+                    type_fig = build_fault_type_figure(filtered_faults)
+                    return type_fig.to_json() if type_fig is not None else None
+
+                with stage("chart.types") as timed:
+                    type_json = caches["figures"].get_or_compute(("types",) + risk_key, fault_type_json)
+                    if type_json is not None:
+                        timed.output_bytes = len(type_json)
+                        st.plotly_chart(plotly_figure(type_json), use_container_width=True)
+                if type_json is None:
                      st.info("No fault type data available for the selected systems.")
 
+                # --- Per-fault activity: events attributed to their nearest fault system ---
+                st.markdown("#### Fault Activity")
+                with stage("analysis.association"):
+                    association = get_fault_association(
+                        CATALOG_PATH, catalog_file_version, TRACES_PATH, traces_version, float(association_radius_km)
+                    )
+
+                def fault_activity():
+                    quake_positions = catalog_positions()
+                    return fault_statistics(
+                        association, earthquake_catalog.magnitudes[quake_positions], quake_positions,
+                        filtered_faults["name"]
+                    )
+
+                def fault_activity_json():
+                    activity_fig = build_fault_activity_figure(fault_stats)
+                    return activity_fig.to_json() if activity_fig is not None else None
+
+                with stage("chart.activity") as timed:
+                    activity_key = ("activity", association_radius_km) + risk_key + quake_key
+                    fault_stats = caches["frames"].get_or_compute(activity_key, fault_activity)
+                    activity_json = caches["figures"].get_or_compute(activity_key, fault_activity_json)
+                    if activity_json is not None:
+                        timed.output_bytes = len(activity_json)
+                        st.plotly_chart(plotly_figure(activity_json), use_container_width=True)
+                st.dataframe(
+                    fault_stats.rename(columns={
+                        "name": "Fault System", "events": "Events", "max_magnitude": "Max Mw",
+                        "moment_release_nm": "Moment Release (N·m)", "equivalent_mw": "Equivalent Mw"
+                    }),
+                    hide_index=True,
+                    column_config={
+                        "Max Mw": st.column_config.NumberColumn(format="%.1f"),
+                        "Moment Release (N·m)": st.column_config.NumberColumn(format="%.2e"),
+                        "Equivalent Mw": st.column_config.NumberColumn(format="%.2f"),
+                    }
+                )
+                st.caption(f"Catalog {'mainshocks' if declustered else 'events'} within {association_radius_km} km "
+                           "of a fault system, for the selected period, magnitudes and focus area.")
+
+                # --- Probabilistic hazard at each fault system's location ---
+                st.markdown("#### Seismic Hazard")
+
+                def hazard_curve_json():
+                    curves = hazard_curves(filtered_faults, fault_traces)
+                    return build_hazard_curve_figure(curves, target_rate()).to_json()
+
+                with stage("chart.hazard") as timed:
+                    hazard_json = caches["figures"].get_or_compute(
+                        ("hazard", traces_version) + risk_key, hazard_curve_json
+                    )
+                    timed.output_bytes = len(hazard_json)
+                    st.plotly_chart(plotly_figure(hazard_json), use_container_width=True)
+                st.caption("Annual rate of exceeding each peak ground acceleration, from the fault systems' slip "
+                           "rates (moment-balanced Gutenberg-Richter recurrence, Campbell 1981 ground motion). "
+                           "Choose the probabilistic hazard rendering to map it.")
+
             else:
                 st.warning("No fault systems match the selected risk filter (or no fault data loaded).")
 
         with tab2:
-            st.markdown("#### Historical Earthquake Patterns")
-            if not filtered_quakes.empty:
-                # --- Plot 1: Timeline ---
-                timeline_fig = px.scatter(
-                    filtered_quakes.sort_values('year'),
-                    x='year',
-                    y='magnitude',
-                    size='deaths',
-                    color='magnitude',
-                    hover_name='location',
-                    hover_data={'year': True, 'magnitude': True, 'deaths': True, 'location': False, 'description': True}, # Added description
-                    size_max=25,
-                    color_continuous_scale=px.colors.sequential.OrRd, # Orange-Red scale
-                    title=f'Earthquakes ({year_range[0]}-{year_range[1]}, M{magnitude_range[0]:.1f}-{magnitude_range[1]:.1f})',
-                    height=350
+            show_earthquake_history()
+
+            # --- Gutenberg-Richter statistics of the filtered catalog events ---
+            st.markdown("#### Magnitude-Frequency Statistics")
+            year_span = int(year_range[1]) - int(year_range[0]) + 1
+            gr_window_years = st.slider(
+                "b-value Time Window (years)",
+                1, max(year_span, 2), min(25, year_span), 1,
+                help="Length of the sliding windows the b-value is estimated in; windows overlap by half."
+            )
+            fault_names = list(filtered_faults["name"]) if not filtered_faults.empty else []
+
+            def fault_gr():
+                association = get_fault_association(
+                    CATALOG_PATH, catalog_file_version, TRACES_PATH, traces_version, float(association_radius_km)
                 )
-                timeline_fig.update_layout(
-                    xaxis_title='Year',
-                    yaxis_title='Magnitude (Mw)',
-                    coloraxis_colorbar_title='Mw',
-                    margin=dict(t=30, b=0, l=0, r=0)
+                quake_positions = catalog_positions()
+                magnitudes = earthquake_catalog.magnitudes[quake_positions]
+                return magnitude_histogram(magnitudes), fault_gr_statistics(
+                    association, magnitudes, quake_positions, year_span, fault_names
                 )
-                timeline_fig.update_traces(hovertemplate=
-                    "<b>%{hovertext} (%{customdata[0]})</b><br>" +
-                    "Magnitude: %{customdata[1]:.1f} Mw<br>" +
-                    "Deaths: %{customdata[2]:,}<br>" +
-                    "<i>%{customdata[3]}</i>" + # Show description on hover
-                    "<extra></extra>") # Hide extra trace info
-                st.plotly_chart(timeline_fig, use_container_width=True)
-
-                # --- Summary: Deadliest ---
-                st.markdown('##### Deadliest Events in Filtered Range')
-                deadliest = filtered_quakes.nlargest(5, 'deaths')
-                for _, quake in deadliest.iterrows():
-                    st.markdown(f"- **{quake['year']} {quake['location']} (M{quake['magnitude']})**: {quake['deaths']:,} deaths")
-                if len(filtered_quakes) > 5:
-                    st.caption(f"Showing top {min(len(deadliest), 5)} deadliest out of {len(filtered_quakes)} filtered events.")
-                elif len(filtered_quakes) == 0:
-                     st.caption("No events in the filtered range.")
-                else:
-                     st.caption(f"Showing all {len(filtered_quakes)} filtered events.")
 
-            else:
-                st.info("No historical earthquakes match your filter criteria.")
+            def window_gr():
+                quake_positions = catalog_positions()
+                return window_gr_statistics(
+                    earthquake_catalog.years[quake_positions], earthquake_catalog.magnitudes[quake_positions],
+                    year_range, gr_window_years
+                )
+
+            with stage("analysis.gutenberg_richter"):
+                gr_key = ("gr", association_radius_km) + risk_key + quake_key
+                histogram, gr_stats = caches["frames"].get_or_compute(gr_key, fault_gr)
+                window_key = ("gr.windows", gr_window_years) + quake_key
+                window_stats = caches["frames"].get_or_compute(window_key, window_gr)
+
+            def interval(stats, name, digits):
+                if not np.isfinite(stats[name]):
+                    return "n/a"
+                if not np.isfinite(stats[f"{name}_low"]):
+                    return f"{stats[name]:.{digits}f}"
+                return f"{stats[name]:.{digits}f} ({stats[f'{name}_low']:.{digits}f}-{stats[f'{name}_high']:.{digits}f})"
+
+            overall = gr_stats.iloc[0]
+            b_col, mc_col, rate_col = st.columns(3)
+            b_col.metric("b-value", interval(overall, "b_value", 2))
+            mc_col.metric("Mc", interval(overall, "mc", 1))
+            rate_col.metric("Events/yr ≥ Mc", interval(overall, "annual_rate", 2))
+
+            if overall["events"]:
+                with stage("chart.magnitude_frequency") as timed:
+                    mf_json = caches["figures"].get_or_compute(
+                        ("magnitude_frequency",) + quake_key,
+                        lambda: build_magnitude_frequency_figure(histogram, overall).to_json()
+                    )
+                    timed.output_bytes = len(mf_json)
+                    st.plotly_chart(plotly_figure(mf_json), use_container_width=True)
+
+                def b_value_json():
+                    b_fig = build_b_value_figure(window_stats)
+                    return b_fig.to_json() if b_fig is not None else None
+
+                with stage("chart.b_value") as timed:
+                    b_json = caches["figures"].get_or_compute(window_key, b_value_json)
+                    if b_json is not None:
+                        timed.output_bytes = len(b_json)
+                        st.plotly_chart(plotly_figure(b_json), use_container_width=True)
+
+                st.dataframe(
+                    gr_stats.assign(
+                        b=[interval(row, "b_value", 2) for _, row in gr_stats.iterrows()],
+                        Mc=[interval(row, "mc", 1) for _, row in gr_stats.iterrows()],
+                        rate=[interval(row, "annual_rate", 2) for _, row in gr_stats.iterrows()],
+                    )[["name", "events", "events_above_mc", "b", "Mc", "rate"]].rename(columns={
+                        "name": "Fault System", "events": "Events", "events_above_mc": "Events ≥ Mc",
+                        "b": "b-value", "rate": "Events/yr ≥ Mc"
+                    }),
+                    hide_index=True
+                )
+            st.caption(f"Catalog {'mainshocks' if declustered else 'events'} in the filtered range "
+                       f"({ALL_EVENTS.lower()} and those within {association_radius_km} km of each fault system). "
+                       "Mc by maximum curvature + 0.2, b-value by maximum likelihood above Mc; "
+                       f"{CONFIDENCE:.0%} intervals from bootstrap resamples.")
+
+    # Cache effectiveness across all sessions of this server process
+    with st.sidebar:
+        with st.expander("Cache Statistics", expanded=False):
+            st.dataframe(pd.DataFrame([cache.stats() for cache in caches.values()]), hide_index=True)
+            warm_stats = cache_warmer.stats()
+            st.caption(
+                f"Warming: {warm_stats['queue_depth']} state(s) queued, {warm_stats['states_warmed']} warmed, "
+                f"warm-hit ratio {warm_stats['warm_hit_ratio']:.0%} "
+                f"({warm_stats['warm_hits']} of {warm_stats['warm_hits'] + warm_stats['cold_misses']} new states)"
+            )
+            playback_stats = get_playback_builder().stats()
+            st.caption(
+                f"Playback: {playback_stats['queue_depth']} map(s) queued, {playback_stats['built']} built, "
+                f"{playback_stats['dropped_stale']} dropped as stale"
+            )
+
+    # Stage timings of this rerun, plus totals since the server started
+    if perf_run is not None:
+        run_records = profiler.records(perf_run)
+        if PERF_EXPORT_PATH:
+            profiler.export(PERF_EXPORT_PATH, perf_run)
+        if show_performance:
+            with st.sidebar:
+                with st.expander("Performance", expanded=True):
+                    stages = pd.DataFrame(run_records, columns=["stage", "seconds", "allocated_blocks", "output_bytes"])
+                    stages["ms"] = (stages.pop("seconds") * 1000).round(1)
+                    st.markdown(f"**This rerun:** {stages['ms'].sum():.0f} ms across {len(stages)} stages")
+                    st.dataframe(stages[["stage", "ms", "allocated_blocks", "output_bytes"]], hide_index=True)
+                    totals = pd.DataFrame.from_dict(profiler.totals(), orient="index")
+                    if not totals.empty:
+                        totals["mean_ms"] = (totals["seconds"] / totals["count"] * 1000).round(1)
+                        st.markdown("**Since server start**")
+                        st.dataframe(totals[["count", "mean_ms", "output_bytes"]])
+                    # Shared catalog vs. the filtered events this session keeps in the frame cache
+                    catalog_memory = earthquake_catalog.memory_usage()
+                    session_bytes = int(filtered_quakes.memory_usage(index=True, deep=True).sum())
+                    st.markdown(
+                        f"**Memory:** catalog {sum(catalog_memory.values()) / 1e3:,.0f} kB shared "
+                        f"(keys {catalog_memory['keys'] / 1e3:,.0f}, columns {catalog_memory['columns'] / 1e3:,.0f}, "
+                        f"strings {catalog_memory['strings'] / 1e3:,.0f}); "
+                        f"this session's events {session_bytes / 1e3:,.0f} kB"
+                    )
+                    st.download_button(
+                        "Download stage timings (JSON lines)",
+                        profiler.to_json_lines(profiler.records()),
+                        file_name="stage_timings.jsonl",
+                        mime="application/x-ndjson"
+                    )
 
     # Footer with educational information
     st.markdown("---")
@@ -593,7 +929,7 @@ def main():
 # Run the application
 if __name__ == "__main__":
     # --- Add checks for data validity before running main ---
-    if not isinstance(fault_data, list) or not all(isinstance(item, dict) for item in fault_data):
+    if not isinstance(fault_data, list): # Non-dict entries were skipped (with a warning) by get_fault_frame
         st.error("Critical Error: `fault_data` is not a valid list of dictionaries. Please check the data structure.")
     elif not isinstance(historical_earthquakes, list) or not all(isinstance(item, dict) for item in historical_earthquakes):
          st.error("Critical Error: `historical_earthquakes` is not a valid list of dictionaries. Please check the data structure.")
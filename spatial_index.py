@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Uniform lat/lon grid index over earthquake epicentres.
+
+Events are bucketed into square cells once per catalog load. The positions of
+each row of cells are stored contiguously, so a bounding box resolves to one
+slice per cell row. Bounding-box and radius queries therefore cost time
+proportional to the events near the query, not to the size of the catalog.
+"""
+import numpy as np
+
+from earthquake_catalog import _concat_ranges
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = np.pi * EARTH_RADIUS_KM / 180.0
+DEFAULT_CELL_SIZE = 0.25  # degrees
+# Extent covered by the map; events outside it are never sent to the browser
+SOUTHERN_ITALY_BOUNDS = (35.5, 11.0, 43.5, 19.5)  # (south, west, north, east)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; broadcasts over NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def radius_bounds(lat, lon, radius_km):
+    """(south, west, north, east) box enclosing a circle of `radius_km` around a point."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Use the latitude closest to the pole so the box always covers the circle
+    widest = min(abs(lat) + dlat, 89.9)
+    dlon = min(dlat / np.cos(np.radians(widest)), 180.0)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+class GridIndex:
+    """Bucket positions by grid cell for bounding-box and radius lookups."""
+
+    def __init__(self, lat, lon, cell_size=DEFAULT_CELL_SIZE):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size = float(cell_size)
+
+        # Positions without finite coordinates are in no cell, so no lookup returns them
+        located = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        if len(located):
+            lat, lon = self.lat[located], self.lon[located]
+            self.lat0, self.lon0 = float(lat.min()), float(lon.min())
+            rows = self._cell(lat, self.lat0)
+            cols = self._cell(lon, self.lon0)
+            self.n_rows, self.n_cols = int(rows.max()) + 1, int(cols.max()) + 1
+        else:
+            self.lat0 = self.lon0 = 0.0
+            rows = cols = np.empty(0, dtype=np.int64)
+            self.n_rows = self.n_cols = 0
+
+        # CSR layout: positions sorted by cell id, plus the start offset of every cell
+        cells = rows * self.n_cols + cols
+        self._positions = located[np.argsort(cells, kind="stable")]
+        counts = np.bincount(cells, minlength=self.n_rows * self.n_cols)
+        self._cell_starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def to_arrays(self):
+        """Cell layout as named arrays (without the coordinates) for `from_arrays`."""
+        return {
+            "positions": self._positions,
+            "cell_starts": self._cell_starts,
+            "grid": np.array([self.lat0, self.lon0, self.cell_size, self.n_rows, self.n_cols], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, lat, lon, arrays):
+        """Index over `lat`/`lon` reusing a cell layout from `to_arrays` (e.g. memory-mapped)."""
+        index = cls.__new__(cls)
+        index.lat, index.lon = lat, lon
+        index._positions, index._cell_starts = arrays["positions"], arrays["cell_starts"]
+        lat0, lon0, cell_size, n_rows, n_cols = arrays["grid"].tolist()
+        index.lat0, index.lon0, index.cell_size = lat0, lon0, cell_size
+        index.n_rows, index.n_cols = int(n_rows), int(n_cols)
+        return index
+
+    def _cell(self, values, origin):
+        return np.floor((values - origin) / self.cell_size).astype(np.int64)
+
+    def _bbox_ranges(self, south, west, north, east):
+        # One contiguous [start, stop) slice of `_positions` per row of cells
+        empty = np.empty(0, dtype=np.int64)
+        if len(self) == 0:
+            return empty, empty
+        row0, row1 = self._cell(np.array([south, north]), self.lat0)
+        col0, col1 = self._cell(np.array([west, east]), self.lon0)
+        row0, row1 = max(row0, 0), min(row1, self.n_rows - 1)
+        col0, col1 = max(col0, 0), min(col1, self.n_cols - 1)
+        if row0 > row1 or col0 > col1:
+            return empty, empty
+        row_offsets = np.arange(row0, row1 + 1) * self.n_cols
+        return self._cell_starts[row_offsets + col0], self._cell_starts[row_offsets + col1 + 1]
+
+    def cell_layout(self):
+        """(positions grouped by cell, cell id of each); inside a cell positions stay in ascending order."""
+        counts = np.diff(self._cell_starts)
+        return self._positions, np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+
+    def bbox_cells(self, south, west, north, east):
+        """Ids of the cells the bounding box touches."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        row0, row1 = self._cell(np.array([south, north]), self.lat0)
+        col0, col1 = self._cell(np.array([west, east]), self.lon0)
+        rows = np.arange(max(row0, 0), min(row1, self.n_rows - 1) + 1)
+        cols = np.arange(max(col0, 0), min(col1, self.n_cols - 1) + 1)
+        return (rows[:, None] * self.n_cols + cols[None, :]).ravel()
+
+    def count_bbox(self, south, west, north, east):
+        """Upper bound on the events inside the box (events in the touched cells)."""
+        starts, stops = self._bbox_ranges(south, west, north, east)
+        return int((stops - starts).sum())
+
+    def bbox_mask(self, positions, south, west, north, east):
+        lat, lon = self.lat[positions], self.lon[positions]
+        return (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+
+    def radius_mask(self, positions, lat, lon, radius_km):
+        return haversine_km(lat, lon, self.lat[positions], self.lon[positions]) <= radius_km
+
+    def query_bbox(self, south, west, north, east):
+        """Sorted positions of the events inside the bounding box."""
+        candidates = self._positions[_concat_ranges(*self._bbox_ranges(south, west, north, east))]
+        return np.sort(candidates[self.bbox_mask(candidates, south, west, north, east)])
+
+    def query_radius(self, lat, lon, radius_km):
+        """Sorted positions of the events within `radius_km` of (lat, lon)."""
+        candidates = self._positions[_concat_ranges(*self._bbox_ranges(*radius_bounds(lat, lon, radius_km)))]
+        return np.sort(candidates[self.radius_mask(candidates, lat, lon, radius_km)])
+
+
+def select_positions(catalog, index, year_range, magnitude_range, bbox=None, circle=None, mask=None):
+    """
+    Catalog positions matching the year/magnitude ranges and, optionally, a
+    (south, west, north, east) `bbox` or a (lat, lon, radius_km) `circle`.
+    A boolean `mask` over catalog positions (e.g. the mainshocks of a
+    declustering) drops the positions where it is False.
+
+    Whichever predicate selects fewer events drives the lookup and the other
+    is checked only on those candidates.
+    """
+    positions = _select_positions(catalog, index, year_range, magnitude_range, bbox, circle)
+    return positions if mask is None else positions[mask[positions]]
+
+
+def _select_positions(catalog, index, year_range, magnitude_range, bbox, circle):
+    if bbox is None and circle is None:
+        return catalog.positions(year_range, magnitude_range)
+
+    spatial_bounds = bbox if circle is None else radius_bounds(*circle)
+    if catalog.count(year_range, magnitude_range) <= index.count_bbox(*spatial_bounds):
+        positions = catalog.positions(year_range, magnitude_range)
+        keep = np.ones(len(positions), dtype=bool)
+        if bbox is not None:
+            keep &= index.bbox_mask(positions, *bbox)
+        if circle is not None:
+            keep &= index.radius_mask(positions, *circle)
+        return positions[keep]
+
+    positions = index.query_bbox(*bbox) if circle is None else index.query_radius(*circle)
+    if bbox is not None and circle is not None:
+        positions = positions[index.bbox_mask(positions, *bbox)]
+    return positions[catalog.in_ranges(positions, year_range, magnitude_range)]
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight per-stage timing for app reruns.
+
+Code marks its expensive steps with ``with stage("name"):``. While a profiler
+run is active in the current context, each stage records its wall time, the net
+change in allocated memory blocks and, when the caller sets it, the size of the
+stage's output. Without an active run, `stage` returns a shared no-op object,
+so instrumented code costs one context-variable lookup per stage.
+
+Records can be exported as JSON lines or in the Prometheus text format.
+"""
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+DEFAULT_HISTORY = 2000 # Stage records kept per process
+METRIC_PREFIX = "faults_stage"
+
+# (profiler, run id) for the rerun executing in this context, or None when profiling is off
+_active_run = contextvars.ContextVar("stage_profiler_run", default=None)
+
+
+class _NullStage:
+    """Stand-in returned by `stage` when profiling is off; ignores everything."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Context manager timing one stage of the active run."""
+
+    def __init__(self, profiler, run, name):
+        self._profiler = profiler
+        self._run = run
+        self.name = name
+        self.output_bytes = None # Optionally set by the caller inside the block
+
+    def __enter__(self):
+        self._blocks = sys.getallocatedblocks()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._started
+        self._profiler.record({
+            "run": self._run,
+            "stage": self.name,
+            "seconds": seconds,
+            "allocated_blocks": sys.getallocatedblocks() - self._blocks,
+            "output_bytes": self.output_bytes,
+            "timestamp": time.time(),
+        })
+        return False
+
+
+def stage(name):
+    """Time the enclosed block as `name` if a profiler run is active, else do nothing."""
+    active = _active_run.get()
+    if active is None:
+        return _NULL_STAGE
+    return _Stage(active[0], active[1], name)
+
+
+def deactivate():
+    """Stop recording stages in the current context."""
+    _active_run.set(None)
+
+
+class StageProfiler:
+    """Thread-safe store of stage records with running per-stage totals."""
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._records = deque(maxlen=history)
+        self._totals = {} # stage -> {"count", "seconds", "allocated_blocks", "output_bytes"}
+        self._runs = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_run(self):
+        """Begin a new run in the current context; returns its id."""
+        run = next(self._runs)
+        self.activate(run)
+        return run
+
+    def activate(self, run):
+        """Record stages in the current context (e.g. a fragment rerun) under an existing run."""
+        _active_run.set((self, run))
+
+    def record(self, entry):
+        with self._lock:
+            self._records.append(entry)
+            totals = self._totals.setdefault(
+                entry["stage"], {"count": 0, "seconds": 0.0, "allocated_blocks": 0, "output_bytes": 0}
+            )
+            totals["count"] += 1
+            totals["seconds"] += entry["seconds"]
+            totals["allocated_blocks"] += max(entry["allocated_blocks"], 0)
+            totals["output_bytes"] += entry["output_bytes"] or 0
+
+    def records(self, run=None):
+        """Stage records, oldest first, optionally only those of one run."""
+        with self._lock:
+            return [entry for entry in self._records if run is None or entry["run"] == run]
+
+    def totals(self):
+        """Per-stage count and cumulative seconds, blocks and output bytes since start-up."""
+        with self._lock:
+            return {name: dict(values) for name, values in self._totals.items()}
+
+    # ===== Export =====
+    @staticmethod
+    def to_json_lines(records):
+        return "".join(json.dumps(entry, sort_keys=True) + "\n" for entry in records)
+
+    def to_prometheus(self):
+        """Cumulative per-stage metrics in the Prometheus text exposition format."""
+        metrics = [
+            ("runs_total", "counter", "Times the stage ran.", "count"),
+            ("seconds_total", "counter", "Wall time spent in the stage.", "seconds"),
+            ("allocated_blocks_total", "counter", "Memory blocks allocated by the stage (net, >= 0).",
+             "allocated_blocks"),
+            ("output_bytes_total", "counter", "Bytes produced by the stage.", "output_bytes"),
+        ]
+        totals = self.totals()
+        lines = []
+        for suffix, kind, help_text, field in metrics:
+            name = f"{METRIC_PREFIX}_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage_name, values in sorted(totals.items()):
+                lines.append(f'{name}{{stage="{stage_name}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, run=None):
+        """
+        Write metrics to `path`: Prometheus text (replaced atomically) for ``.prom``
+        files, otherwise the records of `run` appended as JSON lines.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.endswith(".prom"):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                out.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, "a", encoding="utf-8") as out:
+                out.write(self.to_json_lines(self.records(run)))
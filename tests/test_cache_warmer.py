@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Cache warming against real render caches, with the built-in catalog and faults."""
+import time
+
+import pytest
+
+from cache_warmer import CacheWarmer, primary_key, warm_state
+from earthquake_catalog import load_catalog
+from explorer_views import FULL_EXTENT_OPTION, HEATMAP_MODES, MAP_MODES, MAP_TILE_OPTIONS
+from render_cache import LRUCache, state_keys
+from seismic_data import fault_data, fault_frame, historical_earthquakes
+from spatial_index import GridIndex
+
+
+@pytest.fixture
+def resources():
+    catalog = load_catalog(records=historical_earthquakes)
+    return {
+        "catalog": catalog, "index": GridIndex(catalog.lat, catalog.lon), "faults": fault_frame(fault_data),
+        "traces": None, "feed": None, "declustering": None,
+    }
+
+
+@pytest.fixture
+def caches():
+    return {name: LRUCache(name, 64) for name in ("frames", "maps", "figures")}
+
+
+def _state(resources, **changes):
+    state = dict(
+        display_options=["Fault Systems", "Historical Earthquakes"],
+        filter_risk=sorted(resources["faults"]["seismic_risk"].unique()), year_range=(1900, 2023),
+        magnitude_range=(6.0, 8.0), selected_tile=MAP_TILE_OPTIONS[1], heatmap_mode=HEATMAP_MODES[1],
+        focus_area=FULL_EXTENT_OPTION, focus_radius_km=None, map_mode=MAP_MODES[0], declustered=False,
+        playback_period=None,
+    )
+    state.update(changes)
+    return state
+
+
+def test_warm_state_builds_under_the_app_keys(resources, caches):
+    state = _state(resources)
+    state_key, risk_key, quake_key = state_keys(state, resources["catalog"].version)
+    built = warm_state(state, resources, caches)
+    assert ("maps", state_key) in built and ("frames", ("quakes",) + quake_key) in built
+    assert ("figures", ("slip",) + risk_key) in built
+    assert state_key in caches["maps"]
+    assert warm_state(state, resources, caches) == [] # Everything is cached now
+    assert caches["maps"].stats()["hits"] == caches["maps"].stats()["misses"] == 0
+
+
+def test_client_side_maps_are_keyed_by_their_frames(resources):
+    state = _state(resources, map_mode=MAP_MODES[1])
+    assert primary_key(state, resources)[0] == "frames"
+
+
+def test_cold_miss_is_counted_once_per_key(resources, caches):
+    warmer = CacheWarmer(caches, workers=0)
+    warmer.configure(resources, [])
+    state, other = _state(resources), _state(resources, year_range=(1950, 2000))
+    for _ in range(3): # Reruns while the session builds the artefacts
+        warmer.record(state)
+    warmer.record(other)
+    assert warmer.stats()["cold_misses"] == 2
+    warm_state(state, resources, caches) # Built by the session: neither a miss nor a warm hit
+    warmer.record(state)
+    assert warmer.stats()["cold_misses"] == 2 and warmer.stats()["warm_hits"] == 0
+
+    caches["maps"].clear()
+    warmer.record(state) # Evicted since: a new cold miss
+    assert warmer.stats()["cold_misses"] == 3
+
+
+def test_warmed_default_state_counts_as_a_warm_hit(resources, caches):
+    warmer = CacheWarmer(caches, workers=1, cpu_share=1.0, interval=0.05)
+    state = _state(resources)
+    warmer.configure(resources, [state])
+    warmer.start()
+    deadline = time.monotonic() + 60
+    while warmer.stats()["states_warmed"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert warmer.stats()["states_warmed"] == 1
+    assert warmer.candidates() == []
+    warmer.record(state)
+    warmer.record(state)
+    stats = warmer.stats()
+    assert (stats["warm_hits"], stats["cold_misses"], stats["warm_hit_ratio"]) == (1, 0, 1.0)
+
+
+def test_nothing_is_built_over_the_memory_budget(resources, caches):
+    warmer = CacheWarmer(caches, workers=1, cpu_share=1.0, memory_share=0.5, interval=0.05)
+    for number in range(40):
+        caches["frames"].put(("filler", number), number)
+    warmer.configure(resources, [_state(resources)])
+    warmer.start()
+    deadline = time.monotonic() + 10
+    while warmer.stats()["skipped_over_budget"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert warmer.stats()["skipped_over_budget"] >= 1
+    assert warmer.stats()["states_warmed"] == 0 and len(caches["maps"]) == 0
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Gardner-Knopoff declustering of a handmade mainshock/aftershock sequence."""
+import numpy as np
+
+from declustering import decluster, gardner_knopoff_windows
+from earthquake_catalog import load_catalog
+from spatial_index import GridIndex
+
+# (location, year, magnitude, lat, lon). The M6.0 window is about 53 km and 1.4 years.
+SEQUENCE = [
+    ("Mainshock", 2009, 6.0, 42.35, 13.40),
+    ("Aftershock", 2009, 4.5, 42.40, 13.45), # ~7 km, same year
+    ("Late aftershock", 2010, 4.0, 42.30, 13.35), # ~7 km, one year later
+    ("Foreshock", 2008, 3.5, 42.36, 13.41), # ~1 km, one year earlier
+    ("Years later", 2015, 4.0, 42.35, 13.40), # Same place, outside the time window
+    ("Far away", 2009, 5.0, 40.00, 16.00), # ~330 km
+    ("Just outside", 2009, 3.0, 42.95, 13.40), # ~67 km north
+]
+
+
+def _catalog(rows):
+    return load_catalog(records=[
+        {"year": year, "location": location, "magnitude": magnitude, "lat": lat, "lon": lon, "deaths": 0,
+         "description": ""}
+        for location, year, magnitude, lat, lon in rows
+    ])
+
+
+def test_windows_grow_with_magnitude():
+    distance_km, duration = gardner_knopoff_windows([4.0, 6.0])
+    assert 29 < distance_km[0] < 31 and 52 < distance_km[1] < 54
+    assert duration[0] < 0.2 and 1.3 < duration[1] < 1.4
+
+
+def test_aftershocks_and_foreshocks_join_the_mainshock():
+    catalog = _catalog(SEQUENCE)
+    declustering = decluster(catalog, GridIndex(catalog.lat, catalog.lon))
+    locations = catalog.take(np.arange(len(catalog)))["location"].astype(str).to_numpy()
+    mainshock_of = dict(zip(locations, locations[declustering.cluster]))
+    assert mainshock_of == {
+        "Mainshock": "Mainshock", "Aftershock": "Mainshock", "Late aftershock": "Mainshock",
+        "Foreshock": "Mainshock", "Years later": "Years later", "Far away": "Far away",
+        "Just outside": "Just outside",
+    }
+    assert declustering.mainshocks == 4
+    assert sorted(locations[declustering.mainshock]) == ["Far away", "Just outside", "Mainshock", "Years later"]
+
+
+def test_events_are_independent_when_far_apart():
+    catalog = _catalog([(f"Event {n}", 1950 + 10 * n, 5.0, 38.0 + n, 15.0) for n in range(4)])
+    declustering = decluster(catalog, GridIndex(catalog.lat, catalog.lon))
+    assert declustering.mainshock.all()
+
+
+def test_empty_catalog():
+    catalog = _catalog([])
+    assert len(decluster(catalog, GridIndex(catalog.lat, catalog.lon))) == 0
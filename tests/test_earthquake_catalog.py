@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Catalog loading on small handmade catalogs."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from earthquake_catalog import load_catalog
+
+RECORDS = pd.DataFrame({
+    "year": [2001, 2000, 2002, 2003, 2004], "location": ["A", "B", "C", "D", "E"],
+    "magnitude": [3.0, 4.0, np.nan, 5.0, 4.5], "lat": [40.0, np.nan, 41.0, 39.0, 38.5],
+    "lon": [15.0, 16.0, 16.0, 17.0, np.nan], "deaths": [0, 1, 2, 3, 4], "description": ["a", "b", "c", "d", "e"],
+})
+
+
+@pytest.mark.parametrize("extension", ["records", "csv", "parquet", "feather"])
+def test_events_missing_a_key_column_are_dropped(tmp_path, extension):
+    if extension == "records":
+        catalog = load_catalog(records=RECORDS.to_dict("records"))
+    else:
+        path = tmp_path / f"catalog.{extension}"
+        if extension == "feather":
+            RECORDS.to_feather(path)
+        else:
+            getattr(RECORDS, f"to_{extension}")(path, index=False)
+        catalog = load_catalog(str(path))
+    assert len(catalog) == 2
+    assert np.isfinite(catalog.lat).all() and np.isfinite(catalog.lon).all()
+    assert catalog.take(np.arange(len(catalog)))["location"].tolist() == ["A", "D"]
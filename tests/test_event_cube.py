@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""EventCube aggregates checked against the same queries run on the raw events."""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_cube import EventCube, magnitude_bins
+from event_feed import EventRingBuffer
+
+N_REGIONS = 3
+
+
+@pytest.fixture(scope="module")
+def events():
+    rng = np.random.default_rng(7)
+    count = 2000
+    return pd.DataFrame({
+        "year": rng.integers(1900, 2024, count),
+        "magnitude": np.round(rng.uniform(2.0, 7.5, count), 1),
+        "region": rng.integers(-1, N_REGIONS, count), # -1: not associated with a fault system
+        "deaths": rng.integers(0, 50, count),
+    })
+
+
+def _cube(events, batches=1):
+    cube = EventCube(N_REGIONS)
+    for part in np.array_split(np.arange(len(events)), batches):
+        batch = events.iloc[part]
+        cube.add(batch["year"], batch["magnitude"], batch["region"], batch["deaths"])
+    return cube
+
+
+def _feed_events(count):
+    return pd.DataFrame({
+        "year": np.full(count, 2024), "location": "", "magnitude": np.full(count, 3.0),
+        "lat": np.full(count, 38.0), "lon": np.full(count, 16.0), "deaths": np.zeros(count, dtype=np.int64),
+        "description": "",
+    })
+
+
+def _expected(events, year_range, magnitude_range, by):
+    window = events[
+        events["year"].between(*year_range) & events["magnitude"].between(*magnitude_range)
+    ]
+    grouped = window.groupby(by).agg(
+        events=("magnitude", "size"), deaths=("deaths", "sum"), max_magnitude=("magnitude", "max")
+    ).reset_index()
+    return window, grouped
+
+
+@pytest.mark.parametrize("year_range, magnitude_range", [
+    ((1900, 2023), (0.0, 10.0)),
+    ((1950, 1980), (4.0, 6.0)),
+    ((2000, np.inf), (5.5, np.inf)), # Open-ended, like sliders pushed to the catalog maximum
+    ((1990, 1990), (3.3, 3.3)),
+])
+def test_windows_match_the_raw_events(events, year_range, magnitude_range):
+    _check_window(_cube(events), events, year_range, magnitude_range)
+
+
+@pytest.mark.parametrize("year_range, magnitude_range", [
+    ((1900, 2023), (0.0, 10.0)),
+    ((1950, 1980), (2.37, 6.05)), # Both bounds inside a bin
+    ((1900, 2023), (4.42, 4.47)), # Both bounds inside the same bin
+    ((1900, 2023), (6.0, 6.0)),
+    ((2000, np.inf), (5.55, np.inf)),
+])
+def test_off_grid_magnitudes_match_the_raw_events(events, year_range, magnitude_range):
+    # Two-decimal magnitudes, with some one-decimal ones mixed in, fed in several batches
+    rng = np.random.default_rng(11)
+    fine = events.assign(magnitude=np.where(
+        rng.random(len(events)) < 0.8, np.round(rng.uniform(2.0, 7.5, len(events)), 2), events["magnitude"]
+    ))
+    _check_window(_cube(fine, batches=3), fine, year_range, magnitude_range)
+    restored = EventCube.from_arrays(N_REGIONS, _cube(fine, batches=3).to_arrays())
+    _check_window(restored, fine, year_range, magnitude_range)
+
+
+def _check_window(cube, events, year_range, magnitude_range):
+    window, by_year = _expected(events, year_range, magnitude_range, "year")
+    totals = cube.totals(year_range, magnitude_range)
+    assert totals["events"] == len(window)
+    assert totals["deaths"] == window["deaths"].sum()
+    assert totals["max_magnitude"] == (window["magnitude"].max() if len(window) else None)
+
+    pd.testing.assert_frame_equal(cube.by_year(year_range, magnitude_range), by_year, check_dtype=False)
+    # Per 0.1 bin, labelled by its lower edge
+    binned = events.assign(bin=np.round(magnitude_bins(events["magnitude"]) * 0.1, 1))
+    _, by_magnitude = _expected(binned, year_range, magnitude_range, "bin")
+    by_magnitude = by_magnitude.rename(columns={"bin": "magnitude"})
+    pd.testing.assert_frame_equal(cube.by_magnitude(year_range, magnitude_range), by_magnitude, check_dtype=False)
+    _, by_region = _expected(events, year_range, magnitude_range, "region")
+    # Unassociated events (-1) come after the fault systems
+    pd.testing.assert_frame_equal(
+        cube.by_region(year_range, magnitude_range).sort_values("region", ignore_index=True), by_region,
+        check_dtype=False
+    )
+
+
+def test_region_filter(events):
+    cube = _cube(events)
+    regions = events["region"].isin([-1, 2])
+    assert cube.totals((1900, 2023), (0.0, 10.0), regions=[-1, 2])["events"] == regions.sum()
+
+
+def test_incremental_adds_match_one_batch(events):
+    whole, parts = _cube(events), _cube(events, batches=7)
+    assert parts.total == whole.total == len(events)
+    assert parts.version == 7
+    for name in ("keys", "counts", "deaths", "max_magnitude"):
+        np.testing.assert_array_equal(getattr(parts, name), getattr(whole, name))
+
+
+def test_sync_merges_only_new_events(events):
+    cube = EventCube(N_REGIONS)
+
+    def since(count):
+        batch = events.iloc[count:produced]
+        return (batch["year"], batch["magnitude"], batch["region"], batch["deaths"]), produced
+
+    produced = 100
+    assert cube.sync(since) == 100
+    assert cube.sync(since) == 0
+    produced = 250
+    assert cube.sync(since) == 150
+    assert cube.totals((1900, 2023), (0.0, 10.0))["events"] == 250
+
+
+def test_sync_with_concurrent_appends_counts_every_event_once():
+    buffer = EventRingBuffer(capacity=10_000)
+    cube = EventCube(N_REGIONS)
+
+    def since(count):
+        batch, total = buffer.since(count)
+        return (batch["year"], batch["magnitude"], np.full(len(batch), -1), batch["deaths"]), total
+
+    def append():
+        for _ in range(200):
+            buffer.append(_feed_events(5))
+
+    writers = [threading.Thread(target=append) for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        cube.sync(since)
+    for writer in writers:
+        writer.join()
+    cube.sync(since)
+    assert cube.synced == buffer.total == 4000
+    assert cube.totals((2024, 2024), (0.0, 10.0))["events"] == 4000
+
+
+def test_arrays_round_trip(events):
+    cube = _cube(events)
+    restored = EventCube.from_arrays(N_REGIONS, cube.to_arrays())
+    assert restored.total == cube.total
+    pd.testing.assert_frame_equal(
+        restored.by_year((1950, 2000), (3.0, 6.0)), cube.by_year((1950, 2000), (3.0, 6.0))
+    )
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Feed tailing tests: a local file appended to in parts stands in for the feed."""
+import os
+
+import pandas as pd
+
+from event_feed import EventRingBuffer, FeedTailer
+
+HEADER = "year,location,magnitude,lat,lon,deaths,description\n"
+
+
+def _append(path, data):
+    with open(path, "ab") as feed:
+        feed.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+
+def test_partial_lines_wait_for_their_newline(tmp_path):
+    path = tmp_path / "feed.csv"
+    tailer = FeedTailer(str(path))
+    assert tailer.poll() == 0 # Not created yet
+    _append(path, "year,location,magn")
+    assert tailer.poll() == 0
+    _append(path, "itude,lat,lon,deaths,description\n2024,Norcia,4.1,42.8,13.1,0,")
+    assert tailer.poll() == 0
+    _append(path, "felt\n2024,Amatrice,3.")
+    assert tailer.poll() == 1
+    _append(path, "2,42.6,13.3,0,\n")
+    assert tailer.poll() == 1
+    events = tailer.events()
+    assert events["location"].tolist() == ["Norcia", "Amatrice"]
+    assert events["magnitude"].tolist() == [4.1, 3.2]
+    assert events["description"].tolist()[0] == "felt"
+
+
+def test_multibyte_character_split_across_polls(tmp_path):
+    path = tmp_path / "feed.csv"
+    tailer = FeedTailer(str(path))
+    record = HEADER.encode("utf-8") + "2024,Città di Castello,3.5,43.4,12.2,0,\n".encode("utf-8")
+    cut = record.index("à".encode("utf-8")) + 1 # Inside the two-byte character
+    _append(path, record[:cut])
+    assert tailer.poll() == 0
+    _append(path, record[cut:])
+    assert tailer.poll() == 1
+    assert tailer.events()["location"].tolist() == ["Città di Castello"]
+
+
+def test_truncation_and_rotation_restart_the_tail(tmp_path):
+    path = tmp_path / "feed.csv"
+    tailer = FeedTailer(str(path))
+    _append(path, HEADER + "2024,A,3.0,40.0,15.0,0,\n2024,B,3.1,40.0,15.0,0,\n")
+    assert tailer.poll() == 2
+    # Truncated and rewritten, shorter than before
+    path.write_text(HEADER + "2025,C,3.2,40.0,15.0,0,\n", encoding="utf-8")
+    assert tailer.poll() == 1
+    # Rotated: a new file moved into place
+    rotated = tmp_path / "feed.new"
+    rotated.write_text(HEADER + "2025,D,3.3,40.0,15.0,0,\n2025,E,3.4,40.0,15.0,0,\n2025,F,3.5,40.0,15.0,0,\n",
+                       encoding="utf-8")
+    os.replace(rotated, path)
+    assert tailer.poll() == 3
+    assert tailer.events()["location"].tolist() == ["A", "B", "C", "D", "E", "F"]
+
+
+def test_quakeml_events_split_across_polls(tmp_path):
+    path = tmp_path / "feed.xml"
+    tailer = FeedTailer(str(path))
+    event = (
+        '<q:event publicID="{0}"><description><text>{0}</text></description>'
+        "<origin><time><value>2024-05-0{1}T10:00:00Z</value></time><latitude><value>40.5</value></latitude>"
+        "<longitude><value>15.5</value></longitude></origin><magnitude><mag><value>3.{1}</value></mag>"
+        "</magnitude></q:event>"
+    )
+    document = '<q:quakeml xmlns:q="http://quakeml.org/xmlns/bed/1.2"><eventParameters>' + event.format("Potenza", 1)
+    _append(path, document[:-20])
+    assert tailer.poll() == 0
+    _append(path, document[-20:] + event.format("Matera", 2))
+    assert tailer.poll() == 2
+    events = tailer.events()
+    assert events["location"].tolist() == ["Potenza", "Matera"]
+    assert events["year"].tolist() == [2024, 2024]
+
+
+def test_malformed_records_are_skipped(tmp_path):
+    path = tmp_path / "feed.csv"
+    tailer = FeedTailer(str(path))
+    _append(path, HEADER + "2024,Norcia,4.1,42.8,13.1,0,\n2024,Visso,n/a,42.9,13.1,0,\n2024,Cascia,3.0,42.7\n")
+    _append(path, "2024,Amatrice,3.2,42.6,13.3,0,\n")
+    assert tailer.poll() == 2
+    _append(path, "2024,Preci,3.4,42.9,13.0,0,\n")
+    assert tailer.poll() == 1
+    assert tailer.events()["location"].tolist() == ["Norcia", "Amatrice", "Preci"]
+
+    path = tmp_path / "feed.xml"
+    tailer = FeedTailer(str(path))
+    _append(path, (
+        "<event><description><text>Broken</text></description><origin><latitude></value></latitude></origin></event>"
+        "<event><description><text>Potenza</text></description><origin><time><value>2024-05-01T10:00:00Z</value>"
+        "</time><latitude><value>40.5</value></latitude><longitude><value>15.5</value></longitude></origin>"
+        "<magnitude><mag><value>3.1</value></mag></magnitude></event>"
+    ))
+    assert tailer.poll() == 1
+    assert tailer.events()["location"].tolist() == ["Potenza"]
+
+
+def test_ring_buffer_keeps_the_newest_events():
+    buffer = EventRingBuffer(capacity=5)
+    for start in (0, 3, 6):
+        buffer.append(pd.DataFrame({
+            "year": range(start, start + 3), "location": "", "magnitude": 3.0, "lat": 40.0, "lon": 15.0,
+            "deaths": 0, "description": "",
+        }))
+    assert len(buffer) == 5 and buffer.total == 9 and buffer.version == 3
+    assert buffer.frame()["year"].tolist() == [4, 5, 6, 7, 8]
+    # A single append larger than the buffer keeps only its tail
+    buffer.append(pd.DataFrame({
+        "year": range(100, 112), "location": "", "magnitude": 3.0, "lat": 40.0, "lon": 15.0,
+        "deaths": 0, "description": "",
+    }))
+    assert buffer.frame()["year"].tolist() == [107, 108, 109, 110, 111]
+
+
+def test_events_filters(tmp_path):
+    path = tmp_path / "feed.csv"
+    _append(path, HEADER + "2020,A,2.0,40.0,15.0,0,\n2021,B,5.0,40.0,15.0,0,\n2022,C,5.0,45.0,15.0,0,\n")
+    tailer = FeedTailer(str(path))
+    tailer.poll()
+    events = tailer.events(year_range=(2021, 2030), magnitude_range=(4.0, 9.0), bbox=(35.5, 11.0, 43.5, 19.5))
+    assert events["location"].tolist() == ["B"]
+    assert tailer.events(circle=(45.0, 15.0, 10.0))["location"].tolist() == ["C"]
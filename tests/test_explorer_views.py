@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Timeline downsampling on synthetic selections."""
+import numpy as np
+import pandas as pd
+
+from explorer_views import downsample_events
+
+
+def _quakes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "year": rng.integers(1800, 2024, count),
+        "magnitude": np.round(rng.uniform(2.0, 7.0, count), 1),
+        "deaths": rng.integers(0, 1000, count) * (rng.random(count) < 0.05),
+        "location": [f"Place {n}" for n in range(count)],
+    })
+
+
+def test_small_selections_are_kept_whole():
+    quakes = _quakes(50)
+    sampled = downsample_events(quakes, max_points=100)
+    assert len(sampled) == 50 and (sampled["events"] == 1).all()
+
+
+def test_large_selections_fit_the_budget_and_keep_every_event_counted():
+    quakes = _quakes(20_000)
+    sampled = downsample_events(quakes, max_points=500, pinned=20)
+    assert len(sampled) <= 500
+    assert sampled["events"].sum() == len(quakes)
+    # The largest and deadliest events are always drawn as themselves
+    for column in ("magnitude", "deaths"):
+        top = quakes.sort_values(column, ascending=False, kind="stable").head(20)
+        assert top.index.isin(sampled.index).all()
+        assert (sampled.loc[top.index, "events"] == 1).all()
+
+
+def test_each_bin_is_drawn_as_its_deadliest_event():
+    quakes = _quakes(5_000, seed=1)
+    sampled = downsample_events(quakes, max_points=4_500, pinned=0)
+    # One-year bins fit the budget here, so every (year, magnitude) pair is one point
+    bins = quakes.groupby(["year", "magnitude"])
+    assert len(sampled) == bins.ngroups
+    by_bin = sampled.set_index(["year", "magnitude"]).sort_index()
+    assert by_bin["events"].equals(bins.size().rename("events"))
+    assert by_bin["deaths"].equals(bins["deaths"].max())
+
+
+def test_budget_below_the_magnitude_bins():
+    # More 0.1 magnitude bins than points, even with one year bin over the whole span
+    quakes = _quakes(2_000, seed=2)
+    for max_points in (30, 5, 1):
+        sampled = downsample_events(quakes, max_points=max_points, pinned=10)
+        assert 1 <= len(sampled) <= max_points
+        assert sampled["events"].sum() == len(quakes)
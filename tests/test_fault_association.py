@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Nearest-fault attribution checked against a brute-force search, and per-fault statistics."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from fault_association import associate_events, densify, fault_statistics
+from fault_traces import FaultTrace
+from spatial_index import KM_PER_DEGREE_LAT, GridIndex, haversine_km
+
+FAULTS = pd.DataFrame({
+    "name": ["Calabrian Arc", "Southern Apennines", "Sicilian Channel"],
+    "latitude": [38.5, 40.8, 37.0],
+    "longitude": [16.2, 15.3, 12.5],
+})
+
+
+def _associate(lat, lon, faults=FAULTS, traces=None, radius_km=50.0):
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    return associate_events(GridIndex(lat, lon), faults, traces, radius_km)
+
+
+@pytest.mark.parametrize("radius_km", [20.0, 50.0, 120.0])
+def test_matches_brute_force_nearest_fault(radius_km):
+    rng = np.random.default_rng(3)
+    lat, lon = rng.uniform(36.5, 41.5, 3000), rng.uniform(12.0, 17.0, 3000)
+    association = _associate(lat, lon, radius_km=radius_km)
+
+    distances = haversine_km(lat[:, None], lon[:, None], FAULTS["latitude"].to_numpy(), FAULTS["longitude"].to_numpy())
+    nearest = distances.argmin(axis=1)
+    expected = np.where(distances.min(axis=1) <= radius_km, nearest, -1)
+    np.testing.assert_array_equal(association.fault_index, expected)
+    np.testing.assert_allclose(
+        association.distance_km, np.where(expected >= 0, distances.min(axis=1), np.nan), rtol=1e-5
+    )
+    assert 0 < (expected >= 0).sum() < len(lat)
+
+
+def test_radius_cutoff():
+    # Due north of the Calabrian Arc, just inside and just outside 50 km
+    offsets = np.array([49.5, 50.5]) / KM_PER_DEGREE_LAT
+    association = _associate(38.5 + offsets, [16.2, 16.2])
+    assert association.fault_index.tolist() == [0, -1]
+    assert association.distance_km[0] == pytest.approx(49.5, abs=0.1)
+    assert np.isnan(association.distance_km[1])
+    assert association.fault_names_for(np.array([0, 1])).tolist() == ["Calabrian Arc", None]
+
+
+def test_trace_brings_distant_events_within_reach():
+    # An event 150 km from the fault's location but next to its trace
+    trace = FaultTrace("Sicilian Channel", "line", [[[37.0, 12.5], [37.0, 14.5]]])
+    lat, lon = [37.05], [14.4]
+    assert _associate(lat, lon).fault_index.tolist() == [-1]
+    association = _associate(lat, lon, traces={"Sicilian Channel": trace})
+    assert association.fault_index.tolist() == [2]
+    assert association.distance_km[0] < 10
+
+
+def test_densify_bounds_the_gap():
+    points = densify([[37.0, 12.5], [37.0, 14.5], [38.0, 14.5]], spacing_km=2.0)
+    gaps = haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    assert gaps.max() <= 2.0 + 1e-9
+    np.testing.assert_array_equal(points[[0, -1]], [[37.0, 12.5], [38.0, 14.5]])
+
+
+def test_fault_statistics():
+    association = _associate([38.5, 38.6, 40.8, 39.6], [16.2, 16.2, 15.3, 16.0])
+    assert association.fault_index.tolist() == [0, 0, 1, -1]
+    stats = fault_statistics(association, [6.0, 5.0, 6.5, 7.0], np.arange(4))
+    by_name = stats.set_index("name")
+    assert by_name.loc["Calabrian Arc", "events"] == 2
+    assert by_name.loc["Calabrian Arc", "max_magnitude"] == 6.0
+    assert by_name.loc["Southern Apennines", "equivalent_mw"] == pytest.approx(6.5)
+    assert by_name.loc["Sicilian Channel", "events"] == 0 and np.isnan(by_name.loc["Sicilian Channel", "equivalent_mw"])
+    assert stats["name"].iloc[0] == "Southern Apennines" # Largest moment release first
+    only = fault_statistics(association, [6.0, 5.0, 6.5, 7.0], np.arange(4), fault_names=["Calabrian Arc"])
+    assert only["name"].tolist() == ["Calabrian Arc"]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Douglas-Peucker vertex importances and the level-of-detail traces built from them."""
+import math
+
+import numpy as np
+import pytest
+
+from fault_traces import FaultTrace, douglas_peucker_importance, tolerance_for_zoom
+
+# Baseline (0, 0)-(4, 0). The farthest vertex (3, 2) splits first; (2, 0.5) splits (0, 0)-(3, 2)
+# at 2.5 / sqrt(13). (1, 1) is 1.5 / sqrt(4.25) from (0, 0)-(2, 0.5) but can only appear once
+# (2, 0.5) has, so its importance is capped at that of (2, 0.5).
+POLYLINE = np.array([(0.0, 0.0), (1.0, 1.0), (2.0, 0.5), (3.0, 2.0), (4.0, 0.0)])
+
+
+def _douglas_peucker(points, tolerance):
+    # Textbook recursive simplification, for comparison
+    if len(points) < 3:
+        return points
+    start, end = points[0], points[-1]
+    segment = end - start
+    t = np.clip((points[1:-1] - start) @ segment / (segment @ segment), 0.0, 1.0)
+    distances = np.hypot(*(points[1:-1] - (start + t[:, None] * segment)).T)
+    split = 1 + int(np.argmax(distances))
+    if distances[split - 1] <= tolerance:
+        return points[[0, -1]]
+    return np.vstack([_douglas_peucker(points[:split + 1], tolerance)[:-1], _douglas_peucker(points[split:], tolerance)])
+
+
+def test_known_polyline():
+    importance = douglas_peucker_importance(POLYLINE)
+    assert importance[0] == importance[-1] == math.inf
+    assert importance[3] == pytest.approx(2.0)
+    assert importance[2] == pytest.approx(2.5 / math.sqrt(13))
+    assert importance[1] == pytest.approx(2.5 / math.sqrt(13))
+    assert POLYLINE[importance > 1.0].tolist() == [[0.0, 0.0], [3.0, 2.0], [4.0, 0.0]]
+    assert len(POLYLINE[importance > 0.5]) == 5
+
+
+@pytest.mark.parametrize("tolerance", [0.01, 0.05, 0.2, 1.0])
+def test_thresholds_match_recursive_simplification(tolerance):
+    rng = np.random.default_rng(3)
+    line = np.column_stack([np.linspace(0, 10, 60), np.cumsum(rng.normal(0, 0.1, 60))])
+    importance = douglas_peucker_importance(line)
+    np.testing.assert_array_equal(line[importance > tolerance], _douglas_peucker(line, tolerance))
+
+
+def test_short_lines_keep_their_endpoints():
+    assert douglas_peucker_importance(np.empty((0, 2))).tolist() == []
+    assert douglas_peucker_importance(POLYLINE[:2]).tolist() == [math.inf, math.inf]
+
+
+def test_trace_levels_of_detail():
+    trace = FaultTrace("Test", "line", [POLYLINE * 0.01])
+    assert trace.vertex_count == 5
+    assert len(trace.simplify(0.0002)[0]) == 5
+    assert len(trace.simplify(0.016)[0]) == 3
+    # Coarser zooms use coarser levels, down to the fewest vertices
+    assert len(trace.at_zoom(4)[0]) <= len(trace.at_zoom(12)[0])
+    assert tolerance_for_zoom(4) > tolerance_for_zoom(12)
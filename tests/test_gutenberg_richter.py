@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Gutenberg-Richter estimators on histograms with a known b-value."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from event_cube import MAGNITUDE_BINS
+from gutenberg_richter import (
+    ALL_EVENTS, bootstrap_statistics, fault_gr_statistics, gr_estimates, magnitude_histogram, window_gr_statistics,
+)
+
+
+def _gr_histogram(b_value, total=200_000, lowest=3.0):
+    # Expected counts per 0.1 bin of a Gutenberg-Richter distribution starting at `lowest`
+    magnitudes = np.arange(MAGNITUDE_BINS) * 0.1
+    share = 10.0 ** (-b_value * (magnitudes - lowest)) * (1 - 10.0 ** (-b_value * 0.1))
+    return np.where(magnitudes >= lowest - 1e-9, np.round(total * share), 0).astype(np.int64)
+
+
+@pytest.mark.parametrize("b_value", [0.8, 1.0, 1.3])
+def test_known_b_value(b_value):
+    histogram = _gr_histogram(b_value)
+    estimates = gr_estimates(histogram, years=100)
+    assert estimates["mc"][0] == pytest.approx(3.2) # Maximum curvature (3.0) plus 0.2
+    assert estimates["b_value"][0] == pytest.approx(b_value, abs=0.02)
+    assert estimates["events"][0] == histogram[32:].sum()
+    assert estimates["annual_rate"][0] == pytest.approx(histogram[32:].sum() / 100)
+
+
+def test_too_few_events_give_no_b_value():
+    histogram = _gr_histogram(1.0, total=30)
+    estimates = gr_estimates(np.vstack([histogram, np.zeros(MAGNITUDE_BINS, dtype=np.int64)]), years=10)
+    assert np.isnan(estimates["b_value"]).all()
+    assert np.isnan(estimates["mc"][1])
+
+
+def test_histogram_bins():
+    assert np.flatnonzero(magnitude_histogram([3.0, 3.05, 6.1, 6.1])).tolist() == [30, 61]
+
+
+def test_bootstrap_interval_brackets_the_estimate():
+    histograms = np.vstack([_gr_histogram(1.0, total=2_000), np.zeros(MAGNITUDE_BINS, dtype=np.int64),
+                            _gr_histogram(0.8, total=5_000)])
+    stats = bootstrap_statistics(histograms, years=50, samples=300, workers=1)
+    assert stats["events"].tolist() == histograms.sum(axis=1).tolist()
+    for row in (0, 2):
+        assert stats["b_value_low"][row] < stats["b_value"][row] < stats["b_value_high"][row]
+        assert stats["b_value_high"][row] - stats["b_value_low"][row] < 0.3
+    assert np.isnan(stats.loc[1, ["b_value", "b_value_low", "b_value_high"]].astype(float)).all()
+    # Seeded per batch: the same call gives the same intervals
+    again = bootstrap_statistics(histograms, years=50, samples=300, workers=1)
+    assert again.equals(stats)
+
+
+def test_time_windows():
+    rng = np.random.default_rng(5)
+    years = rng.integers(1950, 2000, 3000)
+    magnitudes = np.round(3.0 + rng.exponential(np.log10(np.e), 3000), 1) # b = 1 above M3
+    stats = window_gr_statistics(years, magnitudes, (1950, 1999), 20, samples=50, workers=1)
+    assert stats["start_year"].tolist() == [1950, 1960, 1970, 1980]
+    assert stats["end_year"].tolist() == [1969, 1979, 1989, 1999]
+    assert stats["events"].tolist() == [
+        int(((years >= start) & (years <= end)).sum()) for start, end in zip(stats["start_year"], stats["end_year"])
+    ]
+
+
+def test_per_fault_system():
+    association = SimpleNamespace(fault_index=np.array([0, 0, 1, -1, 1, 1]), fault_names=["Alpha", "Beta"])
+    magnitudes = np.array([3.0, 4.0, 5.0, 3.5, 5.0, 6.0])
+    stats = fault_gr_statistics(association, magnitudes, np.arange(6), years=10, samples=20, workers=1)
+    assert stats["name"].tolist() == [ALL_EVENTS, "Alpha", "Beta"]
+    assert stats["events"].tolist() == [6, 2, 3]
+    only_beta = fault_gr_statistics(
+        association, magnitudes[2:], np.arange(2, 6), years=10, fault_names=["Beta"], samples=20, workers=1
+    )
+    assert only_beta["name"].tolist() == [ALL_EVENTS, "Beta"] and only_beta["events"].tolist() == [4, 3]
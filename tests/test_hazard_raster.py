@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Hazard raster density, cache files and reloads."""
+import os
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+import hazard_raster as raster
+from hazard_raster import grid_axes, hazard_density, hazard_raster, raster_key, write_atomically
+from risk_heatmap import risk_values
+from seismic_data import fault_data, fault_frame
+
+
+@pytest.fixture(scope="module")
+def faults():
+    return fault_frame(fault_data)
+
+
+def _png_size(png):
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    return struct.unpack(">II", png[16:24]) # IHDR width, height
+
+
+def test_raster_is_built_once_and_reloaded(faults, tmp_path, monkeypatch):
+    grid, png = hazard_raster(faults, cache_dir=str(tmp_path))
+    key = raster_key(faults)
+    assert sorted(os.listdir(tmp_path)) == [f"hazard_{key}.npy", f"hazard_{key}.png"]
+    expected = hazard_density(
+        faults["latitude"], faults["longitude"], risk_values(faults["seismic_risk"]), faults["annual_slip_rate"]
+    )
+    assert isinstance(grid, np.memmap) and grid.dtype == np.float32
+    np.testing.assert_allclose(grid, expected, rtol=1e-6)
+    lat, lon = grid_axes()
+    assert grid.shape == (len(lat), len(lon))
+    assert _png_size(png) == (len(lon), len(lat))
+
+    # A second lookup reads the files back instead of recomputing
+    monkeypatch.setattr(raster, "hazard_density", lambda *args: pytest.fail("recomputed"))
+    reloaded, png_again = hazard_raster(faults, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(reloaded, grid)
+    assert png_again == png
+
+
+def test_raster_key_follows_the_fault_selection(faults):
+    assert raster_key(faults) == raster_key(faults.copy())
+    assert raster_key(faults) != raster_key(faults.iloc[1:])
+    assert raster_key(faults) != raster_key(faults.assign(annual_slip_rate=faults["annual_slip_rate"] * 2))
+    assert raster_key(faults) != raster_key(faults, resolution=0.05)
+
+
+def test_density_peaks_at_a_single_fault():
+    lat, lon = grid_axes()
+    density = hazard_density([40.0], [16.0], [3.0], [1.0])
+    row, col = np.unravel_index(density.argmax(), density.shape)
+    assert abs(lat[row] - 40.0) < 0.05 and abs(lon[col] - 16.0) < 0.05
+
+
+def test_concurrent_writers_never_expose_a_partial_file(tmp_path):
+    path = str(tmp_path / "grid.npy")
+    arrays = [np.full(200_000, value, dtype=np.float32) for value in range(8)]
+    start = threading.Barrier(len(arrays))
+
+    def writer(array):
+        start.wait()
+        for _ in range(5):
+            write_atomically(path, lambda out: np.save(out, array))
+
+    threads = [threading.Thread(target=writer, args=(array,)) for array in arrays]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        if os.path.exists(path):
+            loaded = np.load(path)
+            assert len(loaded) == 200_000 and (loaded == loaded[0]).all()
+    for thread in threads:
+        thread.join()
+    assert len(np.load(path)) == 200_000
+    assert os.listdir(tmp_path) == ["grid.npy"] # No temporary files left behind
+
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = tmp_path / "hazard.png"
+
+    def fail(out):
+        out.write(b"partial")
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        write_atomically(str(path), fail)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Browser payloads of the map layers, decoded the way their JavaScript does."""
+import base64
+
+import folium
+import numpy as np
+import pandas as pd
+
+from earthquake_catalog import load_catalog
+from map_layers import ClientFilterQuakeLayer, PlaybackLayer, client_quake_payload, playback_payload
+from playback import build_playback
+
+
+def _decode(b64, dtype):
+    return np.frombuffer(base64.b64decode(b64), dtype=dtype)
+
+
+def _quakes():
+    return pd.DataFrame({
+        "year": [1905, 2016, 2024], "magnitude": [-0.5, 6.5, 0.0], "lat": [38.7, 42.7, 40.8],
+        "lon": [16.1, 13.2, 14.4], "deaths": [557, 299, 0], "location": ["Calabria", "Norcia", "Campi Flegrei"],
+        "description": ["", "", "microseism"],
+    })
+
+
+def _render(layer):
+    m = folium.Map(location=[40, 16], zoom_start=6, tiles=None)
+    layer.add_to(m)
+    return m.get_root().render()
+
+
+def test_client_payload_keeps_negative_magnitudes():
+    quakes = _quakes()
+    payload = client_quake_payload(quakes)
+    assert payload["count"] == 3
+    assert _decode(payload["magnitude"], "<i2").tolist() == [-50, 650, 0]
+    assert _decode(payload["year"], "<i4").tolist() == [1905, 2016, 2024]
+    location = payload["location"]
+    assert [location["table"][code] for code in _decode(location["codes"], "<u4")] == quakes["location"].tolist()
+
+
+def test_client_layer_decodes_magnitudes_as_signed():
+    html = _render(ClientFilterQuakeLayer(
+        _quakes(), year_bounds=(1905, 2024), magnitude_bounds=(-0.5, 6.5), year_range=(1905, 2024),
+        magnitude_range=(-0.5, 6.5)
+    ))
+    assert "decode(q.magnitude, Int16Array)" in html
+
+
+def test_playback_payload_keeps_negative_magnitudes():
+    catalog = load_catalog(records=[
+        {"year": year, "location": location, "magnitude": magnitude, "lat": 40.0, "lon": 16.0, "deaths": 0,
+         "description": ""}
+        for year, location, magnitude in [(2001, "A", -1.2), (2001, "B", 2.5), (2012, "C", 0.3)]
+    ])
+    frames = build_playback(catalog, np.arange(len(catalog)), 10)
+    assert frames.offsets.tolist() == [0, 2, 3]
+    payload = playback_payload(frames)
+    assert sorted(_decode(payload["magnitude"], "<i2").tolist()) == [-120, 30, 250]
+
+    m = folium.Map(location=[40, 16], zoom_start=6, tiles=None)
+    events = folium.FeatureGroup(name="Historical Earthquakes").add_to(m)
+    PlaybackLayer(frames, events).add_to(m)
+    html = m.get_root().render()
+    assert "decode(q.magnitude, Int16Array)" in html
+    assert '"magnitudes":[-1.2,2.5]' in html
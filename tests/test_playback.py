@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Background playback builds into a render cache."""
+import time
+
+import pytest
+
+from playback import PlaybackBuilder, PlaybackTooLarge
+from render_cache import LRUCache
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "builder did not finish"
+        time.sleep(0.01)
+
+
+def test_built_value_is_picked_up_by_the_next_request():
+    builder, cache = PlaybackBuilder().start(), LRUCache("maps", max_bytes=1024)
+    builds = []
+
+    def build(progress):
+        builds.append(1)
+        progress(1.0)
+        return "<html>map</html>"
+
+    assert builder.request(cache, "key", build) is None
+    _wait_for(lambda: builder.progress("key") is None)
+    assert builder.request(cache, "key", build) == "<html>map</html>"
+    assert len(builds) == 1 and builder.stats()["built"] == 1
+
+
+def test_failed_build_is_raised_once():
+    builder, cache = PlaybackBuilder().start(), LRUCache("maps")
+
+    def build(progress):
+        raise RuntimeError("broken")
+
+    builder.request(cache, "key", build)
+    _wait_for(lambda: builder.progress("key") is None)
+    with pytest.raises(RuntimeError):
+        builder.request(cache, "key", build)
+    assert builder.request(cache, "key", build) is None # Queued again
+
+
+def test_value_too_large_for_the_cache_is_reported_not_rebuilt():
+    builder, cache = PlaybackBuilder().start(), LRUCache("maps", max_bytes=10)
+    builds = []
+
+    def build(progress):
+        builds.append(1)
+        return "x" * 11
+
+    assert builder.request(cache, "key", build) is None
+    _wait_for(lambda: builder.progress("key") is None)
+    assert builder.oversized("key")
+    for _ in range(3):
+        with pytest.raises(PlaybackTooLarge, match="maps cache"):
+            builder.request(cache, "key", build)
+    assert len(builds) == 1 and builder.stats()["failures"] == 1
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Query API tests against a localhost server on an ephemeral port."""
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from declustering import Declustering
+from earthquake_catalog import load_catalog
+from query_api import ARROW_BATCH_ROWS, start_query_server
+from seismic_data import fault_data, fault_frame
+from spatial_index import GridIndex
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("pyarrow.ipc")
+
+
+def _records(count, seed=0):
+    # Few distinct locations in the early years, one per event later on: the categories of
+    # successive Arrow batches then need different dictionary index widths
+    rng = np.random.default_rng(seed)
+    years = np.sort(rng.integers(1900, 2024, count))
+    return [
+        {"year": int(year), "location": "Città di Castello" if year < 1960 else f"Place {number}",
+         "magnitude": round(float(magnitude), 1), "lat": float(lat), "lon": float(lon),
+         "deaths": 0, "description": ""}
+        for number, (year, magnitude, lat, lon) in enumerate(zip(
+            years, rng.uniform(2.0, 7.0, count), rng.uniform(37.0, 42.0, count), rng.uniform(13.0, 18.0, count)
+        ))
+    ]
+
+
+def _serve(catalog):
+    index = GridIndex(catalog.lat, catalog.lon)
+    resources = {
+        "catalog": catalog, "index": index, "faults": fault_frame(fault_data),
+        "declustering": lambda: Declustering(np.arange(len(catalog))),
+    }
+    server = start_query_server(lambda: resources, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture(scope="module")
+def small_api():
+    server, url = _serve(load_catalog(records=_records(2500)))
+    yield url
+    server.shutdown()
+
+
+def _get(url, headers=None):
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+        return response.status, dict(response.headers), response.read()
+
+
+def test_geojson_pages_cover_every_match(small_api):
+    url = f"{small_api}/earthquakes?year_min=1950&page_size=400"
+    features, matched = [], None
+    while url:
+        _, _, body = _get(url)
+        page = json.loads(body)
+        matched = page["numberMatched"]
+        features += page["features"]
+        assert page["numberReturned"] <= 400
+        links = [link["href"] for link in page["links"] if link["rel"] == "next"]
+        url = small_api + links[0] if links else None
+    assert len(features) == matched > 400
+    assert all(feature["properties"]["year"] >= 1950 for feature in features)
+
+
+def test_arrow_streams_every_row(small_api):
+    _, headers, body = _get(f"{small_api}/earthquakes?format=arrow")
+    assert headers["Content-Type"] == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(body).read_all().num_rows == 2500
+
+
+def test_arrow_streams_multiple_batches():
+    count = 2 * ARROW_BATCH_ROWS + 1000
+    server, url = _serve(load_catalog(records=_records(count)))
+    try:
+        _, _, body = _get(f"{url}/earthquakes?format=arrow")
+    finally:
+        server.shutdown()
+    reader = pa.ipc.open_stream(body)
+    table = reader.read_all()
+    assert table.num_rows == count
+    assert table.to_batches()[0].num_rows == ARROW_BATCH_ROWS
+    assert table.column("location").to_pylist()[0] == "Città di Castello"
+
+
+def test_if_none_match_gets_304(small_api):
+    status, headers, _ = _get(f"{small_api}/earthquakes?mag_min=5")
+    assert status == 200
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _get(f"{small_api}/earthquakes?mag_min=5", {"If-None-Match": headers["ETag"]})
+    assert error.value.code == 304
+
+
+@pytest.mark.parametrize("query", ["bbox=40,15,39,16", "bbox=1,2,3", "year_min=soon", "format=xml", "page=0"])
+def test_bad_parameters_get_400(small_api, query):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _get(f"{small_api}/earthquakes?{query}")
+    assert error.value.code == 400
+
+
+def test_empty_result(small_api):
+    _, _, body = _get(f"{small_api}/earthquakes?year_min=1800&year_max=1850")
+    page = json.loads(body)
+    assert page["numberMatched"] == 0 and page["features"] == [] and page["links"] == []
+    _, _, body = _get(f"{small_api}/earthquakes?year_min=1800&year_max=1850&format=arrow")
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.num_rows == 0 and "magnitude" in table.column_names
+
+
+def test_faults_filtered_by_risk(small_api):
+    _, _, body = _get(f"{small_api}/faults?risk=High")
+    features = json.loads(body)["features"]
+    assert features and all(feature["properties"]["seismic_risk"] == "High" for feature in features)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""LRUCache eviction by entry count and by size, and the sidebar state keys."""
+import numpy as np
+
+from render_cache import LRUCache, approximate_size, client_map_key, state_keys
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache("test", max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A" # "b" is now the least recently used
+    cache.put("c", "C")
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_peek_does_not_refresh_recency_or_count():
+    cache = LRUCache("test", max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.peek("a") == "A"
+    cache.put("c", "C")
+    assert "a" not in cache
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_size_bound():
+    cache = LRUCache("test", max_entries=10, max_bytes=10)
+    cache.put("a", "x" * 4)
+    cache.put("b", "x" * 4)
+    cache.put("c", "x" * 4) # 12 bytes: "a" goes
+    assert "a" not in cache and len(cache) == 2 and cache.total_bytes == 8
+    cache.put("b", "x" * 2) # Replacing an entry updates the total
+    assert cache.total_bytes == 6
+    assert cache.put("big", "x" * 11) == "x" * 11 # Returned but never stored
+    assert "big" not in cache and len(cache) == 2
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = LRUCache("test")
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("key", lambda: calls.append(1) or "value") == "value"
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, 2 / 3)
+
+
+def test_approximate_size_of_arrays():
+    assert approximate_size(np.zeros(100, dtype=np.float32)) == 400
+    assert approximate_size(("abc", np.zeros(2))) == 3 + 16
+
+
+def _state(**changes):
+    state = dict(
+        display_options=["Faults", "Earthquakes"], filter_risk=["High"], year_range=(1900, 2023),
+        magnitude_range=(6.0, 8.0), selected_tile="OpenStreetMap", heatmap_mode="Off", focus_area="All",
+        focus_radius_km=None, map_mode="Server", declustered=False, playback_period=None,
+    )
+    state.update(changes)
+    return state
+
+
+def test_state_keys_ignore_selection_order_but_not_off_grid_magnitudes():
+    assert state_keys(_state(), 1) == state_keys(_state(display_options=["Earthquakes", "Faults"]), 1)
+    assert state_keys(_state(magnitude_range=(5.97, 8.0)), 1)[0] != state_keys(_state(), 1)[0]
+    assert state_keys(_state(magnitude_range=(5.97, 8.0)), 1)[2] != state_keys(_state(), 1)[2]
+
+
+def test_client_map_key_leaves_out_only_the_sliders():
+    assert client_map_key(_state(), 1) == client_map_key(_state(year_range=(1950, 2000), magnitude_range=(5.97, 7.0)), 1)
+    assert client_map_key(_state(), 1) != client_map_key(_state(selected_tile="CartoDB positron"), 1)
+    assert client_map_key(_state(), 1) != client_map_key(_state(), 2)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Snapshot renderer argument parsing and job grid."""
+import argparse
+
+import pytest
+
+from explorer_views import HEATMAP_MODES, MAP_TILE_OPTIONS
+from render_snapshots import build_jobs, build_parser, parse_range
+
+
+@pytest.mark.parametrize("text, cast, expected", [
+    ("1900-2000", int, (1900, 2000)),
+    ("1900-", int, (1900, None)),
+    (" - 1600 ", int, (None, 1600)),
+    ("6.0-7.5", float, (6.0, 7.5)),
+    ("-", float, (None, None)),
+])
+def test_parse_range(text, cast, expected):
+    assert parse_range(text, cast) == expected
+
+
+@pytest.mark.parametrize("text", ["1900", "1900-2000-2010", "-5.0--1.0", "abc-def"])
+def test_parse_range_rejects_malformed_windows(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_range(text, float)
+
+
+def test_default_job_grid():
+    (job,) = build_jobs(build_parser().parse_args([]))
+    assert job["risk"] == "all" and job["years"] == (1900, None) and job["magnitudes"] == (6.0, None)
+    assert job["tile"] == MAP_TILE_OPTIONS[0] and job["heatmap_mode"] == HEATMAP_MODES[0]
+    assert job["layers"] == ["Fault Systems", "Historical Earthquakes"]
+    assert job["out"] == "snapshots" and job["png"] is False
+
+
+def test_jobs_cover_every_combination():
+    args = build_parser().parse_args([
+        "--risk", "all", "--risk", "High, Very High", "--years", "1900-", "--years", "1600-1900",
+        "--magnitudes", "6.0-", "--tiles", MAP_TILE_OPTIONS[0], "--tiles", MAP_TILE_OPTIONS[1],
+        "--tiles", MAP_TILE_OPTIONS[2], "--out", "grid", "--png",
+    ])
+    jobs = build_jobs(args)
+    assert len(jobs) == 2 * 2 * 1 * 3
+    combinations = {(job["risk"], job["years"], job["magnitudes"], job["tile"]) for job in jobs}
+    assert len(combinations) == len(jobs)
+    assert ("High", "Very High") in {job["risk"] for job in jobs}
+    assert all(job["out"] == "grid" and job["png"] for job in jobs)
+
+
+def test_unknown_layer_is_rejected():
+    with pytest.raises(SystemExit, match="Unknown layer"):
+        build_jobs(build_parser().parse_args(["--layers", "Fault Systems,Volcanoes"]))
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""PSHA hazard curves read from the per-source distance tables."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from hazard_raster import grid_axes
+from seismic_hazard import (
+    DISTANCE_SAMPLES, INTEGRATION_DISTANCE_KM, _distance_axis, _interpolation_tables, _source_rates,
+    exceedance_tables, fault_sources, hazard_grid, pga_at_rate, source_reach_km, target_rate,
+)
+from spatial_index import haversine_km
+
+SOURCE = (39.0, 16.0)
+
+
+def _sites(distances_km):
+    # Sites due north of the source at the given distances
+    return SOURCE[0] + np.asarray(distances_km) / 111.195, np.full(len(distances_km), SOURCE[1])
+
+
+def _sources(slip_rates=(2.0,)):
+    faults = pd.DataFrame({
+        "name": [f"Fault {n}" for n in range(len(slip_rates))], "latitude": SOURCE[0], "longitude": SOURCE[1],
+        "annual_slip_rate": list(slip_rates), "length_km": 30.0,
+    })
+    return fault_sources(faults)
+
+
+def test_linear_table_is_interpolated_exactly():
+    # Rates linear in sqrt(distance) come back exactly between the table rows
+    tables = np.arange(DISTANCE_SAMPLES, dtype=np.float64)[None, :, None] * np.array([1.0, 0.5])
+    base, slope = _interpolation_tables(tables)
+    site_lat, site_lon = _sites([0.0, 3.3, 47.0, 150.5, 299.0])
+    distance = haversine_km(site_lat, site_lon, *SOURCE)
+    rates = _source_rates(site_lat, site_lon, *SOURCE, base[0], slope[0])
+    step = np.sqrt(INTEGRATION_DISTANCE_KM) / (DISTANCE_SAMPLES - 1)
+    np.testing.assert_allclose(rates, np.sqrt(distance)[:, None] / step * [1.0, 0.5], rtol=1e-5, atol=1e-4)
+
+
+def test_sites_out_of_reach_get_nothing():
+    tables = np.ones((1, DISTANCE_SAMPLES, 3))
+    base, slope = _interpolation_tables(tables)
+    site_lat, site_lon = _sites([10.0, 120.0, 400.0])
+    rates = _source_rates(site_lat, site_lon, *SOURCE, base[0], slope[0], reach_km=100.0)
+    assert rates[0].tolist() == [1.0, 1.0, 1.0]
+    assert rates[1:].tolist() == [[0.0] * 3, [0.0] * 3]
+
+
+def test_curves_match_the_tables():
+    sources = _sources()
+    tables, shape, scale = exceedance_tables(sources)
+    base, slope = _interpolation_tables(tables)
+    site_lat, site_lon = _sites([1.0, 12.5, 80.0, 220.0])
+    distance = haversine_km(site_lat, site_lon, *SOURCE)
+    rates = scale[0] * _source_rates(site_lat, site_lon, *SOURCE, base[shape[0]], slope[shape[0]])
+    table = tables[shape[0]] * scale[0]
+    expected = np.column_stack([
+        np.interp(np.sqrt(distance), np.sqrt(_distance_axis()), table[:, level]) for level in range(table.shape[1])
+    ])
+    np.testing.assert_allclose(rates, expected, rtol=1e-4, atol=1e-12)
+    # Exceedance rates fall with distance and with PGA level
+    assert (np.diff(rates, axis=0) <= 0).all() and (np.diff(rates, axis=1) <= 0).all()
+
+
+def test_equal_sources_share_a_table():
+    tables, shape, scale = exceedance_tables(_sources((1.0, 3.0)))
+    assert len(tables) == 1 and shape.tolist() == [0, 0] and scale.tolist() == [1.0, 3.0]
+
+
+def test_pga_at_rate_interpolates_log_log():
+    levels = np.array([0.1, 0.2, 0.4])
+    curves = np.array([
+        [1e-2, 1e-3, 1e-4], # Target halfway between the first two levels in log rate
+        [1e-5, 1e-6, 1e-7], # Never exceeded that often
+        [1.0, 0.5, 0.1], # Exceeded more often even at the top level
+    ])
+    pga = pga_at_rate(curves, levels, rate=10 ** -2.5)
+    assert pga[0] == pytest.approx(np.sqrt(0.1 * 0.2))
+    assert pga[1] == 0.0 and pga[2] == 0.4
+
+
+def test_grid_reads_the_curves_at_every_cell():
+    sources = _sources()
+    bounds, resolution = (38.5, 15.5, 39.5, 16.5), 0.05
+    pga = hazard_grid(sources, bounds, resolution, workers=1)
+    grid_lat, grid_lon = grid_axes(bounds, resolution)
+    assert pga.shape == (len(grid_lat), len(grid_lon))
+
+    tables, shape, scale = exceedance_tables(sources)
+    reach = source_reach_km(tables, shape, scale)[0]
+    lat, lon = np.meshgrid(grid_lat, grid_lon, indexing="ij")
+    distance = haversine_km(lat.ravel(), lon.ravel(), *SOURCE)
+    table = tables[shape[0]] * scale[0]
+    curves = np.column_stack([
+        np.interp(np.sqrt(distance), np.sqrt(_distance_axis()), table[:, level]) for level in range(table.shape[1])
+    ]) * (distance < reach)[:, None]
+    np.testing.assert_allclose(pga.ravel(), pga_at_rate(curves, rate=target_rate()), rtol=1e-3)
+    # Highest along the rupture, through the source
+    assert pga.ravel()[np.argmin(distance)] == pga.max() > pga.ravel()[np.argmax(distance)]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Catalog snapshots published once, memory-mapped by readers and rebuilt for new versions."""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from earthquake_catalog import CATALOG_COLUMNS, load_catalog
+from shared_catalog import load_shared_catalog, shared_grid_index, shared_snapshot
+
+RECORDS = [
+    (1908, "Messina", 7.1, 38.15, 15.68, 75000, "Messina Strait"),
+    (1980, "Irpinia", 6.9, 40.78, 15.33, 2914, "Southern Apennines"),
+    (2016, "Norcia", 6.6, 42.83, 13.11, 0, "Central Apennines"),
+]
+
+
+def _write_catalog(path, records=RECORDS):
+    pd.DataFrame(records, columns=CATALOG_COLUMNS).to_csv(path, index=False)
+
+
+def _counting_build(calls):
+    def build():
+        calls.append(1)
+        return {"values": np.arange(5, dtype=np.int64)}, {"source": "test"}
+    return build
+
+
+def test_snapshot_is_built_once_and_memory_mapped(tmp_path):
+    source = tmp_path / "catalog.csv"
+    _write_catalog(source)
+    calls = []
+    for _ in range(2):
+        arrays, meta = shared_snapshot(str(source), "v1", "artefact", _counting_build(calls), str(tmp_path / "cache"))
+        np.testing.assert_array_equal(arrays["values"], np.arange(5))
+        assert meta == {"source": "test"}
+        assert isinstance(arrays["values"].base, np.memmap)
+        assert not arrays["values"].flags.writeable
+    assert len(calls) == 1
+
+
+def test_shared_catalog_matches_the_loaded_file(tmp_path):
+    source = str(tmp_path / "catalog.csv")
+    _write_catalog(source)
+    cache_dir = str(tmp_path / "cache")
+    shared = load_shared_catalog(source, cache_dir=cache_dir)
+    reloaded = load_shared_catalog(source, cache_dir=cache_dir) # Read back from the published snapshot
+    expected = load_catalog(source)
+    for catalog in (shared, reloaded):
+        assert catalog.version == expected.version
+        np.testing.assert_array_equal(catalog.years, expected.years)
+        np.testing.assert_array_equal(catalog.magnitudes, expected.magnitudes)
+        assert catalog.column("location").tolist() == ["Messina", "Irpinia", "Norcia"]
+    index = shared_grid_index(source, reloaded, cache_dir)
+    assert sorted(index.query_bbox(38.0, 15.0, 41.0, 16.0).tolist()) == [0, 1]
+
+
+def test_changed_file_reloads_and_keeps_recent_versions(tmp_path):
+    source = str(tmp_path / "catalog.csv")
+    cache_dir = str(tmp_path / "cache")
+    _write_catalog(source)
+    load_shared_catalog(source, cache_dir=cache_dir)
+    (source_dir,) = os.listdir(cache_dir)
+    (old_version,) = os.listdir(os.path.join(cache_dir, source_dir))
+
+    _write_catalog(source, RECORDS[:2])
+    os.utime(source, ns=(time.time_ns() + 10**9,) * 2) # A new version even within the mtime resolution
+    assert len(load_shared_catalog(source, cache_dir=cache_dir)) == 2
+    # Another process may still be on the previous version: recent versions are kept
+    assert old_version in os.listdir(os.path.join(cache_dir, source_dir))
+
+    old_path = os.path.join(cache_dir, source_dir, old_version)
+    os.utime(old_path, (time.time() - 2 * 86400,) * 2)
+    _write_catalog(source)
+    os.utime(source, ns=(time.time_ns() + 2 * 10**9,) * 2)
+    assert len(load_shared_catalog(source, cache_dir=cache_dir)) == 3
+    assert old_version not in os.listdir(os.path.join(cache_dir, source_dir))
+    assert len(os.listdir(os.path.join(cache_dir, source_dir))) == 2
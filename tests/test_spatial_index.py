@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Grid index lookups on a handful of points."""
+import numpy as np
+
+from spatial_index import GridIndex
+
+LAT = np.array([40.0, np.nan, 40.3, 38.1, 41.0, np.inf])
+LON = np.array([16.0, 15.0, 16.2, np.nan, 15.1, 14.0])
+
+
+def test_points_without_finite_coordinates_are_left_out():
+    index = GridIndex(LAT, LON, cell_size=0.5)
+    assert len(index) == len(LAT)
+    assert (index.lat0, index.lon0) == (40.0, 15.1)
+    positions, cells = index.cell_layout()
+    assert sorted(positions.tolist()) == [0, 2, 4]
+    assert len(cells) == 3
+    assert index.query_bbox(35, 10, 45, 20).tolist() == [0, 2, 4]
+    assert index.query_radius(40.0, 16.0, 50).tolist() == [0, 2]
+
+
+def test_no_finite_coordinates():
+    index = GridIndex([np.nan, np.nan], [15.0, np.nan])
+    assert index.query_bbox(35, 10, 45, 20).tolist() == []
+    assert index.count_bbox(35, 10, 45, 20) == 0
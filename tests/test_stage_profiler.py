@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Stage recording on and off, and the metric exports."""
+import json
+import threading
+
+import pytest
+
+from stage_profiler import StageProfiler, deactivate, stage
+
+
+@pytest.fixture
+def profiler():
+    profiler = StageProfiler()
+    yield profiler
+    deactivate()
+
+
+def test_stage_is_a_shared_no_op_without_an_active_run(profiler):
+    first, second = stage("map"), stage("chart")
+    assert first is second
+    with first as timed:
+        timed.output_bytes = 10 # Ignored
+    assert profiler.records() == [] and profiler.totals() == {}
+
+
+def test_active_run_records_each_stage(profiler):
+    run = profiler.start_run()
+    with stage("map") as timed:
+        timed.output_bytes = 1234
+    with stage("chart"):
+        pass
+    with stage("map"):
+        pass
+    records = profiler.records(run)
+    assert [entry["stage"] for entry in records] == ["map", "chart", "map"]
+    assert records[0]["output_bytes"] == 1234 and records[1]["output_bytes"] is None
+    assert all(entry["run"] == run and entry["seconds"] >= 0 for entry in records)
+    totals = profiler.totals()
+    assert totals["map"]["count"] == 2 and totals["map"]["output_bytes"] == 1234
+    assert totals["chart"]["count"] == 1
+
+    deactivate()
+    with stage("map"):
+        pass
+    assert len(profiler.records()) == 3
+
+
+def test_runs_are_scoped_to_their_context(profiler):
+    run = profiler.start_run()
+    def other():
+        with stage("other"):
+            pass
+
+    # A new thread starts with an empty context: nothing is recorded until it activates a run
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert profiler.records() == []
+
+    def fragment():
+        profiler.activate(run)
+        with stage("fragment"):
+            pass
+
+    thread = threading.Thread(target=fragment)
+    thread.start()
+    thread.join()
+    assert [entry["stage"] for entry in profiler.records(run)] == ["fragment"]
+
+
+def test_prometheus_and_json_exports(profiler, tmp_path):
+    run = profiler.start_run()
+    with stage("map") as timed:
+        timed.output_bytes = 100
+    with stage("chart.timeline"):
+        pass
+    text = profiler.to_prometheus()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE faults_stage_runs_total counter" in lines
+    assert 'faults_stage_runs_total{stage="chart.timeline"} 1' in lines
+    assert 'faults_stage_output_bytes_total{stage="map"} 100' in lines
+    # Stages are listed in name order under each metric
+    runs = [line for line in lines if line.startswith("faults_stage_runs_total{")]
+    assert runs == sorted(runs)
+
+    profiler.export(str(tmp_path / "metrics.prom"))
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8") == text
+    profiler.export(str(tmp_path / "stages.jsonl"), run)
+    profiler.export(str(tmp_path / "stages.jsonl"), run)
+    entries = [json.loads(line) for line in (tmp_path / "stages.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [entry["stage"] for entry in entries] == ["map", "chart.timeline"] * 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["metrics.prom", "stages.jsonl"]